@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare the throughput of SEKFileUtil checksums with the former
+implementation that read files 128 bytes at a time.
+
+Usage:
+
+    PYTHONPATH=src python bench/checksum_benchmark.py [${SIZE_IN_MB}]
+"""
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+from sek.file_util import SEKFileUtil
+
+
+def smallReadMD5(fullPath):
+    with open(fullPath, 'rb') as f:
+        content = hashlib.md5()
+        for buf in iter(partial(f.read, 128), b''):
+            content.update(buf)
+        return content.hexdigest()
+
+
+def throughput(name, sizeMB, function):
+    start = time.time()
+    function()
+    seconds = time.time() - start
+    print('{:<32} {:8.1f} MB/s'.format(name, sizeMB / seconds))
+
+
+def main():
+    sizeMB = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    fileUtil = SEKFileUtil()
+    fd, path = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for i in range(sizeMB):
+                f.write(os.urandom(1024 * 1024))
+
+        # Read once so that all runs use the page cache.
+        fileUtil.checksums(path)
+
+        throughput('md5, 128 byte reads', sizeMB, lambda: smallReadMD5(path))
+        throughput('md5, 1 MB reads', sizeMB,
+                   lambda: fileUtil.checksums(path))
+        throughput('md5, mmap', sizeMB,
+                   lambda: fileUtil.checksums(path, useMmap = True))
+        throughput('md5 + sha1 + sha256, one pass', sizeMB,
+                   lambda: fileUtil.checksums(path, ('md5', 'sha1', 'sha256')))
+        if 'blake2b' in hashlib.algorithms_available:
+            throughput('blake2b, 1 MB reads', sizeMB,
+                       lambda: fileUtil.checksums(path, ('blake2b',)))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
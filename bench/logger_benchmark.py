@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure the cost of constructing a SEKLogger and the per-call cost of
+SEKLogger.log.
+
+Usage:
+
+    PYTHONPATH=src python bench/logger_benchmark.py [${CALLS}]
+
+Output that would go to stderr is discarded.
+"""
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import os
+import sys
+import timeit
+from sek.logger import SEKLogger
+
+
+def perCall(logger, level, calls):
+    """
+    :returns: Float microseconds per call to log.
+    """
+
+    seconds = timeit.timeit(lambda: logger.log('A benchmark message.', level),
+                            number = calls)
+    return seconds / calls * 1e6
+
+
+def perConstruction(calls):
+    """
+    :returns: Float microseconds per construction of a SEKLogger.
+    """
+
+    seconds = timeit.timeit(lambda: SEKLogger('benchmark', 'info'),
+                            number = calls)
+    return seconds / calls * 1e6
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    devnull = open(os.devnull, 'w')
+
+    logger = SEKLogger('benchmark', 'info', useColor = False)
+    logger.streamHandlerStdErr.stream = devnull
+
+    print('{} calls'.format(calls))
+    print('construction:                {:.2f} us/call'.format(
+        perConstruction(calls)))
+    print('disabled (debug below info): {:.2f} us/call'.format(
+        perCall(logger, 'debug', calls)))
+    print('enabled (info):              {:.2f} us/call'.format(
+        perCall(logger, 'info', calls)))
+    logger.startRecording()
+    print('enabled and recording:       {:.2f} us/call'.format(
+        perCall(logger, 'info', calls)))
+    logger.endRecording()
+    logger.setRateLimit(10, interval = 60)
+    print('rate limited (suppressed):   {:.2f} us/call'.format(
+        perCall(logger, 'info', calls)))
+
+    devnull.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import os
+import sqlite3
+import time
+from multiprocessing.pool import ThreadPool
+from sek.file_util import SEKFileUtil, walkFiles
+from sek.logger import SEKLogger
+
+
+def fileSignature(st):
+    """
+    :param st: os.stat_result of a file.
+    :returns: Tuple of the size, modification time in nanoseconds and inode
+    that identify a version of the file.
+    """
+
+    mtime = getattr(st, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = int(st.st_mtime * 1e9)
+    return st.st_size, mtime, st.st_ino
+
+
+class SEKChecksumManifest(object):
+    """
+    Persistent cache of file checksums in a SQLite database.
+
+    A checksum is reused while the size, modification time and inode of the
+    file are unchanged. Only new or changed files are read and hashed,
+    optionally by several threads.
+
+    Usage:
+
+        manifest = SEKChecksumManifest('/var/lib/sek/checksums.sqlite')
+        digests = manifest.scanDirectory('/data/inbound')
+        manifest.close()
+
+    Public API:
+
+        checksum(path: String, algorithm: String):String
+            Hex digest of a file.
+
+        checksums(paths: List, algorithms: List):Dict
+            Digests by algorithm for each path.
+
+        scanDirectory(directory: String, recursive: Boolean,
+                      algorithms: List):Dict
+            Digests for all files in a directory.
+
+        prune():Int
+            Remove entries of files that no longer exist.
+
+        close()
+    """
+
+    def __init__(self, dbPath = '', algorithms = ('md5',), workers = 1,
+                 logLevel = 'silent'):
+        """
+        Constructor.
+
+        :param dbPath: String path of the SQLite database. It is created if
+        it does not exist.
+        :param algorithms: Sequence of hashlib algorithm names computed by
+        default.
+        :param workers: Int number of files hashed at the same time.
+        :param logLevel
+        """
+
+        if not dbPath:
+            raise Exception('Manifest database path not defined.')
+
+        self.logger = SEKLogger(__name__, logLevel)
+        self.fileUtil = SEKFileUtil()
+        self.algorithms = tuple(algorithms)
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(dbPath)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS checksums (
+            path TEXT NOT NULL,
+            algorithm TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            checked REAL NOT NULL,
+            PRIMARY KEY (path, algorithm))""")
+        self.conn.commit()
+
+
+    def checksum(self, path, algorithm = 'md5'):
+        """
+        :param path: String path of a file.
+        :param algorithm: String hashlib algorithm name.
+        :returns: String hex digest.
+        """
+
+        return self.checksums([path], (algorithm,))[os.path.abspath(path)][
+            algorithm]
+
+
+    def _cached(self, path, signature, algorithms):
+        """
+        :returns: Dict of the cached digests of the algorithms that are
+        still valid for the signature.
+        """
+
+        placeholders = ','.join('?' * len(algorithms))
+        rows = self.conn.execute(
+            'SELECT algorithm, digest FROM checksums WHERE path = ? AND size '
+            '= ? AND mtime = ? AND inode = ? AND algorithm IN ({})'.format(
+                placeholders), (path,) + signature + tuple(algorithms))
+        return dict(rows.fetchall())
+
+
+    def _hash(self, item):
+        """
+        :param item: Tuple of (path, signature, algorithms).
+        :returns: Tuple of (path, signature, digests). digests is None if
+        the file could not be read.
+        """
+
+        path, signature, algorithms = item
+        try:
+            return path, signature, self.fileUtil.checksums(path, algorithms)
+        except (IOError, OSError) as detail:
+            self.logger.log('Failed to hash {}: {}', 'error', path, detail)
+            return path, signature, None
+
+
+    def checksums(self, paths, algorithms = None):
+        """
+        Get checksums, hashing only files that are new or changed since they
+        were last hashed.
+
+        :param paths: Iterable of String paths of files.
+        :param algorithms: Sequence of hashlib algorithm names. Defaults to
+        the algorithms of the manifest.
+        :returns: Dict keyed by absolute path of Dicts of hex digests by
+        algorithm. Files that cannot be read are left out.
+        """
+
+        signatures = []
+        for path in paths:
+            path = os.path.abspath(path)
+            try:
+                signatures.append((path, fileSignature(os.stat(path))))
+            except OSError as detail:
+                self.logger.log('Failed to stat {}: {}', 'error', path,
+                                detail)
+        return self._checksums(signatures, algorithms)
+
+
+    def _checksums(self, signatures, algorithms = None):
+        """
+        Get checksums of files that were already stat'ed.
+
+        :param signatures: Iterable of (absolute path, fileSignature())
+        tuples.
+        :param algorithms: Sequence of hashlib algorithm names.
+        :returns: Dict keyed by path of Dicts of hex digests by algorithm.
+        """
+
+        algorithms = tuple(algorithms or self.algorithms)
+        results = {}
+        stale = []
+        for path, signature in signatures:
+            cached = self._cached(path, signature, algorithms)
+            missing = tuple(a for a in algorithms if a not in cached)
+            results[path] = cached
+            if missing:
+                self.misses += 1
+                stale.append((path, signature, missing))
+            else:
+                self.hits += 1
+
+        if self.workers > 1 and len(stale) > 1:
+            pool = ThreadPool(self.workers)
+            try:
+                hashed = pool.imap_unordered(self._hash, stale)
+                self._store(hashed, results)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            self._store((self._hash(item) for item in stale), results)
+        return results
+
+
+    def _store(self, hashed, results):
+        """
+        Save new digests in one transaction and add them to results.
+        """
+
+        checked = time.time()
+        with self.conn:
+            for path, signature, digests in hashed:
+                if digests is None:
+                    results.pop(path, None)
+                    continue
+                results[path].update(digests)
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO checksums (path, algorithm, size, '
+                    'mtime, inode, digest, checked) VALUES (?, ?, ?, ?, ?, ?, '
+                    '?)', [(path, algorithm) + signature + (digest, checked)
+                           for algorithm, digest in digests.items()])
+
+
+    def scanDirectory(self, directory, recursive = True, algorithms = None):
+        """
+        Get checksums of all regular files in a directory. Each file is
+        stat'ed once while walking the directory. Symbolic links are not
+        followed.
+
+        :param directory: String path of the directory.
+        :param recursive: Boolean if True, subdirectories are included.
+        :param algorithms: Sequence of hashlib algorithm names.
+        :returns: Dict keyed by absolute path of Dicts of hex digests by
+        algorithm.
+        """
+
+        files = walkFiles(os.path.abspath(directory), recursive)
+        return self._checksums(
+            ((path, fileSignature(st)) for path, st in files if
+             not isinstance(st, OSError)), algorithms)
+
+
+    def prune(self):
+        """
+        Remove the entries of files that no longer exist.
+
+        :returns: Int number of removed files.
+        """
+
+        paths = [row[0] for row in
+                 self.conn.execute('SELECT DISTINCT path FROM checksums')]
+        removed = [(path,) for path in paths if not os.path.isfile(path)]
+        with self.conn:
+            self.conn.executemany('DELETE FROM checksums WHERE path = ?',
+                                  removed)
+        return len(removed)
+
+
+    def close(self):
+        self.conn.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
@@ -0,0 +1,927 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Asynchronous counterparts of SEKDBConnector and SEKDBUtil for use with
+asyncio.
+
+Connections use the asynchronous mode of psycopg2 and are driven by the
+event loop, so queries against several connections can run concurrently
+from a single thread. This module requires Python 3.7 or later.
+
+Usage:
+
+    connector = SEKAsyncDBConnector(dbName = 'db', usePool = True)
+    dbUtil = SEKAsyncDBUtil()
+
+    async with connector.connection() as conn:
+        cursor = conn.cursor()
+        await dbUtil.executeSQL(cursor, 'SELECT 1')
+        rows = cursor.fetchall()
+
+Asynchronous connections are always in autocommit mode. An explicit
+transaction is started with conn.begin() and ended with conn.commit() or
+conn.rollback(). COPY and named cursors are not available in asynchronous
+mode. Bulk loading therefore uses multi-row INSERT statements and streaming
+uses DECLARE and FETCH.
+"""
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import asyncio
+import sys
+import time
+import weakref
+from contextlib import asynccontextmanager
+from itertools import count, islice
+import psycopg2
+import psycopg2.extensions
+from sek.logger import SEKLogger
+
+# Pools shared by all connectors, keyed by event loop and DSN.
+_sharedPools = weakref.WeakKeyDictionary()
+
+# Source of unique names for server-side cursors.
+_serverCursorIDs = count()
+
+
+class SEKAsyncConnection(object):
+    """
+    An asynchronous psycopg2 connection driven by the asyncio event loop.
+
+    Only one statement runs on a connection at a time. Concurrent callers
+    on the same connection wait for their turn.
+    """
+
+    def __init__(self, raw):
+        """
+        Constructor.
+
+        :param raw: psycopg2 connection opened in asynchronous mode.
+        """
+
+        self.raw = raw
+        self.lock = asyncio.Lock()
+
+
+    @classmethod
+    async def open(cls, dsn = ''):
+        """
+        Open a connection.
+
+        :param dsn: String for the libpq connection string.
+        :returns: SEKAsyncConnection
+        """
+
+        conn = cls(psycopg2.connect(dsn, async_ = 1))
+        try:
+            await conn.wait()
+        except BaseException:
+            conn.raw.close()
+            raise
+        return conn
+
+
+    async def wait(self):
+        """
+        Wait until the pending operation on the connection has completed.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            state = self.raw.poll()
+            if state == psycopg2.extensions.POLL_OK:
+                return
+
+            fd = self.raw.fileno()
+            future = loop.create_future()
+            if state == psycopg2.extensions.POLL_READ:
+                loop.add_reader(fd, future.set_result, None)
+                try:
+                    await future
+                finally:
+                    loop.remove_reader(fd)
+            elif state == psycopg2.extensions.POLL_WRITE:
+                loop.add_writer(fd, future.set_result, None)
+                try:
+                    await future
+                finally:
+                    loop.remove_writer(fd)
+            else:
+                raise psycopg2.OperationalError(
+                    'Unexpected poll state {}.'.format(state))
+
+
+    def cursor(self, cursor_factory = None):
+        """
+        :param cursor_factory: Optional psycopg2 cursor class such as
+        psycopg2.extras.DictCursor.
+        :returns: SEKAsyncCursor
+        """
+
+        if cursor_factory:
+            return SEKAsyncCursor(self, self.raw.cursor(
+                cursor_factory = cursor_factory))
+        return SEKAsyncCursor(self, self.raw.cursor())
+
+
+    def inTransaction(self):
+        """
+        :returns: True if an explicit transaction is open.
+        """
+
+        return self.raw.get_transaction_status() != \
+               psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+    async def begin(self):
+        await self.cursor().execute('BEGIN')
+
+
+    async def commit(self):
+        if self.inTransaction():
+            await self.cursor().execute('COMMIT')
+
+
+    async def rollback(self):
+        if self.inTransaction():
+            await self.cursor().execute('ROLLBACK')
+
+
+    @property
+    def closed(self):
+        return self.raw.closed
+
+
+    def close(self):
+        self.raw.close()
+
+
+class SEKAsyncCursor(object):
+    """
+    Wraps a cursor of an asynchronous connection. Statements are run with
+    await cursor.execute(). Results are then read with the usual fetch
+    methods.
+    """
+
+    def __init__(self, connection, raw):
+        """
+        Constructor.
+
+        :param connection: SEKAsyncConnection the cursor belongs to.
+        :param raw: psycopg2 cursor.
+        """
+
+        self.connection = connection
+        self.raw = raw
+
+
+    async def execute(self, sql, params = None):
+        """
+        Execute a statement and wait for it to complete.
+
+        If the waiting task is cancelled, the connection is closed since it
+        is left in the middle of a query.
+        """
+
+        async with self.connection.lock:
+            self.raw.execute(sql, params)
+            try:
+                await self.connection.wait()
+            except asyncio.CancelledError:
+                self.connection.close()
+                raise
+
+
+    def mogrify(self, sql, params = None):
+        return self.raw.mogrify(sql, params)
+
+
+    def fetchone(self):
+        return self.raw.fetchone()
+
+
+    def fetchmany(self, size = None):
+        if size is None:
+            return self.raw.fetchmany()
+        return self.raw.fetchmany(size)
+
+
+    def fetchall(self):
+        return self.raw.fetchall()
+
+
+    def __iter__(self):
+        return iter(self.raw)
+
+
+    @property
+    def rowcount(self):
+        return self.raw.rowcount
+
+
+    @property
+    def description(self):
+        return self.raw.description
+
+
+    @property
+    def closed(self):
+        return self.raw.closed
+
+
+    def close(self):
+        self.raw.close()
+
+
+class SEKAsyncDBConnectionPool(object):
+    """
+    Pool of asynchronous connections for a single event loop.
+
+    Usage:
+
+        pool = SEKAsyncDBConnectionPool(dsn, maxConnections = 10)
+        async with pool.connection() as conn:
+            cursor = conn.cursor()
+
+    Public API:
+
+        checkout(timeout: Float):SEKAsyncConnection
+
+        checkin(conn: SEKAsyncConnection, discard: Boolean)
+
+        connection(timeout: Float):async context manager
+
+        evictIdle():Int
+
+        closeAll()
+
+        stats():Dict
+    """
+
+    def __init__(self, dsn = '', minConnections = 0, maxConnections = 10,
+                 maxIdleTime = 300.0, healthCheckInterval = 30.0,
+                 checkoutTimeout = None, logLevel = 'silent'):
+        """
+        Constructor.
+
+        Connections are opened on demand. Use open() to open minConnections
+        up front.
+
+        :param dsn: String for the libpq connection string.
+        :param minConnections: Int number of connections never evicted for
+        being idle.
+        :param maxConnections: Int upper bound of open connections.
+        :param maxIdleTime: Float seconds after which an idle connection
+        beyond minConnections is closed.
+        :param healthCheckInterval: Float seconds of idleness after which a
+        connection is pinged on checkout.
+        :param checkoutTimeout: Float seconds to wait for a free connection
+        or None to wait indefinitely.
+        :param logLevel
+        """
+
+        if maxConnections < 1:
+            raise Exception('Invalid maximum number of connections.')
+        if minConnections < 0 or minConnections > maxConnections:
+            raise Exception('Invalid minimum number of connections.')
+
+        self.logger = SEKLogger(__name__, logLevel)
+        self.dsn = dsn
+        self.minConnections = minConnections
+        self.maxConnections = maxConnections
+        self.maxIdleTime = maxIdleTime
+        self.healthCheckInterval = healthCheckInterval
+        self.checkoutTimeout = checkoutTimeout
+
+        self._cond = None
+        self._idle = []
+        self._inUse = set()
+        self._size = 0
+        self._closed = False
+        self._counters = {'created': 0, 'closed': 0, 'checkouts': 0,
+                          'checkins': 0, 'waits': 0, 'evicted': 0,
+                          'healthCheckFailures': 0}
+
+
+    def _condition(self):
+        # Created lazily so that it binds to the running loop.
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+
+    async def open(self):
+        """
+        Open connections up to minConnections.
+        """
+
+        while self._size < self.minConnections:
+            self._size += 1
+            try:
+                conn = await SEKAsyncConnection.open(self.dsn)
+            except BaseException:
+                self._size -= 1
+                raise
+            self._counters['created'] += 1
+            self._idle.append([conn, time.time()])
+
+
+    def _closeConnection(self, conn):
+        conn.close()
+        self._counters['closed'] += 1
+
+
+    def _evictIdle(self, now):
+        evicted = 0
+        if self.maxIdleTime is None:
+            return evicted
+        while self._idle and self._size > self.minConnections and \
+                        now - self._idle[0][1] > self.maxIdleTime:
+            conn, lastUsed = self._idle.pop(0)
+            self._size -= 1
+            self._counters['evicted'] += 1
+            self._closeConnection(conn)
+            evicted += 1
+        return evicted
+
+
+    async def _isHealthy(self, conn, idleTime):
+        if conn.closed:
+            return False
+        if idleTime < self.healthCheckInterval:
+            return True
+        try:
+            await conn.cursor().execute('SELECT 1')
+        except Exception as detail:
+            self.logger.log('Pooled connection failed health check: {}',
+                            'warning', detail)
+            return False
+        return True
+
+
+    async def checkout(self, timeout = None):
+        """
+        Take a connection out of the pool, opening a new one if none are idle
+        and the pool is not at its maximum size.
+
+        :param timeout: Float seconds to wait for a connection. Defaults to
+        the pool's checkoutTimeout.
+        :returns: SEKAsyncConnection
+        """
+
+        if timeout is None:
+            timeout = self.checkoutTimeout
+        deadline = None if timeout is None else time.time() + timeout
+        cond = self._condition()
+
+        while True:
+            if self._closed:
+                raise Exception('Connection pool is closed.')
+
+            now = time.time()
+            self._evictIdle(now)
+
+            if self._idle:
+                conn, lastUsed = self._idle.pop()
+                self._inUse.add(conn)
+                if await self._isHealthy(conn, now - lastUsed):
+                    self._counters['checkouts'] += 1
+                    return conn
+                self._inUse.discard(conn)
+                self._size -= 1
+                self._counters['healthCheckFailures'] += 1
+                self._closeConnection(conn)
+                continue
+
+            if self._size < self.maxConnections:
+                self._size += 1
+                try:
+                    conn = await SEKAsyncConnection.open(self.dsn)
+                except BaseException:
+                    self._size -= 1
+                    async with cond:
+                        cond.notify()
+                    raise
+                self._inUse.add(conn)
+                self._counters['created'] += 1
+                self._counters['checkouts'] += 1
+                return conn
+
+            self._counters['waits'] += 1
+            async with cond:
+                if deadline is None:
+                    await cond.wait()
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise Exception('Timed out waiting for a pooled DB '
+                                        'connection.')
+                    try:
+                        await asyncio.wait_for(cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+
+
+    async def checkin(self, conn, discard = False):
+        """
+        Return a connection to the pool. An open transaction is rolled back.
+
+        :param conn: SEKAsyncConnection obtained from checkout().
+        :param discard: Boolean if True, the connection is closed instead of
+        being reused.
+        """
+
+        if conn not in self._inUse:
+            raise Exception('Connection does not belong to this pool.')
+
+        if not discard and not conn.closed:
+            try:
+                await conn.rollback()
+            except Exception as detail:
+                self.logger.log('Discarding pooled connection after failed '
+                                'rollback: {}', 'warning', detail)
+                discard = True
+
+        self._inUse.discard(conn)
+        self._counters['checkins'] += 1
+        if discard or conn.closed or self._closed:
+            self._size -= 1
+            self._closeConnection(conn)
+        else:
+            self._idle.append([conn, time.time()])
+
+        cond = self._condition()
+        async with cond:
+            cond.notify()
+
+
+    @asynccontextmanager
+    async def connection(self, timeout = None):
+        """
+        Checkout a connection for the duration of an async with block.
+        """
+
+        conn = await self.checkout(timeout)
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            await self.checkin(conn, discard = discard)
+
+
+    def evictIdle(self):
+        """
+        :returns: Int number of idle connections closed.
+        """
+
+        return self._evictIdle(time.time())
+
+
+    def closeAll(self):
+        """
+        Close all idle connections. Connections currently checked out are
+        closed when they are checked in.
+        """
+
+        self._closed = True
+        idle = self._idle
+        self._idle = []
+        self._size -= len(idle)
+        for conn, lastUsed in idle:
+            self._closeConnection(conn)
+
+
+    def stats(self):
+        """
+        :returns: Dict of pool counters along with the current number of
+        idle, in use and open connections.
+        """
+
+        stats = dict(self._counters)
+        stats['idle'] = len(self._idle)
+        stats['inUse'] = len(self._inUse)
+        stats['size'] = self._size
+        return stats
+
+
+def sharedPool(dsn = '', minConnections = 0, maxConnections = 10, **kwargs):
+    """
+    Get the pool for a DSN on the running event loop, creating it on first
+    use.
+
+    :param dsn: String for the libpq connection string.
+    :returns: SEKAsyncDBConnectionPool
+    """
+
+    pools = _sharedPools.setdefault(asyncio.get_running_loop(), {})
+    pool = pools.get(dsn)
+    if pool is None or pool._closed:
+        pool = SEKAsyncDBConnectionPool(dsn, minConnections = minConnections,
+                                        maxConnections = maxConnections,
+                                        **kwargs)
+        pools[dsn] = pool
+    return pool
+
+
+class SEKAsyncDBConnector(object):
+    """
+    Make and manage asynchronous connections to a PostgreSQL database.
+
+    Usage:
+
+        connector = SEKAsyncDBConnector(dbName = 'db')
+        conn = await connector.connectDB()
+        cursor = conn.cursor()
+        ...
+        await connector.closeDB(conn)
+
+    With usePool = True, connections come from a pool shared by all
+    connectors with the same connection parameters on the running event
+    loop.
+    """
+
+    def __init__(self, dbName = '', dbHost = '', dbPort = '', dbUsername = '',
+                 dbPassword = '', testing = False, logLevel = 'silent',
+                 usePool = False, minConnections = 0, maxConnections = 10):
+        """
+        Constructor.
+
+        No connection is made until connectDB() is awaited.
+
+        :param testing: Boolean indicating if Testing Mode is on.
+        :param logLevel
+        :param usePool: Boolean if True, connections are taken from a shared
+        connection pool.
+        :param minConnections: Int minimum size of the shared pool.
+        :param maxConnections: Int maximum size of the shared pool.
+        """
+
+        self.logger = SEKLogger(__name__, logLevel)
+
+        if testing:
+            self.logger.log("Testing Mode is ON.")
+
+        self.dbName = dbName
+        self.dbHost = dbHost
+        self.dbPort = dbPort
+        self.dbPassword = dbPassword
+        self.dbUsername = dbUsername
+        self.dsn = "dbname='{0}' user='{1}' host='{2}' port='{3}' " \
+                   "password='{4}'".format(self.dbName, self.dbUsername,
+                                           self.dbHost, self.dbPort,
+                                           self.dbPassword)
+        self.usePool = usePool
+        self.minConnections = minConnections
+        self.maxConnections = maxConnections
+        self.logLevel = logLevel
+
+
+    @property
+    def pool(self):
+        """
+        :returns: The shared pool for the running event loop, or None if
+        pooling is off.
+        """
+
+        if not self.usePool:
+            return None
+        return sharedPool(self.dsn, minConnections = self.minConnections,
+                          maxConnections = self.maxConnections,
+                          logLevel = self.logLevel)
+
+
+    async def connectDB(self):
+        """
+        Make the DB connection.
+
+        :returns: SEKAsyncConnection
+        """
+
+        try:
+            if self.usePool:
+                conn = await self.pool.checkout()
+            else:
+                conn = await SEKAsyncConnection.open(self.dsn)
+        except Exception as detail:
+            self.logger.log("Failed to connect to the database {}: {}.",
+                            'error', self.dbName, detail)
+            raise
+
+        self.logger.log("Opened DB connection to database {}.", 'info',
+                        self.dbName)
+        return conn
+
+
+    async def closeDB(self, conn):
+        """
+        Close a database connection. Pooled connections are returned to the
+        pool instead.
+        """
+
+        self.logger.log("Closing database {}.", 'info', self.dbName)
+        if self.usePool:
+            await self.pool.checkin(conn)
+        else:
+            conn.close()
+
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Provide a connection for the duration of an async with block.
+        """
+
+        conn = await self.connectDB()
+        try:
+            yield conn
+        finally:
+            await self.closeDB(conn)
+
+
+class SEKAsyncDBUtil(object):
+    """
+    Asynchronous counterpart of SEKDBUtil. Cursors are SEKAsyncCursors
+    obtained from SEKAsyncConnection.cursor().
+
+    Public API:
+
+        executeSQL(cursor: SEKAsyncCursor, sql: String, exitOnFail: Boolean,
+                   params: Tuple):Boolean
+
+        executeBatch(cursor: SEKAsyncCursor, sql: String, argsList: Iterable,
+                     pageSize: Int, exitOnFail: Boolean):Int
+
+        streamRows(cursor: SEKAsyncCursor, sql: String, params: Tuple,
+                   itersize: Int, batchSize: Int,
+                   exitOnFail: Boolean):async generator
+
+        bulkLoad(cursor: SEKAsyncCursor, table: String, rows: Iterable,
+                 columns: List, chunkSize: Int, commitEachChunk: Boolean,
+                 exitOnFail: Boolean):Dict
+    """
+
+    def __init__(self):
+        """
+        Constructor.
+        """
+
+        self.logger = SEKLogger(__name__, 'DEBUG')
+
+
+    async def executeSQL(self, cursor, sql, exitOnFail = True, params = None):
+        """
+        Execute SQL given a cursor and a SQL statement.
+
+        :param cursor: SEKAsyncCursor.
+        :param sql: String of a SQL statement.
+        :param params: Optional tuple or dict of values for placeholders.
+        :returns: Boolean True for success, execution is aborted if there is
+        an error.
+        """
+
+        success = True
+        try:
+            await cursor.execute(sql, params)
+
+        except Exception as detail:
+            success = False
+            self.logger.log("SQL execute failed using {}. The error is: {}.",
+                            'error', sql, detail)
+            if exitOnFail:
+                sys.exit(-1)
+
+        return success
+
+
+    async def executeBatch(self, cursor, sql, argsList, pageSize = 100,
+                           exitOnFail = True, template = None):
+        """
+        Execute a statement containing a single VALUES %s placeholder for
+        pages of up to pageSize parameter tuples.
+
+        :param cursor: SEKAsyncCursor.
+        :param sql: String of a SQL statement containing VALUES %s.
+        :param argsList: Iterable of parameter tuples.
+        :param pageSize: Int maximum number of rows per statement.
+        :param exitOnFail: Boolean if True, exit on a failed statement.
+        :param template: Optional String for a row template such as
+        '(%s, %s, NOW())'.
+        :returns: Int total of affected rows, or None if a statement failed
+        and exitOnFail is False.
+        """
+
+        if pageSize < 1:
+            raise Exception('Invalid page size.')
+
+        parts = sql.split('%s')
+        if len(parts) != 2:
+            raise Exception('Statement needs a single %s placeholder.')
+        before, after = (part.replace('%%', '%') for part in parts)
+        encoding = psycopg2.extensions.encodings[
+            cursor.connection.raw.encoding]
+
+        total = 0
+        args = iter(argsList)
+        while True:
+            page = list(islice(args, pageSize))
+            if not page:
+                break
+
+            rowTemplate = template
+            if not rowTemplate:
+                rowTemplate = '({})'.format(','.join(['%s'] * len(page[0])))
+            values = b','.join(cursor.mogrify(rowTemplate, row)
+                               for row in page).decode(encoding)
+
+            if not await self.executeSQL(cursor, before + values + after,
+                                         exitOnFail):
+                return None
+            if cursor.rowcount > 0:
+                total += cursor.rowcount
+
+        return total
+
+
+    async def streamRows(self, cursor, sql, params = None, itersize = 2000,
+                         batchSize = None, exitOnFail = True):
+        """
+        Yield the result rows of a query without materializing them
+        client-side, using DECLARE and FETCH on the cursor's connection.
+
+        A transaction is opened for the duration of the iteration if one is
+        not already open. The server-side cursor is closed when the
+        generator is exhausted or closed.
+
+        Usage:
+
+            async for row in dbUtil.streamRows(cursor, sql):
+                process(row)
+
+        :param cursor: SEKAsyncCursor whose connection and cursor class are
+        used.
+        :param sql: String of a SQL query.
+        :param params: Optional tuple or dict of values for placeholders.
+        :param itersize: Int number of rows fetched per round trip.
+        :param batchSize: Optional Int. If given, lists of up to batchSize
+        rows are yielded instead of single rows.
+        :param exitOnFail: Boolean if True, exit on a failed query.
+        """
+
+        conn = cursor.connection
+        fetchCursor = conn.cursor(cursor_factory = type(cursor.raw))
+        name = 'sek_stream_{}'.format(next(_serverCursorIDs))
+
+        ownTransaction = not conn.inTransaction()
+        if ownTransaction:
+            await conn.begin()
+
+        declared = False
+        try:
+            declared = await self.executeSQL(
+                fetchCursor, 'DECLARE "{}" NO SCROLL CURSOR FOR {}'.format(
+                    name, fetchCursor.mogrify(sql, params).decode(
+                        psycopg2.extensions.encodings[conn.raw.encoding])),
+                exitOnFail)
+            if not declared:
+                return
+
+            fetch = 'FETCH FORWARD {} FROM "{}"'.format(itersize, name)
+            batch = []
+            while True:
+                if not await self.executeSQL(fetchCursor, fetch, exitOnFail):
+                    return
+                rows = fetchCursor.fetchall()
+                if not rows:
+                    break
+                if not batchSize:
+                    for row in rows:
+                        yield row
+                    continue
+                batch.extend(rows)
+                while len(batch) >= batchSize:
+                    yield batch[:batchSize]
+                    batch = batch[batchSize:]
+            if batch:
+                yield batch
+        finally:
+            if not conn.closed:
+                if ownTransaction:
+                    await conn.rollback()
+                elif declared:
+                    await fetchCursor.execute('CLOSE "{}"'.format(name))
+
+
+    async def bulkLoad(self, cursor = None, table = None, rows = None,
+                       columns = None, chunkSize = 1000,
+                       commitEachChunk = False, exitOnFail = True):
+        """
+        Load rows into a table using multi-row INSERT statements of at most
+        chunkSize rows.
+
+        Outside of an explicit transaction each chunk is committed as it is
+        sent. Inside one, commitEachChunk commits after each chunk and
+        starts a new transaction.
+
+        :param cursor: SEKAsyncCursor.
+        :param table: Name of the table to load.
+        :param rows: Iterable of tuples in column order or of dicts keyed by
+        column name.
+        :param columns: List of column names. Defaults to all columns of the
+        table in their defined order.
+        :param chunkSize: Int maximum number of rows per statement.
+        :param commitEachChunk: Boolean if True, commit after each chunk.
+        :param exitOnFail: Boolean if True, exit on a failed insert.
+        :returns: Dict with the number of rows and chunks loaded, the elapsed
+        seconds and the rows per second, or None if an insert failed and
+        exitOnFail is False.
+        """
+
+        if not cursor:
+            raise Exception('Cursor not defined.')
+        if not table:
+            raise Exception('Table not defined.')
+        if rows is None:
+            raise Exception('Rows not defined.')
+        if chunkSize < 1:
+            raise Exception('Invalid chunk size.')
+
+        if not columns:
+            columns = await self.columns(cursor, table)
+
+        sql = 'INSERT INTO "{}" ({}) VALUES %s'.format(
+            table, ','.join('"{}"'.format(col) for col in columns))
+
+        stats = {'rows': 0, 'chunks': 0, 'seconds': 0.0,
+                 'rowsPerSecond': 0.0}
+        start = time.time()
+        conn = cursor.connection
+        rows = iter(rows)
+
+        while True:
+            chunk = list(islice(rows, chunkSize))
+            if not chunk:
+                break
+            chunk = [[row.get(col) for col in columns] if isinstance(row,
+                                                                     dict)
+                     else row for row in chunk]
+            if await self.executeBatch(cursor, sql, chunk,
+                                       pageSize = chunkSize,
+                                       exitOnFail = exitOnFail) is None:
+                return None
+            if commitEachChunk and conn.inTransaction():
+                await conn.commit()
+                await conn.begin()
+            stats['rows'] += len(chunk)
+            stats['chunks'] += 1
+
+        stats['seconds'] = time.time() - start
+        if stats['seconds'] > 0:
+            stats['rowsPerSecond'] = stats['rows'] / stats['seconds']
+
+        self.logger.log('Loaded {} rows into {} in {} chunks at {:.0f} '
+                        'rows/s.', 'debug', stats['rows'], table, stats['chunks'],
+                        stats['rowsPerSecond'])
+        return stats
+
+
+    async def getDBName(self, cursor):
+        """
+        :returns: Name of the current database.
+        """
+
+        await self.executeSQL(cursor, """select current_database();""")
+        return cursor.fetchone()
+
+
+    async def tableColumns(self, cursor, table):
+        """
+        :returns: List of tuples with column names in the first position.
+        """
+
+        sql = """SELECT column_name FROM information_schema.columns WHERE
+        table_name = %s ORDER BY ordinal_position;"""
+        await self.executeSQL(cursor, sql, params = (table,))
+        return cursor.fetchall()
+
+
+    async def columns(self, cursor = None, table = None):
+        """
+        :returns: List of column names for a given table.
+        """
+
+        if not cursor:
+            raise Exception('Cursor not defined.')
+        if not table:
+            raise Exception('Table not defined.')
+        return [col[0] for col in await self.tableColumns(cursor, table)]
+
+
+    async def columnsString(self, cursor = None, table = None):
+        return ','.join(await self.columns(cursor, table))
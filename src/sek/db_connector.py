@@ -6,7 +6,10 @@ __copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
 
 import psycopg2
 import psycopg2.extras
+import time
+from contextlib import contextmanager
 from sek.logger import SEKLogger
+from sek.db_pool import sharedPool
 import sys
 
 
@@ -19,11 +22,37 @@ class SEKDBConnector(object):
         conn = SEKDBConnector().connectDB()
         cursor = conn.cursor()
 
+    Pooled usage:
+
+        connector = SEKDBConnector(dbName = 'db', usePool = True)
+        with connector.connection() as conn:
+            cursor = conn.cursor()
+
+    When pooling is on, connections come from a process-wide pool shared by
+    all connectors with the same connection parameters. connectDB() checks
+    a connection out of the pool and closeDB() returns it. Pooling is off
+    by default: a pool holds its connections open after closeDB() and
+    makes checkouts wait once maxConnections are in use, which programs
+    that keep many connectors alive do not expect.
+
+    Resilient usage:
+
+        connector = SEKDBConnector(dbName = 'db', resilient = True)
+
+    In resilient mode, connecting is retried with exponential backoff and
+    an exception is raised instead of exiting when all attempts fail.
+    connectDB() returns a SEKResilientConnection that can reconnect in
+    place, and its cursors follow the new connection. SEKDBUtil.executeSQL
+    uses this to reconnect transparently after a connection is lost.
+
     """
 
 
     def __init__(self, dbName = '', dbHost = '', dbPort = '', dbUsername = '',
-                 dbPassword = '', testing = False, logLevel = 'silent'):
+                 dbPassword = '', testing = False, logLevel = 'silent',
+                 usePool = False, minConnections = 1, maxConnections = 10,
+                 resilient = False, connectRetries = 5, retryBackoff = 0.5,
+                 maxRetryBackoff = 30.0):
         """
         Constructor.
 
@@ -31,9 +60,22 @@ class SEKDBConnector(object):
         testing mode is on, a connection to the testing database will be made
         instead of the production database. This is useful for unit testing.
         :param logLevel
+        :param usePool: Boolean if True, connections are taken from a shared
+        connection pool.
+        :param minConnections: Int minimum size of the shared pool.
+        :param maxConnections: Int maximum size of the shared pool.
+        :param resilient: Boolean if True, connections are retried and can
+        be reconnected instead of exiting on failure.
+        :param connectRetries: Int number of retries of a failed connection
+        attempt in resilient mode.
+        :param retryBackoff: Float seconds to wait before the first retry.
+        The wait doubles with each further retry.
+        :param maxRetryBackoff: Float upper bound in seconds of the wait
+        between retries.
         """
 
         self.logger = SEKLogger(__name__, logLevel)
+        self.resilient = resilient
 
         if testing:
             self.logger.log("Testing Mode is ON.")
@@ -43,6 +85,30 @@ class SEKDBConnector(object):
         self.dbPort = dbPort
         self.dbPassword = dbPassword
         self.dbUsername = dbUsername
+        self.dsn = "dbname='{0}' user='{1}' host='{2}' port='{3}' " \
+                   "password='{4}'".format(self.dbName, self.dbUsername,
+                                           self.dbHost, self.dbPort,
+                                           self.dbPassword)
+
+        self.pool = None
+        self._connClosed = False
+        if usePool:
+            try:
+                self.pool = sharedPool(self.dsn,
+                                       minConnections = minConnections,
+                                       maxConnections = maxConnections,
+                                       logLevel = logLevel)
+            except Exception as detail:
+                self.logger.log(
+                    "Failed to create connection pool for database {}: "
+                    "{}.".format(self.dbName, detail), 'error')
+                sys.exit(-1)
+
+        self.opener = SEKDBConnectionOpener(self.dsn, self.pool, self.logger,
+                                            dbName = dbName,
+                                            connectRetries = connectRetries,
+                                            retryBackoff = retryBackoff,
+                                            maxRetryBackoff = maxRetryBackoff)
 
         self.logger.log(
             "Instantiating DB connector with database {}.".format(dbName))
@@ -62,37 +128,77 @@ class SEKDBConnector(object):
     def connectDB(self):
         """
         Make the DB connection.
-        :returns: DB connection object if successful, otherwise None.
+        :returns: DB connection object if successful, otherwise None. In
+        resilient mode, a SEKResilientConnection.
         """
 
         # @todo Make this method private since the init makes the connection.
 
+        if self.resilient:
+            return SEKResilientConnection(self.opener,
+                                          self.opener.openWithRetries())
+
         conn = None
 
         try:
-            conn = psycopg2.connect(
-                "dbname='{0}' user='{1}' host='{2}' port='{3}' password='{"
-                "4}'".format(self.dbName, self.dbUsername, self.dbHost,
-                             self.dbPort, self.dbPassword))
+            conn = self.opener.open()
         except Exception as detail:
-            self.logger.log(
-                "Failed to connect to the database {}: {}.".format(self.dbName,
-                                                                   detail),
-                'error')
+            self.logger.log("Failed to connect to the database {}: {}.",
+                            'error', self.dbName, detail)
             sys.exit(-1)
 
-        self.logger.log(
-            "Opened DB connection to database {}.".format(self.dbName))
+        self.logger.log("Opened DB connection to database {}.", 'info',
+                        self.dbName)
         return conn
 
 
+    def backoff(self, attempt):
+        """
+        :param attempt: Int number of the retry starting at 0.
+        :returns: Float seconds to wait before the retry.
+        """
+
+        return self.opener.backoff(attempt)
+
+
+    @property
+    def reconnects(self):
+        """
+        :returns: Int number of reconnects of this connector's connections.
+        """
+
+        return self.opener.reconnects
+
+
     def closeDB(self, conn):
         """
-        Close a database connection.
+        Close a database connection. Pooled connections are returned to the
+        pool instead.
         """
 
         self.logger.log("Closing database {}.".format(self.dbName))
-        conn.close()
+        if conn is getattr(self, 'conn', None):
+            self._connClosed = True
+        if isinstance(conn, SEKResilientConnection):
+            conn = conn.rawConnection
+        if self.pool:
+            self.pool.checkin(conn)
+        else:
+            conn.close()
+
+
+    @contextmanager
+    def connection(self):
+        """
+        Provide a connection for the duration of a with block and close it,
+        or return it to the pool, afterwards.
+        """
+
+        conn = self.connectDB()
+        try:
+            yield conn
+        finally:
+            self.closeDB(conn)
 
 
     def __del__(self):
@@ -102,7 +208,228 @@ class SEKDBConnector(object):
         Close the database connection.
         """
 
+        if not hasattr(self, 'conn'):
+            # The constructor failed before connecting.
+            return
+        if self._connClosed:
+            # The connection was already closed or returned with closeDB().
+            return
+
         self.logger.log(
             "Closing the DB connection to database {}.".format(self.dbName))
-        self.conn.close()
+        if self.pool:
+            try:
+                self.dictCur.close()
+            except Exception:
+                pass
+            self.closeDB(self.conn)
+        else:
+            self.conn.close()
+
+
+
+class SEKDBConnectionOpener(object):
+    """
+    Opens connections for a SEKDBConnector and reopens the connections of
+    resilient connectors.
+
+    It is kept apart from the connector so that resilient connections do not
+    refer back to the connector and keep it alive.
+    """
+
+    def __init__(self, dsn, pool, logger, dbName = '', connectRetries = 5,
+                 retryBackoff = 0.5, maxRetryBackoff = 30.0):
+        """
+        Constructor.
+
+        :param dsn: String for the libpq connection string.
+        :param pool: SEKDBConnectionPool or None.
+        :param logger: SEKLogger of the connector.
+        :param dbName: String for the database name used in log messages.
+        :param connectRetries: Int number of retries of a failed connection
+        attempt.
+        :param retryBackoff: Float seconds to wait before the first retry.
+        :param maxRetryBackoff: Float upper bound in seconds of the wait
+        between retries.
+        """
+
+        self.dsn = dsn
+        self.pool = pool
+        self.logger = logger
+        self.dbName = dbName
+        self.connectRetries = connectRetries
+        self.retryBackoff = retryBackoff
+        self.maxRetryBackoff = maxRetryBackoff
+        self.reconnects = 0
+
+
+    def open(self):
+        """
+        :returns: A new DB connection, from the pool if pooling is on.
+        """
+
+        if self.pool:
+            return self.pool.checkout()
+        return psycopg2.connect(self.dsn)
+
+
+    def openWithRetries(self):
+        """
+        Connect, retrying with exponential backoff while the server cannot be
+        reached.
+
+        :returns: DB connection.
+        :raises: psycopg2.OperationalError if all attempts failed.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                conn = self.open()
+            except psycopg2.OperationalError as detail:
+                if attempt >= self.connectRetries:
+                    self.logger.log("Failed to connect to the database {} "
+                                    "after {} attempts: {}.", 'error',
+                                    self.dbName, attempt + 1, detail)
+                    raise
+                delay = self.backoff(attempt)
+                self.logger.log("Failed to connect to the database {}: {}. "
+                                "Retrying in {:.1f} s.", 'warning',
+                                self.dbName, detail, delay)
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self.logger.log("Opened DB connection to database {}.", 'info',
+                            self.dbName)
+            return conn
+
+
+    def backoff(self, attempt):
+        """
+        :param attempt: Int number of the retry starting at 0.
+        :returns: Float seconds to wait before the retry.
+        """
+
+        return min(self.maxRetryBackoff, self.retryBackoff * (2 ** attempt))
+
+
+    def reopen(self, conn):
+        """
+        Replace a broken connection with a new one.
+
+        :param conn: DB connection to replace. It is closed, or discarded
+        from the pool.
+        :returns: New DB connection.
+        """
+
+        self.logger.log(
+            "Reconnecting to database {}.".format(self.dbName), 'warning')
+        try:
+            if self.pool:
+                self.pool.checkin(conn, discard = True)
+            elif not conn.closed:
+                conn.close()
+        except Exception as detail:
+            self.logger.log('Error while closing broken connection: '
+                            '{}'.format(detail), 'warning')
+        newConn = self.openWithRetries()
+        self.reconnects += 1
+        return newConn
+
+
+class SEKResilientConnection(object):
+    """
+    A DB connection that can be replaced in place after it is lost.
+
+    Attributes not defined here are those of the current psycopg2
+    connection. Cursors obtained from cursor() are SEKResilientCursors that
+    follow the connection when it is replaced.
+    """
+
+    def __init__(self, opener, conn):
+        """
+        Constructor.
+
+        :param opener: SEKDBConnectionOpener used for reconnecting.
+        :param conn: psycopg2 connection.
+        """
+
+        self.opener = opener
+        self.rawConnection = conn
+
+        # Incremented on each reconnect so that cursors can tell that their
+        # connection was replaced.
+        self.generation = 0
+
+
+    def __getattr__(self, name):
+        return getattr(self.rawConnection, name)
+
+
+    def cursor(self, *args, **kwargs):
+        return SEKResilientCursor(self, args, kwargs)
+
+
+    def reconnect(self):
+        """
+        Replace the underlying connection with a new one. Any open
+        transaction on the old connection is lost.
+        """
+
+        self.rawConnection = self.opener.reopen(self.rawConnection)
+        self.generation += 1
+
+
+class SEKResilientCursor(object):
+    """
+    A cursor of a SEKResilientConnection. It is recreated on the new
+    connection when the connection has been replaced.
+
+    Attributes not defined here are those of the current psycopg2 cursor.
+    """
+
+    def __init__(self, connection, args = (), kwargs = None):
+        """
+        Constructor.
+
+        :param connection: SEKResilientConnection.
+        :param args: Positional arguments for creating the cursor.
+        :param kwargs: Keyword arguments for creating the cursor.
+        """
+
+        self.resilientConnection = connection
+        self._args = args
+        self._kwargs = kwargs or {}
+        self._generation = connection.generation
+        self._cursor = connection.rawConnection.cursor(*args, **self._kwargs)
+
+
+    @property
+    def rawCursor(self):
+        """
+        :returns: The psycopg2 cursor on the current connection.
+        """
+
+        conn = self.resilientConnection
+        if self._generation != conn.generation:
+            self._cursor = conn.rawConnection.cursor(*self._args,
+                                                     **self._kwargs)
+            self._generation = conn.generation
+        return self._cursor
+
+
+    def __getattr__(self, name):
+        return getattr(self.rawCursor, name)
+
+
+    def __iter__(self):
+        return iter(self.rawCursor)
+
+
+    def execute(self, sql, params = None):
+        return self.rawCursor.execute(sql, params)
+
 
+    def reconnect(self):
+        self.resilientConnection.reconnect()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import time
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+from sek.logger import SEKLogger
+
+# Outcome of a single query run by SEKDBParallelExecutor. error is None if
+# the query succeeded and rows is None if it did not return rows.
+SEKQueryResult = namedtuple('SEKQueryResult',
+                            ['index', 'sql', 'params', 'rows', 'rowcount',
+                             'seconds', 'error'])
+
+
+class SEKDBParallelExecutor(object):
+    """
+    Run independent queries concurrently over pooled DB connections.
+
+    Each query runs on its own connection checked out of the pool, so a
+    failing query does not affect the others.
+
+    Usage:
+
+        connector = SEKDBConnector(dbName = 'db', usePool = True,
+                                   maxConnections = 8)
+        executor = SEKDBParallelExecutor(connector.pool, workers = 8)
+        results = executor.execute(['SELECT ...', ('SELECT ... %s', (1,))])
+        executor.close()
+
+    Public API:
+
+        execute(queries: List, commit: Boolean):List of SEKQueryResult
+            Results in the order of the queries.
+
+        executeAsCompleted(queries: List, commit: Boolean):Generator
+            Results in the order in which the queries finish.
+
+        executeWithParams(sql: String, paramSets: List,
+                          commit: Boolean):List of SEKQueryResult
+            Run one statement with each of the parameter sets.
+
+        close()
+    """
+
+    def __init__(self, pool = None, workers = 4, logLevel = 'silent'):
+        """
+        Constructor.
+
+        :param pool: SEKDBConnectionPool providing connections. It should
+        allow at least as many connections as there are workers.
+        :param workers: Int number of queries run at the same time.
+        :param logLevel
+        """
+
+        if not pool:
+            raise Exception('Connection pool not defined.')
+        if workers < 1:
+            raise Exception('Invalid number of workers.')
+
+        self.logger = SEKLogger(__name__, logLevel)
+        self.pool = pool
+        self.workers = workers
+        self._threads = ThreadPool(workers)
+
+
+    def _run(self, task):
+        """
+        Run one query on a pooled connection.
+
+        :param task: Tuple of (index, sql, params, commit).
+        :returns: SEKQueryResult
+        """
+
+        index, sql, params, commit = task
+        rows = None
+        rowcount = -1
+        error = None
+        start = time.time()
+
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                rowcount = cursor.rowcount
+                if cursor.description is not None:
+                    rows = cursor.fetchall()
+                if commit:
+                    conn.commit()
+                cursor.close()
+        except Exception as detail:
+            error = detail
+            self.logger.log('Query {} failed: {}', 'error', index, detail)
+
+        seconds = time.time() - start
+        self.logger.log('Query {} took {:.3f} s.', 'debug', index, seconds)
+        return SEKQueryResult(index, sql, params, rows, rowcount, seconds,
+                              error)
+
+
+    def _tasks(self, queries, commit):
+        for index, query in enumerate(queries):
+            if isinstance(query, tuple):
+                sql, params = query
+            else:
+                sql, params = query, None
+            yield (index, sql, params, commit)
+
+
+    def execute(self, queries, commit = False):
+        """
+        Run queries concurrently and wait for all of them.
+
+        :param queries: List of SQL strings or (sql, params) tuples.
+        :param commit: Boolean if True, each query is committed.
+        :returns: List of SEKQueryResult in the order of the queries.
+        """
+
+        return self._threads.map(self._run, list(self._tasks(queries, commit)),
+                                 chunksize = 1)
+
+
+    def executeAsCompleted(self, queries, commit = False):
+        """
+        Run queries concurrently and yield results as they finish.
+
+        :param queries: List of SQL strings or (sql, params) tuples.
+        :param commit: Boolean if True, each query is committed.
+        :returns: Generator of SEKQueryResult. The index field gives the
+        position of the query.
+        """
+
+        for result in self._threads.imap_unordered(
+                self._run, self._tasks(queries, commit)):
+            yield result
+
+
+    def executeWithParams(self, sql, paramSets, commit = False):
+        """
+        Run a statement once for each parameter set, such as per table
+        partition or per date range.
+
+        :param sql: String of a SQL statement with placeholders.
+        :param paramSets: List of parameter tuples or dicts.
+        :param commit: Boolean if True, each query is committed.
+        :returns: List of SEKQueryResult in the order of the parameter sets.
+        """
+
+        return self.execute([(sql, params) for params in paramSets], commit)
+
+
+    def close(self):
+        """
+        Stop the worker threads after pending queries have finished.
+        """
+
+        self._threads.close()
+        self._threads.join()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+from sek.logger import SEKLogger
+
+# Pools shared by all connectors in the process, keyed by DSN.
+_sharedPools = {}
+_sharedPoolsLock = threading.Lock()
+
+
+class SEKDBConnectionPool(object):
+    """
+    Thread-safe pool of PostgreSQL connections.
+
+    Connections are opened on demand up to maxConnections and are kept open
+    after being checked in so that later checkouts avoid the connection
+    handshake. Connections that stay idle for longer than maxIdleTime are
+    closed while more than minConnections are open.
+
+    Usage:
+
+        pool = SEKDBConnectionPool(dsn, minConnections = 1,
+                                   maxConnections = 10)
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+
+    Public API:
+
+        checkout(timeout: Float):DB connection
+            Take a connection out of the pool.
+
+        checkin(conn: DB connection, discard: Boolean)
+            Return a connection to the pool.
+
+        connection(timeout: Float):context manager
+            Checkout a connection for the duration of a with block.
+
+        evictIdle():Int
+            Close connections that have been idle for too long.
+
+        closeAll()
+            Close all idle connections and stop handing out new ones.
+
+        stats():Dict
+            Counters describing pool usage.
+    """
+
+    def __init__(self, dsn = '', minConnections = 1, maxConnections = 10,
+                 maxIdleTime = 300.0, healthCheckInterval = 30.0,
+                 checkoutTimeout = None, logLevel = 'silent'):
+        """
+        Constructor.
+
+        :param dsn: String for the libpq connection string.
+        :param minConnections: Int number of connections opened up front and
+        never evicted for being idle.
+        :param maxConnections: Int upper bound of open connections.
+        :param maxIdleTime: Float seconds after which an idle connection
+        beyond minConnections is closed.
+        :param healthCheckInterval: Float seconds of idleness after which a
+        connection is pinged on checkout. Use 0 to ping on every checkout.
+        :param checkoutTimeout: Float seconds to wait for a free connection
+        or None to wait indefinitely.
+        :param logLevel
+        """
+
+        if maxConnections < 1:
+            raise Exception('Invalid maximum number of connections.')
+        if minConnections < 0 or minConnections > maxConnections:
+            raise Exception('Invalid minimum number of connections.')
+
+        self.logger = SEKLogger(__name__, logLevel)
+        self.dsn = dsn
+        self.minConnections = minConnections
+        self.maxConnections = maxConnections
+        self.maxIdleTime = maxIdleTime
+        self.healthCheckInterval = healthCheckInterval
+        self.checkoutTimeout = checkoutTimeout
+
+        self._cond = threading.Condition(threading.Lock())
+        self._countersLock = threading.Lock()
+
+        # Idle connections as [conn, lastUsedTime] with the most recently
+        # used connection at the end.
+        self._idle = []
+        self._inUse = set()
+        self._size = 0
+        self._closed = False
+
+        self._counters = {'created': 0, 'closed': 0, 'checkouts': 0,
+                          'checkins': 0, 'waits': 0, 'evicted': 0,
+                          'healthCheckFailures': 0}
+
+        for i in range(minConnections):
+            self._idle.append([self._newConnection(), time.time()])
+            self._size += 1
+            self._counters['created'] += 1
+
+
+    def _newConnection(self):
+        conn = psycopg2.connect(self.dsn)
+        self.logger.log('Opened pooled DB connection.', 'debug')
+        return conn
+
+
+    def _closeConnection(self, conn):
+        try:
+            conn.close()
+        except Exception as detail:
+            self.logger.log(
+                'Error while closing pooled connection: {}'.format(detail),
+                'warning')
+        with self._countersLock:
+            self._counters['closed'] += 1
+
+
+    def _isHealthy(self, conn, idleTime):
+        """
+        :returns: True if the connection can be handed out.
+        """
+
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == \
+                psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if idleTime < self.healthCheckInterval:
+            return True
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            if not conn.autocommit:
+                conn.rollback()
+        except Exception as detail:
+            self.logger.log('Pooled connection failed health check: '
+                            '{}'.format(detail), 'warning')
+            return False
+        return True
+
+
+    def _evictIdleLocked(self, now):
+        """
+        Take expired connections out of the idle list. The lock must be held.
+
+        :returns: List of the expired connections. The caller closes them
+        after releasing the lock.
+        """
+
+        expired = []
+        if self.maxIdleTime is None:
+            return expired
+
+        # The oldest connections are at the front of the idle list.
+        while self._idle and self._size > self.minConnections and \
+                        now - self._idle[0][1] > self.maxIdleTime:
+            conn, lastUsed = self._idle.pop(0)
+            self._size -= 1
+            self._counters['evicted'] += 1
+            expired.append(conn)
+        return expired
+
+
+    def checkout(self, timeout = None):
+        """
+        Take a connection out of the pool, opening a new one if none are idle
+        and the pool is not at its maximum size.
+
+        :param timeout: Float seconds to wait for a connection. Defaults to
+        the pool's checkoutTimeout.
+        :returns: DB connection.
+        """
+
+        if timeout is None:
+            timeout = self.checkoutTimeout
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            conn = None
+            idleTime = 0.0
+            create = False
+
+            with self._cond:
+                if self._closed:
+                    raise Exception('Connection pool is closed.')
+
+                # Nothing is expired when the wait below is reached, since
+                # eviction leaves the pool below its maximum size.
+                now = time.time()
+                expired = self._evictIdleLocked(now)
+
+                if self._idle:
+                    conn, lastUsed = self._idle.pop()
+                    idleTime = now - lastUsed
+                    self._inUse.add(id(conn))
+                elif self._size < self.maxConnections:
+                    self._size += 1
+                    create = True
+                else:
+                    self._counters['waits'] += 1
+                    if deadline is None:
+                        self._cond.wait()
+                    else:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            raise Exception(
+                                'Timed out waiting for a pooled DB '
+                                'connection.')
+                        self._cond.wait(remaining)
+                    continue
+
+            # Closing, connecting and pinging are done without holding the
+            # lock.
+            for expiredConn in expired:
+                self._closeConnection(expiredConn)
+
+            if create:
+                try:
+                    conn = self._newConnection()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._inUse.add(id(conn))
+                    self._counters['created'] += 1
+                    self._counters['checkouts'] += 1
+                return conn
+
+            if self._isHealthy(conn, idleTime):
+                with self._cond:
+                    self._counters['checkouts'] += 1
+                return conn
+
+            with self._cond:
+                self._inUse.discard(id(conn))
+                self._size -= 1
+                self._counters['healthCheckFailures'] += 1
+            self._closeConnection(conn)
+
+
+    def checkin(self, conn, discard = False):
+        """
+        Return a connection to the pool.
+
+        Any open transaction is rolled back so that the next user starts
+        with a clean connection.
+
+        :param conn: DB connection obtained from checkout().
+        :param discard: Boolean if True, the connection is closed instead of
+        being reused.
+        """
+
+        with self._cond:
+            if id(conn) not in self._inUse:
+                raise Exception('Connection does not belong to this pool.')
+
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != \
+                        psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception as detail:
+                self.logger.log('Discarding pooled connection after failed '
+                                'rollback: {}'.format(detail), 'warning')
+                discard = True
+
+        with self._cond:
+            self._inUse.discard(id(conn))
+            self._counters['checkins'] += 1
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                reuse = False
+            else:
+                self._idle.append([conn, time.time()])
+                reuse = True
+            self._cond.notify()
+
+        if not reuse:
+            self._closeConnection(conn)
+
+
+    @contextmanager
+    def connection(self, timeout = None):
+        """
+        Checkout a connection for the duration of a with block. The
+        connection is discarded if the block raises a connection-level error.
+
+        :param timeout: Float seconds to wait for a connection.
+        """
+
+        conn = self.checkout(timeout)
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.checkin(conn, discard = discard)
+
+
+    def evictIdle(self):
+        """
+        Close connections beyond minConnections that have been idle for
+        longer than maxIdleTime.
+
+        :returns: Int number of connections closed.
+        """
+
+        with self._cond:
+            expired = self._evictIdleLocked(time.time())
+        for conn in expired:
+            self._closeConnection(conn)
+        return len(expired)
+
+
+    def closeAll(self):
+        """
+        Close all idle connections. Connections currently checked out are
+        closed when they are checked in.
+        """
+
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn, lastUsed in idle:
+            self._closeConnection(conn)
+
+
+    def stats(self):
+        """
+        :returns: Dict of pool counters along with the current number of
+        idle, in use and open connections.
+        """
+
+        with self._cond:
+            with self._countersLock:
+                stats = dict(self._counters)
+            stats['idle'] = len(self._idle)
+            stats['inUse'] = len(self._inUse)
+            stats['size'] = self._size
+        return stats
+
+
+def sharedPool(dsn = '', minConnections = 1, maxConnections = 10, **kwargs):
+    """
+    Get the process-wide pool for a DSN, creating it on first use.
+
+    The size settings of the first caller for a DSN apply to the pool.
+
+    :param dsn: String for the libpq connection string.
+    :returns: SEKDBConnectionPool
+    """
+
+    with _sharedPoolsLock:
+        pool = _sharedPools.get(dsn)
+        if pool is None or pool._closed:
+            pool = SEKDBConnectionPool(dsn, minConnections = minConnections,
+                                       maxConnections = maxConnections,
+                                       **kwargs)
+            _sharedPools[dsn] = pool
+        return pool
@@ -5,11 +5,67 @@ __author__ = 'Daniel Zhang (張道博)'
 __copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
 
 
+import re
 import sys
+import threading
+import time
+import weakref
+from collections import namedtuple, OrderedDict
+from itertools import count, islice
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
 from sek.logger import SEKLogger
 
-DEBUG = 1
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+# Source of unique names for server-side cursors.
+_serverCursorIDs = count()
+
+# Source of unique names for prepared statements.
+_preparedStatementIDs = count()
+
+# Prepared statements of each connection, shared by all SEKDBUtil instances
+# so that a connection reused by another instance, such as a pooled one,
+# keeps a single bounded set of statements. Maps a connection to [backend
+# PID, OrderedDict of SQL to statement name, lock] with the least recently
+# used statement first.
+_preparedStatements = weakref.WeakKeyDictionary()
+_preparedStatementsLock = threading.Lock()
+
+# Table metadata of each connection, shared by all SEKDBUtil instances so
+# that utilities created per job still find it cached. Maps a connection to
+# a dict of (schema, table) to (load time, column metadata).
+_schemaCache = weakref.WeakKeyDictionary()
+_schemaCacheLock = threading.Lock()
+
+# Quoted sections of SQL in which placeholders are not replaced: string
+# literals, including escape and dollar-quoted strings, quoted identifiers
+# and comments.
+QUOTED_SQL = re.compile(r"""(?<!\w)[Ee]'(?:[^'\\]|\\.|'')*'"""
+                        r"""|'(?:[^']|'')*'"""
+                        r'|"(?:[^"]|"")*"'
+                        r'|\$(\w*)\$.*?\$\1\$'
+                        r'|--[^\n]*'
+                        r'|/\*.*?\*/', re.DOTALL)
+
+# Statements that can be repeated without side effects.
+IDEMPOTENT_STATEMENT = re.compile(
+    r'^[\s(]*(SELECT|SHOW|VALUES|EXPLAIN|TABLE)\b', re.IGNORECASE)
+
+# SQLSTATE codes of errors after which a statement may succeed when retried:
+# serialization failure and deadlock.
+TRANSIENT_ERRORS = ('40001', '40P01')
+
+# Column metadata as returned by SEKDBUtil.tableSchema().
+SEKColumnInfo = namedtuple('SEKColumnInfo', ['name', 'type', 'position'])
+
+# Characters that have to be escaped in the text format of COPY.
+COPY_ESCAPES = (('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'),
+                ('\r', '\\r'))
 
 
 class SEKDBUtil(object):
@@ -29,16 +85,86 @@ class SEKDBUtil(object):
 
     Public API:
 
-        executeSQL(cursor: DB cursor, sql: String, exitOnFail: Boolean):Boolean
+        executeSQL(cursor: DB cursor, sql: String, exitOnFail: Boolean,
+                   params: Tuple):Boolean
+
+        executeBatch(cursor: DB cursor, sql: String, argsList: Iterable,
+                     pageSize: Int, exitOnFail: Boolean):Int
+
+        streamRows(cursor: DB cursor, sql: String, params: Tuple,
+                   itersize: Int, batchSize: Int,
+                   exitOnFail: Boolean):Generator
+
+        bulkLoad(cursor: DB cursor, table: String, rows: Iterable,
+                 columns: List, chunkSize: Int, commitEachChunk: Boolean,
+                 exitOnFail: Boolean):Dict
+
+        tableSchema(cursor: DB cursor, table: String,
+                    schema: String):List of SEKColumnInfo
+
+        invalidateSchemaCache(cursor: DB cursor, table: String,
+                              schema: String)
+
+        insertReturning(cursor: DB cursor, table: String, row: Tuple or Dict,
+                        columns: List, returning: String or List,
+                        exitOnFail: Boolean)
+
+        insertManyReturning(cursor: DB cursor, table: String,
+                            rows: Iterable, columns: List,
+                            returning: String or List, pageSize: Int,
+                            exitOnFail: Boolean):List
+
+        executePrepared(cursor: DB cursor, sql: String, params: Tuple,
+                        exitOnFail: Boolean):Boolean
+
+        invalidatePreparedStatements(cursor: DB cursor)
+
+        stats():Dict
+
+    Resilient usage:
+
+        connector = SEKDBConnector(dbName = 'db', resilient = True)
+        dbUtil = SEKDBUtil(retries = 3)
+        dbUtil.executeSQL(connector.conn.cursor(), sql)
+
+    With retries set, executeSQL retries statements that failed with a
+    transient error, such as a deadlock, or because the connection was
+    lost. Cursors of a resilient connector are reconnected first. Only
+    statements that are idempotent and that were not part of a transaction
+    in progress are retried.
 
     """
 
-    def __init__(self):
+    def __init__(self, schemaCacheTTL = 300.0, maxPreparedStatements = 100,
+                 retries = 0, retryBackoff = 0.5, maxRetryBackoff = 30.0,
+                 logLevel = 'silent'):
         """
         Constructor.
+
+        :param schemaCacheTTL: Float seconds that table metadata is cached
+        per connection. None caches until invalidated and 0 disables the
+        cache.
+        :param maxPreparedStatements: Int number of prepared statements kept
+        per connection by executePrepared().
+        :param retries: Int number of times executeSQL retries a statement.
+        :param retryBackoff: Float seconds to wait before the first retry.
+        The wait doubles with each further retry.
+        :param maxRetryBackoff: Float upper bound in seconds of the wait
+        between retries.
+        :param logLevel
         """
 
-        self.logger = SEKLogger(__name__, 'DEBUG')
+        self.logger = SEKLogger(__name__, logLevel)
+        self.retries = retries
+        self.retryBackoff = retryBackoff
+        self.maxRetryBackoff = maxRetryBackoff
+
+        self._countersLock = threading.Lock()
+        self._counters = {'executions': 0, 'failures': 0, 'retries': 0,
+                          'reconnects': 0, 'seconds': 0.0, 'maxSeconds': 0.0}
+        self.schemaCacheTTL = schemaCacheTTL
+
+        self.maxPreparedStatements = maxPreparedStatements
 
 
     def getLastSequenceID(self, conn, tableName, columnName):
@@ -46,6 +172,10 @@ class SEKDBUtil(object):
         Get last sequence ID value for the given sequence and for the
         given connection.
 
+        This costs a query of its own after each insert. Use
+        insertReturning() or insertManyReturning() to get generated keys
+        from the insert itself.
+
         :param conn: DB connection
         :param tableName: String for name of the table that the sequence matches
         :param columnName: String for name of the column to which the
@@ -53,9 +183,8 @@ class SEKDBUtil(object):
         :returns: Integer of last sequence value or None if not found.
         """
 
-        if DEBUG:
-            print "table name = %s" % tableName
-            print "column name = %s" % columnName
+        self.logger.log('Getting last sequence value for {}.{}.', 'debug',
+                        tableName, columnName)
 
         sql = """SELECT currval(pg_get_serial_sequence('"{}"','{}'))""".format(
             tableName, columnName)
@@ -65,7 +194,7 @@ class SEKDBUtil(object):
 
         try:
             row = cur.fetchone()
-        except psycopg2.ProgrammingError, e:
+        except psycopg2.ProgrammingError as e:
             msg = "Failed to retrieve the last sequence value."
             msg += " Exception is %s." % e
             self.logger.log(msg, 'error')
@@ -79,7 +208,8 @@ class SEKDBUtil(object):
         return lastSequenceValue
 
 
-    def executeSQL(self, cursor, sql, exitOnFail = True):
+    def executeSQL(self, cursor, sql, exitOnFail = True, params = None,
+                   idempotent = None):
         """
         Execute SQL given a cursor and a SQL statement.
 
@@ -94,26 +224,400 @@ class SEKDBUtil(object):
 
         rows = cursor.fetchall()
 
+        Values can be passed separately from the statement using %s
+        placeholders in sql and a params tuple. They are then quoted by the
+        driver.
+
+        If the connection of a resilient connector is lost, it is
+        reconnected. When the statement cannot be retried, the error is then
+        raised instead of exiting since the caller's transaction is lost.
+
         :param cursor: DB cursor.
         :param sql: String of a SQL statement.
+        :param params: Optional tuple or dict of values for placeholders.
+        :param idempotent: Optional Boolean telling if the statement can be
+        retried. By default, queries such as SELECT are retried and other
+        statements are not.
         :returns: Boolean True for success, execution is aborted if there is
         an error.
         """
 
-        success = True
+        attempt = 0
+        while True:
+            wasIdle = self._isIdle(cursor)
+            start = time.time()
+            try:
+                cursor.execute(sql, params)
+                self._countExecution(start)
+                return True
+
+            except Exception as detail:
+                self._countExecution(start, failed = True)
+                lost = self._connectionLost(cursor, detail)
+                if lost and hasattr(cursor, 'reconnect'):
+                    self._reconnect(cursor)
+
+                if attempt < self.retries and wasIdle and \
+                        self._isRetryable(cursor, sql, detail, lost,
+                                          idempotent):
+                    delay = min(self.maxRetryBackoff,
+                                self.retryBackoff * (2 ** attempt))
+                    self.logger.log(
+                        "Retrying SQL in {:.1f} s after error: {}.".format(
+                            delay, detail), 'warning')
+                    if not lost and not cursor.connection.autocommit:
+                        cursor.connection.rollback()
+                    with self._countersLock:
+                        self._counters['retries'] += 1
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+                msg = "SQL execute failed using {}.".format(sql)
+                msg += " The error is: {}.".format(detail)
+
+                self.logger.log(msg, 'error')
+                if lost and hasattr(cursor, 'reconnect'):
+                    raise
+                if exitOnFail:
+                    sys.exit(-1)
+                return False
+
+
+    def stats(self):
+        """
+        Counters of executeSQL calls.
+
+        :returns: Dict with the number of executions, failures, retries and
+        reconnects, the total and maximum seconds spent executing and the
+        average seconds per execution.
+        """
+
+        with self._countersLock:
+            stats = dict(self._counters)
+        stats['averageSeconds'] = 0.0
+        if stats['executions']:
+            stats['averageSeconds'] = stats['seconds'] / stats['executions']
+        return stats
+
+
+    def _countExecution(self, start, failed = False):
+        elapsed = time.time() - start
+        with self._countersLock:
+            self._counters['executions'] += 1
+            self._counters['seconds'] += elapsed
+            if elapsed > self._counters['maxSeconds']:
+                self._counters['maxSeconds'] = elapsed
+            if failed:
+                self._counters['failures'] += 1
+
+
+    def _isIdle(self, cursor):
+        """
+        :returns: True if no transaction is in progress on the cursor's
+        connection, so that a failed statement can be repeated without
+        losing earlier work.
+        """
+
         try:
-            cursor.execute(sql)
+            conn = cursor.connection
+            return conn.autocommit or conn.get_transaction_status() == \
+                                      psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        except psycopg2.Error:
+            return False
 
-        except Exception as detail:
-            success = False
-            msg = "SQL execute failed using {}.".format(sql)
-            msg += " The error is: {}.".format(detail)
 
-            self.logger.log(msg, 'error')
-            if exitOnFail:
-                sys.exit(-1)
+    def _isRetryable(self, cursor, sql, detail, lost, idempotent):
+        """
+        :returns: True if the error is one after which the statement may
+        succeed and the statement can safely be repeated.
+        """
+
+        if lost:
+            if not hasattr(cursor, 'reconnect'):
+                return False
+        elif getattr(detail, 'pgcode', None) not in TRANSIENT_ERRORS:
+            return False
+
+        if idempotent is not None:
+            return idempotent
+        return IDEMPOTENT_STATEMENT.match(sql) is not None
+
+
+    def _connectionLost(self, cursor, detail):
+        """
+        :returns: True if the error left the cursor's connection unusable.
+        """
+
+        if not isinstance(detail, (psycopg2.OperationalError,
+                                   psycopg2.InterfaceError)):
+            return False
+        try:
+            return cursor.connection.closed != 0
+        except psycopg2.Error:
+            return True
 
-        return success
+
+    def _reconnect(self, cursor):
+        cursor.reconnect()
+        with self._countersLock:
+            self._counters['reconnects'] += 1
+
+
+    def executeBatch(self, cursor, sql, argsList, pageSize = 100,
+                     exitOnFail = True, template = None):
+        """
+        Execute a parameterized statement for a sequence of parameter tuples
+        by sending multi-row statements of up to pageSize rows each.
+
+        The statement contains a single %s placeholder where the rows of
+        a VALUES list are substituted. For example:
+
+        sql = 'INSERT INTO "Readings" ("meter", "kWh") VALUES %s'
+        count = dbUtil.executeBatch(cursor, sql, [('m1', 1.0), ('m2', 2.0)])
+
+        Committing is left to the caller, as with executeSQL.
+
+        :param cursor: DB cursor.
+        :param sql: String of a SQL statement containing VALUES %s.
+        :param argsList: Iterable of parameter tuples.
+        :param pageSize: Int maximum number of rows per statement.
+        :param exitOnFail: Boolean if True, exit on a failed statement.
+        :param template: Optional String for a row template such as
+        '(%s, %s, NOW())'.
+        :returns: Int total of affected rows, or None if a statement failed
+        and exitOnFail is False.
+        """
+
+        if pageSize < 1:
+            raise Exception('Invalid page size.')
+
+        count = 0
+        args = iter(argsList)
+        while True:
+            page = list(islice(args, pageSize))
+            if not page:
+                break
+            try:
+                psycopg2.extras.execute_values(cursor, sql, page,
+                                               template = template,
+                                               page_size = len(page))
+            except Exception as detail:
+                msg = "SQL batch execute failed using {}.".format(sql)
+                msg += " The error is: {}.".format(detail)
+
+                self.logger.log(msg, 'error')
+                if exitOnFail:
+                    sys.exit(-1)
+                return None
+            if cursor.rowcount > 0:
+                count += cursor.rowcount
+
+        return count
+
+
+    def streamRows(self, cursor, sql, params = None, itersize = 2000,
+                   batchSize = None, exitOnFail = True):
+        """
+        Yield the result rows of a query without materializing them
+        client-side.
+
+        A named (server-side) cursor is opened on the connection of the
+        given cursor and with the same cursor class, so passing the
+        connector's dictCur yields DictRows. Rows are fetched from the server
+        itersize rows at a time. The server-side cursor is closed when the
+        generator is exhausted or closed, including on an early break.
+
+        Usage:
+
+            for row in dbUtil.streamRows(cursor, 'SELECT * FROM "Readings"'):
+                process(row)
+
+        :param cursor: DB cursor whose connection and class are used.
+        :param sql: String of a SQL query.
+        :param params: Optional tuple or dict of values for placeholders.
+        :param itersize: Int number of rows fetched per round trip.
+        :param batchSize: Optional Int. If given, lists of up to batchSize
+        rows are yielded instead of single rows.
+        :param exitOnFail: Boolean if True, exit on a failed query.
+        :raises: Exception if the query fails and exitOnFail is False, so
+        that a failure is not mistaken for an empty result.
+        """
+
+        conn = cursor.connection
+        name = 'sek_stream_{}'.format(next(_serverCursorIDs))
+
+        # Server-side cursors only live inside a transaction unless they are
+        # declared WITH HOLD.
+        cursorClass = type(getattr(cursor, 'rawCursor', cursor))
+        serverCursor = conn.cursor(name, cursor_factory = cursorClass,
+                                   withhold = conn.autocommit)
+        serverCursor.itersize = itersize
+        try:
+            if not self.executeSQL(serverCursor, sql, exitOnFail, params):
+                raise Exception(
+                    'Streaming query failed using {}.'.format(sql))
+
+            if batchSize:
+                while True:
+                    rows = serverCursor.fetchmany(batchSize)
+                    if not rows:
+                        break
+                    yield rows
+            else:
+                for row in serverCursor:
+                    yield row
+        finally:
+            if not conn.closed and not serverCursor.closed:
+                try:
+                    serverCursor.close()
+                except psycopg2.Error as detail:
+                    self.logger.log('Failed to close server-side cursor: '
+                                    '{}'.format(detail), 'warning')
+
+
+    def executePrepared(self, cursor, sql, params = None, exitOnFail = True):
+        """
+        Execute a statement through a named prepared statement so that the
+        server parses and plans it only once per connection.
+
+        The statement is prepared on first use on a connection and reused by
+        later calls with the same SQL, also by other SEKDBUtil instances
+        using the same connection. At most maxPreparedStatements are kept
+        per connection; the least recently used one is deallocated when the
+        limit is exceeded. A new connection, or a connection that was reset,
+        starts with an empty set of statements.
+
+        Values are passed with positional %s placeholders, as in
+        executeSQL().
+
+        :param cursor: DB cursor.
+        :param sql: String of a SQL statement.
+        :param params: Optional tuple of values for the placeholders.
+        :param exitOnFail: Boolean if True, exit on a failed statement.
+        :returns: Boolean True for success.
+        """
+
+        conn = cursor.connection
+        wasIdle = conn.get_transaction_status() == \
+                  psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        params = tuple(params or ())
+
+        for attempt in range(2):
+            name = self._preparedStatement(cursor, sql, exitOnFail)
+            if not name:
+                return False
+
+            executeSQL = 'EXECUTE {}'.format(name)
+            if params:
+                executeSQL += ' ({})'.format(','.join(['%s'] * len(params)))
+            try:
+                cursor.execute(executeSQL, params or None)
+                return True
+            except psycopg2.Error as detail:
+                # The server forgets prepared statements on DISCARD ALL,
+                # which happens when a connection is reset. They are
+                # prepared again if no transaction of the caller is lost by
+                # rolling back.
+                if detail.pgcode == '26000' and wasIdle and attempt == 0:
+                    self.logger.log('Preparing {} again.', 'debug', name)
+                    with _preparedStatementsLock:
+                        _preparedStatements.pop(conn, None)
+                    conn.rollback()
+                    continue
+
+                msg = "SQL execute failed using {}.".format(sql)
+                msg += " The error is: {}.".format(detail)
+                self.logger.log(msg, 'error')
+                if exitOnFail:
+                    sys.exit(-1)
+                return False
+
+
+    def _preparedStatement(self, cursor, sql, exitOnFail):
+        """
+        Get the name of the prepared statement for sql on the cursor's
+        connection, preparing it if needed.
+
+        :returns: String for the name of the statement or None if preparing
+        failed.
+        """
+
+        conn = cursor.connection
+        pid = conn.get_backend_pid()
+        with _preparedStatementsLock:
+            entry = _preparedStatements.get(conn)
+            if entry is None or entry[0] != pid:
+                entry = [pid, OrderedDict(), threading.Lock()]
+                _preparedStatements[conn] = entry
+        statements, lock = entry[1], entry[2]
+
+        with lock:
+            name = statements.pop(sql, None)
+            if name is None:
+                name = 'sek_stmt_{}'.format(next(_preparedStatementIDs))
+                prepareSQL = 'PREPARE {} AS {}'.format(
+                    name, self._numberedPlaceholders(sql))
+                if not self.executeSQL(cursor, prepareSQL, exitOnFail):
+                    return None
+
+                while len(statements) >= self.maxPreparedStatements:
+                    oldSQL, oldName = statements.popitem(last = False)
+                    self.executeSQL(cursor, 'DEALLOCATE {}'.format(oldName),
+                                    exitOnFail)
+
+            # Re-inserting marks the statement as most recently used.
+            statements[sql] = name
+        return name
+
+
+    def invalidatePreparedStatements(self, cursor = None):
+        """
+        Forget prepared statements so that they are prepared again on next
+        use, for example after DISCARD ALL was run on a connection.
+
+        :param cursor: Optional DB cursor. If given, only statements for its
+        connection are forgotten.
+        """
+
+        with _preparedStatementsLock:
+            if cursor:
+                _preparedStatements.pop(cursor.connection, None)
+            else:
+                _preparedStatements.clear()
+
+
+    def _numberedPlaceholders(self, sql):
+        """
+        Replace positional %s placeholders with the $1, $2, ... form used by
+        PREPARE. Quoted strings, identifiers and comments are left as they
+        are, except that %% becomes %.
+
+        :returns: String of the converted statement.
+        """
+
+        number = count(1)
+
+        def convert(text):
+            if '%(' in text:
+                raise Exception('Named placeholders are not supported in '
+                                'prepared statements.')
+            parts = text.split('%%')
+            for i, part in enumerate(parts):
+                pieces = part.split('%s')
+                parts[i] = pieces[0] + ''.join(
+                    '${}{}'.format(next(number), piece) for piece in
+                    pieces[1:])
+            return '%'.join(parts)
+
+        converted = []
+        position = 0
+        for match in QUOTED_SQL.finditer(sql):
+            converted.append(convert(sql[position:match.start()]))
+            converted.append(match.group(0).replace('%%', '%'))
+            position = match.end()
+        converted.append(convert(sql[position:]))
+        return ''.join(converted)
 
 
     def getDBName(self, cursor):
@@ -121,7 +625,7 @@ class SEKDBUtil(object):
         :returns: Name of the current database.
         """
 
-        self.executeSQL(cursor, """select current_database();""")
+        self.executePrepared(cursor, """select current_database();""")
         row = cursor.fetchone()
         return row
 
@@ -135,11 +639,96 @@ class SEKDBUtil(object):
         :returns: List of tuples with column names in the first position.
         """
 
-        sql = """SELECT column_name FROM information_schema.columns WHERE
-        table_name='%s';""" % table
-        self.executeSQL(cursor, sql)
+        return [(col.name,) for col in self.tableSchema(cursor, table)]
+
+
+    def tableSchema(self, cursor = None, table = None, schema = None):
+        """
+        Column names, types and ordinal positions for a table, in column
+        order.
+
+        The metadata is read with a single catalog query and cached per
+        connection for schemaCacheTTL seconds. The cache is shared by all
+        SEKDBUtil instances.
+
+        :param cursor: A DB cursor.
+        :param table: Name of the table.
+        :param schema: Optional name of the schema containing the table. By
+        default, the table is looked up through the search path like an
+        unqualified table name.
+        :returns: List of SEKColumnInfo(name, type, position).
+        """
+
+        if not cursor:
+            raise Exception('Cursor not defined.')
+        if not table:
+            raise Exception('Table not defined.')
+
+        key = (schema, table)
+        conn = cursor.connection
+        now = time.time()
+
+        if self.schemaCacheTTL != 0:
+            with _schemaCacheLock:
+                cached = _schemaCache.get(conn, {}).get(key)
+            if cached and (self.schemaCacheTTL is None or
+                           now - cached[0] < self.schemaCacheTTL):
+                return list(cached[1])
+
+        sql = """SELECT column_name, data_type, ordinal_position FROM
+        information_schema.columns WHERE table_name = %s"""
+        params = (table,)
+        if schema:
+            sql += " AND table_schema = %s"
+            params += (schema,)
+        else:
+            # Only the table that an unqualified name refers to.
+            sql += """ AND table_schema = (SELECT n.nspname FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace WHERE c.oid =
+            to_regclass(quote_ident(%s)))"""
+            params += (table,)
+        sql += " ORDER BY ordinal_position;"
+
+        catalogCursor = conn.cursor()
+        self.executeSQL(catalogCursor, sql, params = params)
+        cols = [SEKColumnInfo(*row) for row in catalogCursor.fetchall()]
+        catalogCursor.close()
+
+        if self.schemaCacheTTL != 0:
+            with _schemaCacheLock:
+                _schemaCache.setdefault(conn, {})[key] = (now, cols)
+
+        return list(cols)
+
+
+    def invalidateSchemaCache(self, cursor = None, table = None,
+                              schema = None):
+        """
+        Drop cached table metadata, for example after altering a table.
+
+        :param cursor: Optional DB cursor. If given, only metadata cached for
+        its connection is dropped.
+        :param table: Optional name of a table. If given, only metadata for
+        this table is dropped.
+        :param schema: Optional name of the schema of the table. If not
+        given, the table's metadata is dropped for every schema.
+        """
+
+        with _schemaCacheLock:
+            if cursor:
+                caches = [_schemaCache.get(cursor.connection, {})]
+            else:
+                caches = list(_schemaCache.values())
+
+            for cache in caches:
+                if not table:
+                    cache.clear()
+                    continue
+                for key in list(cache.keys()):
+                    if key[1] == table and (schema is None or
+                                            key[0] == schema):
+                        del cache[key]
 
-        return cursor.fetchall()  # Each column is an n-tuple.
 
     def columns(self, cursor = None, table = None):
         """
@@ -155,10 +744,7 @@ class SEKDBUtil(object):
         if not table:
             raise Exception('Table not defined.')
 
-        cols = []
-        for col in self.tableColumns(cursor, table):
-            cols.append(col[0])
-        return cols
+        return [col.name for col in self.tableSchema(cursor, table)]
 
 
     def columnsString(self, cursor = None, table = None):
@@ -167,3 +753,238 @@ class SEKDBUtil(object):
         if not table:
             raise Exception('Table not defined.')
         return ','.join(item for item in self.columns(cursor, table))
+
+
+    def bulkLoad(self, cursor = None, table = None, rows = None,
+                 columns = None, chunkSize = 10000, commitEachChunk = False,
+                 exitOnFail = True):
+        """
+        Load rows into a table using COPY FROM STDIN.
+
+        Rows are sent in chunks of at most chunkSize rows so that only one
+        chunk is held in memory at a time. Committing is left to the caller
+        unless commitEachChunk is set.
+
+        :param cursor: DB cursor.
+        :param table: Name of the table to load.
+        :param rows: Iterable of tuples in column order or of dicts keyed by
+        column name.
+        :param columns: List of column names. Defaults to all columns of the
+        table in their defined order.
+        :param chunkSize: Int maximum number of rows sent per COPY.
+        :param commitEachChunk: Boolean if True, commit after each chunk.
+        :param exitOnFail: Boolean if True, exit on a failed COPY.
+        :returns: Dict with the number of rows and chunks loaded, the elapsed
+        seconds and the rows per second, or None if a COPY failed and
+        exitOnFail is False.
+        """
+
+        if not cursor:
+            raise Exception('Cursor not defined.')
+        if not table:
+            raise Exception('Table not defined.')
+        if rows is None:
+            raise Exception('Rows not defined.')
+        if chunkSize < 1:
+            raise Exception('Invalid chunk size.')
+
+        if not columns:
+            columns = self.columns(cursor, table)
+
+        sql = 'COPY "{}" ({}) FROM STDIN'.format(
+            table, ','.join('"{}"'.format(col) for col in columns))
+
+        stats = {'rows': 0, 'chunks': 0, 'seconds': 0.0,
+                 'rowsPerSecond': 0.0}
+        start = time.time()
+        buf = StringIO()
+        count = 0
+
+        for row in rows:
+            if isinstance(row, dict):
+                row = [row.get(col) for col in columns]
+            buf.write('\t'.join(self._copyValue(value) for value in row))
+            buf.write('\n')
+            count += 1
+            if count == chunkSize:
+                if not self._copyChunk(cursor, sql, buf, commitEachChunk,
+                                       exitOnFail):
+                    return None
+                stats['rows'] += count
+                stats['chunks'] += 1
+                buf = StringIO()
+                count = 0
+
+        if count:
+            if not self._copyChunk(cursor, sql, buf, commitEachChunk,
+                                   exitOnFail):
+                return None
+            stats['rows'] += count
+            stats['chunks'] += 1
+
+        stats['seconds'] = time.time() - start
+        if stats['seconds'] > 0:
+            stats['rowsPerSecond'] = stats['rows'] / stats['seconds']
+
+        self.logger.log('Loaded {} rows into {} in {} chunks at {:.0f} '
+                        'rows/s.', 'debug', stats['rows'], table,
+                        stats['chunks'], stats['rowsPerSecond'])
+        return stats
+
+
+    def _copyChunk(self, cursor, sql, buf, commit, exitOnFail):
+        """
+        Send a buffer of COPY text data.
+
+        :returns: Boolean True for success.
+        """
+
+        buf.seek(0)
+        try:
+            cursor.copy_expert(sql, buf)
+            if commit:
+                cursor.connection.commit()
+        except Exception as detail:
+            self.logger.log(
+                'COPY failed using {}. The error is: {}.'.format(sql, detail),
+                'error')
+            if exitOnFail:
+                sys.exit(-1)
+            return False
+        return True
+
+
+    def _copyValue(self, value):
+        """
+        :returns: String for a value in the text format of COPY.
+        """
+
+        if value is None:
+            return '\\N'
+        if isinstance(value, str):
+            pass
+        elif isinstance(value, float):
+            # str() keeps only 12 significant digits on Python 2.
+            value = repr(value)
+        elif isinstance(value, type(u'')):
+            # Python 2 unicode strings.
+            value = value.encode('utf-8')
+        elif isinstance(value, bytes):
+            # Python 3 byte strings are text, as str is on Python 2.
+            value = value.decode('utf-8')
+        elif isinstance(value, (bytearray, memoryview)):
+            # Binary data in the hex format of bytea.
+            value = '\\x' + ''.join(
+                '{:02x}'.format(byte) for byte in bytearray(value))
+        else:
+            value = str(value)
+        for char, escaped in COPY_ESCAPES:
+            if char in value:
+                value = value.replace(char, escaped)
+        return value
+
+
+    def insertReturning(self, cursor = None, table = None, row = None,
+                        columns = None, returning = 'id', exitOnFail = True):
+        """
+        Insert a row and return generated values, such as a serial ID,
+        from the same statement.
+
+        :param cursor: DB cursor.
+        :param table: Name of the table.
+        :param row: Tuple in column order or dict keyed by column name.
+        :param columns: List of column names. Defaults to the keys of a dict
+        row or to all columns of the table.
+        :param returning: String for the name of a column to return, or a
+        list of names.
+        :param exitOnFail: Boolean if True, exit on a failed insert.
+        :returns: Value of the returned column, or a tuple of values if
+        returning is a list. None if the insert failed and exitOnFail is
+        False.
+        """
+
+        rows = self.insertManyReturning(cursor, table, [row], columns,
+                                        returning, exitOnFail = exitOnFail)
+        if not rows:
+            return None
+        return rows[0]
+
+
+    def insertManyReturning(self, cursor = None, table = None, rows = None,
+                            columns = None, returning = 'id', pageSize = 100,
+                            exitOnFail = True):
+        """
+        Insert rows using multi-row statements of up to pageSize rows and
+        return generated values, such as serial IDs, for all of them.
+
+        Usage:
+
+            ids = dbUtil.insertManyReturning(cursor, 'Readings',
+                                             [('m1', 1.0), ('m2', 2.0)],
+                                             columns = ['meter', 'kWh'])
+
+        :param cursor: DB cursor.
+        :param table: Name of the table.
+        :param rows: Iterable of tuples in column order or of dicts keyed by
+        column name.
+        :param columns: List of column names. Defaults to the keys of the
+        first dict row or to all columns of the table.
+        :param returning: String for the name of a column to return, or a
+        list of names.
+        :param pageSize: Int maximum number of rows per statement.
+        :param exitOnFail: Boolean if True, exit on a failed insert.
+        :returns: List of returned values in row order, with tuples of
+        values if returning is a list. None if an insert failed and
+        exitOnFail is False.
+        """
+
+        if not cursor:
+            raise Exception('Cursor not defined.')
+        if not table:
+            raise Exception('Table not defined.')
+        if rows is None:
+            raise Exception('Rows not defined.')
+        if pageSize < 1:
+            raise Exception('Invalid page size.')
+
+        single = isinstance(returning, (str, type(u'')))
+        if single:
+            returning = [returning]
+
+        results = []
+        rows = iter(rows)
+        while True:
+            page = list(islice(rows, pageSize))
+            if not page:
+                break
+
+            if not columns:
+                if isinstance(page[0], dict):
+                    columns = list(page[0].keys())
+                else:
+                    columns = self.columns(cursor, table)
+            if isinstance(page[0], dict):
+                page = [[row.get(col) for col in columns] for row in page]
+
+            sql = 'INSERT INTO "{}" ({}) VALUES %s RETURNING {}'.format(
+                table, ','.join('"{}"'.format(col) for col in columns),
+                ','.join('"{}"'.format(col) for col in returning))
+
+            try:
+                returned = psycopg2.extras.execute_values(
+                    cursor, sql, page, page_size = len(page), fetch = True)
+            except Exception as detail:
+                msg = "SQL insert failed using {}.".format(sql)
+                msg += " The error is: {}.".format(detail)
+
+                self.logger.log(msg, 'error')
+                if exitOnFail:
+                    sys.exit(-1)
+                return None
+
+            if single:
+                results.extend(row[0] for row in returned)
+            else:
+                results.extend(tuple(row) for row in returned)
+
+        return results
@@ -7,11 +7,308 @@ __license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
               '-Energy-Kit/master/BSD-LICENSE.txt'
 
 import hashlib
+from collections import deque, namedtuple
+from contextlib import contextmanager
 from functools import partial
+from multiprocessing.pool import ThreadPool
 import gzip
+import io
+import mmap
 import os
+import shutil
 import stat
-from logger import SEKLogger
+import zlib
+from sek.logger import SEKLogger
+
+
+# Default size of the blocks that are read and written when streaming files.
+CHUNK_SIZE = 1024 * 1024
+
+# Default size of the blocks that are compressed independently by parallel
+# gzip compression.
+GZIP_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Result for one file of SEKFileUtil.scanDirectory. checksums is a Dict of
+# hex digests by algorithm and error is None unless the file could not be
+# read.
+SEKFileInfo = namedtuple('SEKFileInfo',
+                         ['path', 'size', 'mtime', 'mode', 'tooPermissive',
+                          'checksums', 'error'])
+
+
+def gzipMember(data, compressLevel = 9):
+    """
+    Compress data into a complete gzip member.
+
+    Concatenated members form a valid multi-member gzip file. zlib releases
+    the GIL while compressing, so blocks can be compressed by threads in
+    parallel.
+
+    :param data: Byte string to compress.
+    :param compressLevel: Int zlib compression level from 1 to 9.
+    :returns: Byte string of the gzip member.
+    """
+
+    # A window size of 16 + 15 selects the gzip format.
+    compressor = zlib.compressobj(compressLevel, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def tooPermissive(mode):
+    """
+    :param mode: Int st_mode of a file.
+    :returns: Boolean True if group or others can read, write or execute.
+    """
+
+    return bool(mode & (stat.S_IRGRP | stat.S_IROTH | stat.S_IWGRP |
+                        stat.S_IWOTH | stat.S_IXGRP | stat.S_IXOTH))
+
+
+def walkFiles(top, recursive = True, followLinks = False):
+    """
+    Walk a directory tree, yielding regular files with their stat results.
+
+    os.scandir is used where it exists so that the file type comes from the
+    directory entry and each file is stat'ed once. Python 2 falls back to
+    os.listdir.
+
+    :param top: String path of the directory.
+    :param recursive: Boolean if True, subdirectories are walked.
+    :param followLinks: Boolean if True, symbolic links are followed.
+    :returns: Generator of (path, os.stat_result) tuples. The stat result is
+    the OSError if the file could not be stat'ed.
+    """
+
+    pending = [top]
+    while pending:
+        directory = pending.pop()
+        try:
+            if hasattr(os, 'scandir'):
+                entries = [(entry.path, entry) for entry in
+                           os.scandir(directory)]
+            else:
+                entries = [(os.path.join(directory, name), None) for name in
+                           os.listdir(directory)]
+        except OSError:
+            continue
+        for path, entry in entries:
+            try:
+                if entry is not None:
+                    st = entry.stat(follow_symlinks = followLinks)
+                else:
+                    st = os.stat(path) if followLinks else os.lstat(path)
+            except OSError as detail:
+                yield path, detail
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                if recursive:
+                    pending.append(path)
+            elif stat.S_ISREG(st.st_mode):
+                yield path, st
+
+
+def _scanFile(fileUtil, algorithms, item):
+    """
+    :param item: Tuple of (path, os.stat_result) from walkFiles.
+    :returns: SEKFileInfo
+    """
+
+    path, st = item
+    if isinstance(st, OSError):
+        return SEKFileInfo(path, None, None, None, None, {}, st)
+    digests = {}
+    error = None
+    if algorithms:
+        try:
+            digests = fileUtil.checksums(path, algorithms)
+        except (IOError, OSError) as detail:
+            error = detail
+    return SEKFileInfo(path, st.st_size, st.st_mtime, stat.S_IMODE(st.st_mode),
+                       tooPermissive(st.st_mode), digests, error)
+
+
+def copyRange(src, dst, offset, count):
+    """
+    Copy a byte range of one file to the current position of another.
+
+    The copy is made in the kernel with os.copy_file_range or os.sendfile
+    where they are available, otherwise through a buffer.
+
+    :param src: File object opened for binary reading.
+    :param dst: File object opened for binary writing. It should not have
+    buffered writes pending.
+    :param offset: Int position in src of the first byte.
+    :param count: Int number of bytes to copy.
+    :returns: Int number of bytes copied, which is less than count only if
+    src ends first.
+    """
+
+    copyFileRange = getattr(os, 'copy_file_range', None)
+    sendfile = getattr(os, 'sendfile', None)
+    buffered = False
+    remaining = count
+    while remaining > 0:
+        copied = None
+        if copyFileRange:
+            try:
+                copied = copyFileRange(src.fileno(), dst.fileno(), remaining,
+                                       offset)
+            except OSError:
+                # For example across file systems on older kernels.
+                copyFileRange = None
+            if copied == 0:
+                # Some file systems report no data instead of failing, so
+                # only a buffered read is trusted to detect the end.
+                copied = copyFileRange = None
+        elif sendfile:
+            try:
+                copied = sendfile(dst.fileno(), src.fileno(), offset,
+                                  remaining)
+            except OSError:
+                sendfile = None
+            if copied == 0:
+                copied = sendfile = None
+        else:
+            buffered = True
+            src.seek(offset)
+            data = src.read(min(CHUNK_SIZE, remaining))
+            dst.write(data)
+            copied = len(data)
+        if copied is None:
+            continue
+        if not copied:
+            break
+        offset += copied
+        remaining -= copied
+    if buffered:
+        dst.flush()
+    return count - remaining
+
+
+class SEKChunkReader(io.RawIOBase):
+    """
+    Unbuffered reader of the bytes from start to end of a file.
+
+    Positions are relative to the start of the range. Reads end at the end of
+    the range.
+    """
+
+    def __init__(self, path, start, end):
+        io.RawIOBase.__init__(self)
+        self._file = open(path, 'rb')
+        self._start = start
+        self._end = end
+        self._position = 0
+        self._file.seek(start)
+
+
+    def readable(self):
+        return True
+
+
+    def seekable(self):
+        return True
+
+
+    def readinto(self, b):
+        count = min(len(b), self._end - self._start - self._position)
+        if count <= 0:
+            return 0
+        count = self._file.readinto(memoryview(b)[:count])
+        self._position += count
+        return count
+
+
+    def seek(self, offset, whence = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._end - self._start
+        self._position = max(0, offset)
+        self._file.seek(self._start + self._position)
+        return self._position
+
+
+    def tell(self):
+        return self._position
+
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        io.RawIOBase.close(self)
+
+
+class SEKFileChunk(namedtuple('SEKFileChunk', ['path', 'start', 'end'])):
+    """
+    Descriptor of the bytes from start up to end of a file.
+
+    Descriptors are small and can be passed to worker processes, which open
+    their own readers so that a file is processed in parallel without
+    writing chunk files.
+    """
+
+    __slots__ = ()
+
+    @property
+    def size(self):
+        return self.end - self.start
+
+
+    def open(self, encoding = None, bufferSize = io.DEFAULT_BUFFER_SIZE):
+        """
+        Open a reader of the chunk.
+
+        :param encoding: String encoding for a text reader. If None, the
+        reader returns bytes.
+        :param bufferSize: Int size of the read buffer.
+        :returns: Buffered file-like object that can be iterated by line.
+        """
+
+        reader = io.BufferedReader(SEKChunkReader(self.path, self.start,
+                                                  self.end), bufferSize)
+        if encoding:
+            return io.TextIOWrapper(reader, encoding = encoding, newline = '')
+        return reader
+
+
+    @contextmanager
+    def mapped(self):
+        """
+        Memory map the chunk.
+
+        Usage:
+
+            with chunk.mapped() as data:
+                data[0:10]
+
+        :returns: Context manager giving a read-only buffer of the chunk
+        without copying it.
+        """
+
+        # Maps must start at a multiple of the allocation granularity.
+        offset = self.start - self.start % mmap.ALLOCATIONGRANULARITY
+        length = self.end - offset
+        with open(self.path, 'rb') as f:
+            if not self.size:
+                yield memoryview(b'')
+                return
+            data = mmap.mmap(f.fileno(), length, access = mmap.ACCESS_READ,
+                             offset = offset)
+            view = None
+            try:
+                try:
+                    view = memoryview(data)[self.start - offset:]
+                except TypeError:
+                    # Maps on Python 2 only support the old buffer interface.
+                    view = buffer(data, self.start - offset)
+                yield view
+            finally:
+                # Views of the map must be released before it is closed.
+                if hasattr(view, 'release'):
+                    view.release()
+                view = None
+                data.close()
 
 
 class SEKFileUtil(object):
@@ -19,11 +316,13 @@ class SEKFileUtil(object):
     Utilities related to files and directories.
     """
 
-    def __init__(self):
+    def __init__(self, logLevel = 'DEBUG'):
         """
         Constructor.
+
+        :param logLevel
         """
-        self.logger = SEKLogger(__name__, 'DEBUG')
+        self.logger = SEKLogger(__name__, logLevel)
 
 
     def validDirectory(self, path):
@@ -50,65 +349,263 @@ class SEKFileUtil(object):
         """
 
         try:
-            f = open(fullPath, mode = 'rb')
-            content = hashlib.md5()
-            for buf in iter(partial(f.read, 128), b''):
-                content.update(buf)
-            md5sum = content.hexdigest()
-            f.close()
-            return md5sum
-        except IOError as detail:
-            self.logger.log(
-                'Exception during checksum calculation: %s' % detail, 'ERROR')
+            return self.checksums(fullPath, ('md5',))['md5']
+        except (IOError, OSError) as detail:
+            self.logger.log('Exception during checksum calculation: {}',
+                            'ERROR', detail)
 
 
-    def gzipUncompressFile(self, srcPath, destPath):
+    def checksums(self, fullPath, algorithms = ('md5',),
+                  bufferSize = CHUNK_SIZE, useMmap = False):
+        """
+        Compute one or more checksums of a file in a single pass.
+
+        :param fullPath: Full path of the file.
+        :param algorithms: Sequence of hashlib algorithm names such as md5,
+        sha1, sha256 and blake2b.
+        :param bufferSize: Int number of bytes hashed per update.
+        :param useMmap: Boolean if True, the file is memory mapped instead of
+        read into a buffer.
+        :returns: Dict of hex digests by algorithm name.
+        :raises: IOError or OSError if the file cannot be read.
+        """
+
+        hashes = []
+        for name in algorithms:
+            try:
+                hashes.append((name, hashlib.new(name)))
+            except ValueError:
+                raise Exception(
+                    'Unsupported checksum algorithm {}.'.format(name))
+
+        with open(fullPath, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if useMmap and size:
+                data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+                view = block = None
+                try:
+                    try:
+                        view = memoryview(data)
+                    except TypeError:
+                        # Maps on Python 2 are sliced into copies instead.
+                        view = data
+                    for start in range(0, size, bufferSize):
+                        block = view[start:start + bufferSize]
+                        for name, content in hashes:
+                            content.update(block)
+                finally:
+                    # Views of the map must be released before it is closed.
+                    view = block = None
+                    data.close()
+            else:
+                buf = bytearray(bufferSize)
+                view = memoryview(buf)
+                while True:
+                    count = f.readinto(buf)
+                    if not count:
+                        break
+                    for name, content in hashes:
+                        content.update(view[:count])
+
+        return dict((name, content.hexdigest()) for name, content in hashes)
+
+
+    def gzipUncompressFile(self, srcPath, destPath, chunkSize = CHUNK_SIZE,
+                           progress = None):
         """
         Gzip uncompress a file given by fullPath.
 
-        @todo Need to deal with large file sizes. Stop reading into memory.
+        The file is streamed so that at most chunkSize uncompressed bytes are
+        held in memory.
 
         :param srcPath: Full path of the file to be uncompressed.
         :param destPath: Full path of file to be written to.
+        :param chunkSize: Int number of uncompressed bytes per read.
+        :param progress: Optional callable taking the number of uncompressed
+        bytes written, the number of compressed bytes read and the size of the
+        compressed file. It is called after each chunk.
+        :returns: Boolean: True if successful, False otherwise.
+        """
+
+        self.logger.log('Uncompressing gzip source {} to {}', 'DEBUG', srcPath,
+                        destPath)
+        success = False
+        written = 0
+        compressedSize = os.path.getsize(srcPath)
+        with open(srcPath, 'rb') as compressedFile:
+            gzipFile = gzip.GzipFile(fileobj = compressedFile, mode = 'rb')
+            try:
+                with open(destPath, 'wb') as uncompressedFile:
+                    for chunk in iter(partial(gzipFile.read, chunkSize), b''):
+                        uncompressedFile.write(chunk)
+                        written += len(chunk)
+                        if progress:
+                            progress(written, compressedFile.tell(),
+                                     compressedSize)
+                success = True
+            except (IOError, OSError, EOFError) as detail:
+                self.logger.log('Exception while writing uncompressed file: '
+                                '{}', 'ERROR', detail)
+            finally:
+                gzipFile.close()
+        return success
+
+
+    def gzipChunks(self, srcPath, chunkSize = CHUNK_SIZE):
+        """
+        Read a gzip compressed file in uncompressed chunks without writing
+        it out.
+
+        :param srcPath: Full path of the compressed file.
+        :param chunkSize: Int number of uncompressed bytes per chunk.
+        :returns: Generator of byte strings of at most chunkSize bytes.
         """
 
-        self.logger.log(
-            'Uncompressing gzip source %s to %s' % (srcPath, destPath), 'DEBUG')
-        gzipFile = gzip.open(srcPath, "rb")
-        uncompressedFile = open(destPath, "wb")
-        decoded = gzipFile.read()
+        gzipFile = gzip.open(srcPath, 'rb')
         try:
-            uncompressedFile.write(decoded)
-        except:
-            self.logger.log("Exception while writing uncompressed file.")
-        gzipFile.close()
-        uncompressedFile.close()
+            for chunk in iter(partial(gzipFile.read, chunkSize), b''):
+                yield chunk
+        finally:
+            gzipFile.close()
 
 
-    def gzipCompressFile(self, fullPath):
+    def gzipRecordChunks(self, srcPath, chunkSize = CHUNK_SIZE,
+                         delimiter = b'\n'):
+        """
+        Read a gzip compressed file in uncompressed chunks of whole records.
+
+        :param srcPath: Full path of the compressed file.
+        :param chunkSize: Int number of uncompressed bytes read at a time.
+        Chunks are shorter by the partial record at their end, which starts
+        the next chunk, or longer if a record does not fit in chunkSize.
+        :param delimiter: Byte string ending each record.
+        :returns: Generator of byte strings ending with a delimiter, except
+        possibly the last one.
+        """
+
+        remainder = b''
+        for block in self.gzipChunks(srcPath, chunkSize):
+            data = remainder + block
+            end = data.rfind(delimiter)
+            if end < 0:
+                remainder = data
+                continue
+            end += len(delimiter)
+            remainder = data[end:]
+            yield data[:end]
+        if remainder:
+            yield remainder
+
+
+    def gzipLines(self, srcPath, encoding = None, chunkSize = CHUNK_SIZE):
+        """
+        Read the lines of a gzip compressed file without writing it out.
+
+        :param srcPath: Full path of the compressed file.
+        :param encoding: String encoding used to decode the lines. If None,
+        lines are byte strings.
+        :param chunkSize: Int size of the read buffer.
+        :returns: Generator of lines including their line endings.
+        """
+
+        gzipFile = gzip.open(srcPath, 'rb')
+        try:
+            lines = io.BufferedReader(gzipFile, chunkSize)
+            if encoding:
+                lines = io.TextIOWrapper(lines, encoding = encoding,
+                                         newline = '')
+            for line in lines:
+                yield line
+        finally:
+            gzipFile.close()
+
+
+    def gzipCompressFile(self, fullPath, compressLevel = 9, workers = 1,
+                         blockSize = GZIP_BLOCK_SIZE):
         """
         Perform gzip compression on a file at fullPath.
 
-        @todo Generalize this method.
+        The output is written to ${fullPath}.gz. With more than one worker,
+        blocks of the file are compressed concurrently into the members of a
+        multi-member gzip file, which gzip and gunzip read as one stream.
 
         :param fullPath: Full path of the file to be compressed.
+        :param compressLevel: Int compression level from 1 (fastest) to 9
+        (smallest).
+        :param workers: Int number of threads compressing blocks.
+        :param blockSize: Int size of the blocks compressed by the workers.
         :returns: Boolean: True if successful, False otherwise.
         """
 
         success = False
-        self.logger.log('Gzip compressing %s.' % fullPath)
+        self.logger.log('Gzip compressing {}.', 'info', fullPath)
         try:
-            f_in = open('%s' % (fullPath), 'rb')
-            f_out = gzip.open('%s.gz' % (fullPath), 'wb')
-            f_out.writelines(f_in)
-            f_out.close()
-            f_in.close()
+            with open(fullPath, 'rb') as f_in:
+                if workers > 1:
+                    with open('%s.gz' % fullPath, 'wb') as f_out:
+                        self._parallelGzip(f_in, f_out, compressLevel,
+                                           workers, blockSize)
+                else:
+                    f_out = gzip.open('%s.gz' % fullPath, 'wb', compressLevel)
+                    try:
+                        shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+                    finally:
+                        f_out.close()
             success = True
         except IOError as detail:
-            self.logger.log('IOError exception while gzipping: %s' % detail, 'ERROR')
+            self.logger.log('IOError exception while gzipping: {}', 'ERROR',
+                            detail)
         return success
 
 
+    def _parallelGzip(self, f_in, f_out, compressLevel, workers, blockSize):
+        """
+        Compress blocks of f_in in a thread pool and write the members to
+        f_out in order.
+
+        At most two blocks per worker are held in memory.
+        """
+
+        pool = ThreadPool(workers)
+        try:
+            pending = deque()
+            blocks = 0
+            for block in iter(partial(f_in.read, blockSize), b''):
+                pending.append(
+                    pool.apply_async(gzipMember, (block, compressLevel)))
+                blocks += 1
+                if len(pending) >= 2 * workers:
+                    f_out.write(pending.popleft().get())
+            while pending:
+                f_out.write(pending.popleft().get())
+            if not blocks:
+                f_out.write(gzipMember(b'', compressLevel))
+        finally:
+            pool.close()
+            pool.join()
+
+
+    def gzipCompressFiles(self, paths, compressLevel = 9, workers = 4):
+        """
+        Gzip compress several files concurrently.
+
+        :param paths: List of full paths of the files to be compressed.
+        :param compressLevel: Int compression level from 1 to 9.
+        :param workers: Int number of files compressed at the same time.
+        :returns: Dict of Boolean success by path.
+        """
+
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(
+                lambda path: self.gzipCompressFile(path, compressLevel),
+                paths, 1)
+        finally:
+            pool.close()
+            pool.join()
+        return dict(zip(paths, results))
+
+
     def splitFile(self, fullPath = '', chunkSize = 0):
         """
         @DEPRECATED
@@ -152,54 +649,147 @@ class SEKFileUtil(object):
                 f.write(data[i:i + chunkSize])
                 f.close()
             except Exception as detail:
-                print "Exception during writing split file: %s" % detail
+                print("Exception during writing split file: %s" % detail)
 
             fCnt += 1
 
         return fChunks
 
 
-    def splitLargeFile(self, fullPath = '', numChunks = 0, chunkSize = 0):
+    def splitLargeFile(self, fullPath = '', numChunks = 0, chunkSize = 0,
+                       alignToRecords = False, delimiter = b'\n'):
         """
         Split a large file into chunks.
 
+        Chunks are copied in the kernel where possible, without reading the
+        data into memory.
+
         :param fullPath: String
         :param numChunks: Int number of files to be split into.
         :param chunkSize: @DEPRECATED
+        :param alignToRecords: Boolean if True, chunks end after a delimiter
+        so that records, such as CSV rows, are not split. Chunks are then of
+        approximately equal size.
+        :param delimiter: Byte string ending each record.
         :return: List of file chunk names in full path form.
         """
 
         fChunks = []
         basePath = os.path.dirname(fullPath)
         baseName = os.path.basename(fullPath)
-        self.logger.log('basename: %s' % baseName)
+        self.logger.log('basename: {}', 'info', baseName)
+
+        if numChunks == 0 or numChunks == 1:
+            return [fullPath]
 
-        fp = open(fullPath, 'rb')
         fsize = os.path.getsize(fullPath)
-        chunkSize = int(float(fsize) / float(numChunks))
-        totalBytes = 0
+        if alignToRecords:
+            boundaries = self.recordBoundaries(fullPath, numChunks, delimiter)
+        else:
+            chunkSize = int(float(fsize) / float(numChunks))
+            self.logger.log('chunk size: {}', 'info', chunkSize)
+            boundaries = [chunkSize * x for x in range(numChunks)] + [fsize]
+
+        with open(fullPath, 'rb') as fp:
+            for x in range(numChunks):
+                fout = open("%s/%s.%s" % (basePath, baseName, x), "wb")
+                self.logger.log('Writing {}/{}.{}', 'debug', basePath, baseName,
+                                x)
+                fChunks.append("%s/%s.%s" % (basePath, baseName, x))
+
+                expected = boundaries[x + 1] - boundaries[x]
+                copied = copyRange(fp, fout, boundaries[x], expected)
+                fout.close()
+                if copied != expected:
+                    raise Exception(
+                        'Copied {} of {} bytes to {}/{}.{}.'.format(
+                            copied, expected, basePath, baseName, x))
 
-        self.logger.log('chunk size: %s' % chunkSize)
+        return fChunks
 
-        if numChunks == 0 or numChunks == 1:
-            return [fullPath]
 
-        for x in range(numChunks):
+    def fileChunks(self, fullPath, numChunks = None, chunkSize = None,
+                   delimiter = b'\n'):
+        """
+        Divide a file into chunks of whole records without writing any files.
+
+        :param fullPath: Full path of the file.
+        :param numChunks: Int number of chunks.
+        :param chunkSize: Int approximate size of the chunks in bytes, used
+        if numChunks is not given.
+        :param delimiter: Byte string ending each record. If None, chunks are
+        not aligned to records.
+        :returns: List of SEKFileChunk. Empty chunks are left out.
+        """
 
-            if x == numChunks - 1:
-                chunkSize = fsize - totalBytes
+        fsize = os.path.getsize(fullPath)
+        if not numChunks:
+            if not chunkSize:
+                raise Exception('Number of chunks or chunk size not defined.')
+            numChunks = max(1, -(-fsize // chunkSize))
 
-            data = fp.read(chunkSize)
-            totalBytes += len(data)
-            fout = open("%s/%s.%s" % (basePath, baseName, x), "wb")
-            self.logger.log('Writing %s/%s.%s' % (basePath, baseName, x),
-                            'debug')
-            fChunks.append("%s/%s.%s" % (basePath, baseName, x))
+        if delimiter:
+            boundaries = self.recordBoundaries(fullPath, numChunks, delimiter)
+        else:
+            boundaries = [fsize * x // numChunks for x in
+                          range(numChunks)] + [fsize]
+        return [SEKFileChunk(fullPath, start, end) for start, end in
+                zip(boundaries, boundaries[1:]) if end > start]
 
-            fout.write(data)
-            fout.close()
 
-        return fChunks
+    def recordBoundaries(self, fullPath, numChunks, delimiter = b'\n',
+                         scanSize = 64 * 1024):
+        """
+        Find offsets that divide a file into chunks of whole records.
+
+        Each boundary is found by seeking to an evenly spaced offset and
+        scanning forward to the end of the record there, so only small parts
+        of the file are read.
+
+        :param fullPath: Full path of the file.
+        :param numChunks: Int number of chunks.
+        :param delimiter: Byte string ending each record.
+        :param scanSize: Int number of bytes read per scan step.
+        :returns: List of numChunks + 1 offsets starting with 0 and ending
+        with the file size. Chunk i spans offsets[i] to offsets[i + 1], which
+        is empty if a record is longer than the spacing of the chunks.
+        """
+
+        fsize = os.path.getsize(fullPath)
+        boundaries = [0]
+        with open(fullPath, 'rb') as f:
+            for x in range(1, numChunks):
+                target = max(fsize * x // numChunks, boundaries[-1])
+                boundaries.append(self._recordEnd(f, target, fsize, delimiter,
+                                                  scanSize))
+        boundaries.append(fsize)
+        return boundaries
+
+
+    def _recordEnd(self, f, offset, fsize, delimiter, scanSize):
+        """
+        :returns: Int offset just after the first delimiter that ends at or
+        after offset, or fsize if there is none.
+        """
+
+        if offset <= 0:
+            return 0
+
+        # Start before the offset so that a delimiter ending exactly at the
+        # offset is found.
+        start = max(0, offset - len(delimiter))
+        f.seek(start)
+        tail = b''
+        while True:
+            block = f.read(scanSize)
+            if not block:
+                return fsize
+            data = tail + block
+            found = data.find(delimiter)
+            if found >= 0:
+                return start - len(tail) + found + len(delimiter)
+            tail = data[-(len(delimiter) - 1):] if len(delimiter) > 1 else b''
+            start += len(block)
 
 
     def fileSize(self, fullPath = ''):
@@ -221,16 +811,43 @@ class SEKFileUtil(object):
         read/write, otherwise returns False.
         """
 
-        st = os.stat(filePath)
+        return tooPermissive(os.stat(filePath).st_mode)
 
-        # Permissions are too permissive if group or others can read,
-        # write or execute.
-        if bool(st.st_mode & stat.S_IRGRP) or bool(
-                        st.st_mode & stat.S_IROTH) or bool(
-                        st.st_mode & stat.S_IWGRP) or bool(
-                        st.st_mode & stat.S_IWOTH) or bool(
-                        st.st_mode & stat.S_IXGRP) or bool(
-                        st.st_mode & stat.S_IXOTH):
-            return True
-        else:
-            return False
+
+    def scanDirectory(self, directory, algorithms = ('md5',), workers = 4,
+                      recursive = True, followLinks = False):
+        """
+        Get the size, permissions and checksums of all files in a directory
+        tree.
+
+        Files are hashed by a pool of threads while the tree is still being
+        walked, and results are yielded as soon as each file is done.
+
+        :param directory: String path of the directory.
+        :param algorithms: Sequence of hashlib algorithm names. No files are
+        read if it is empty.
+        :param workers: Int number of files hashed at the same time.
+        :param recursive: Boolean if True, subdirectories are scanned.
+        :param followLinks: Boolean if True, symbolic links are followed.
+        :returns: Generator of SEKFileInfo in the order in which files
+        finish.
+        """
+
+        if not self.validDirectory(directory):
+            raise Exception('Invalid directory {}.'.format(directory))
+
+        scan = partial(_scanFile, self, tuple(algorithms or ()))
+        files = walkFiles(directory, recursive, followLinks)
+        if workers < 2 or not algorithms:
+            for item in files:
+                yield scan(item)
+            return
+
+        pool = ThreadPool(workers)
+        try:
+            for info in pool.imap_unordered(scan, files):
+                yield info
+        finally:
+            # Stop hashing if the caller stops consuming results.
+            pool.terminate()
+            pool.join()
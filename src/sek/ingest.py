@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import csv
+import gzip
+import io
+import multiprocessing
+import threading
+import time
+from functools import partial
+from multiprocessing.pool import ThreadPool
+from sek.db_util import SEKDBUtil
+from sek.file_util import SEKFileUtil, SEKFileChunk
+from sek.logger import SEKLogger
+
+# Default number of bytes read per chunk.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def parseCSVChunk(chunk, delimiter = ',', encoding = 'utf-8', nullString = '',
+                  skipFirstLine = False, parser = None):
+    """
+    Parse a chunk of CSV records.
+
+    This runs in the worker processes of SEKIngestPipeline, so its arguments
+    and result are pickled.
+
+    :param chunk: SEKFileChunk or byte string of whole records.
+    :param delimiter: String field delimiter.
+    :param encoding: String encoding of the file.
+    :param nullString: String for fields that are loaded as NULL.
+    :param skipFirstLine: Boolean if True, the first line is a header.
+    :param parser: Optional module-level callable that converts a list of
+    fields to a row. Rows for which it returns None are skipped.
+    :returns: Tuple of the list of rows and the Float seconds spent.
+    :raises csv.Error: If the chunk ends inside a quoted field.
+    """
+
+    start = time.time()
+    if isinstance(chunk, SEKFileChunk):
+        reader = chunk.open()
+        try:
+            data = reader.read()
+        finally:
+            reader.close()
+    else:
+        data = chunk
+
+    if str is bytes:
+        lines = io.BytesIO(data)
+    else:
+        lines = io.StringIO(data.decode(encoding), newline = '')
+        delimiter = str(delimiter)
+
+    # Strict parsing fails a chunk that was cut inside a quoted field
+    # instead of loading the truncated field.
+    records = csv.reader(lines, delimiter = delimiter, strict = True)
+    if skipFirstLine:
+        next(records, None)
+
+    rows = []
+    for fields in records:
+        if not fields:
+            continue
+        row = [None if field == nullString else field for field in fields]
+        if parser:
+            row = parser(row)
+            if row is None:
+                continue
+        rows.append(row)
+    return rows, time.time() - start
+
+
+class SEKIngestPipeline(object):
+    """
+    Load a CSV file, plain or gzip compressed, into a table in parallel.
+
+    The file is divided into chunks of whole records. A plain file is divided
+    into byte ranges that the parsing processes read themselves, and a gzip
+    file is decompressed as a stream. Chunks are parsed in a process pool and
+    each parsed chunk is loaded with COPY over its own connection from a
+    connection pool, then committed. Only maxPendingChunks chunks are in
+    flight at a time, so reading waits for parsing and loading to catch up.
+
+    Chunks are split on line breaks without regard to quoting, so records
+    must not contain embedded newlines. A quoted field that spans lines can
+    be cut between two chunks, in which case the first of them fails to
+    parse and is reported in the errors of the result.
+
+    Usage:
+
+        connector = SEKDBConnector(dbName = 'db', usePool = True,
+                                   maxConnections = 4)
+        pipeline = SEKIngestPipeline(connector.pool, 'Readings',
+                                     hasHeader = True, parseWorkers = 4,
+                                     loadWorkers = 4)
+        stats = pipeline.run('readings.csv.gz')
+
+    Public API:
+
+        run(path: String):Dict
+            Ingest a file and return the metrics of the run.
+    """
+
+    def __init__(self, pool = None, table = None, columns = None,
+                 parseWorkers = 2, loadWorkers = 2, chunkSize = CHUNK_SIZE,
+                 maxPendingChunks = None, hasHeader = False, delimiter = ',',
+                 encoding = 'utf-8', nullString = '', parser = None,
+                 logLevel = 'silent'):
+        """
+        Constructor.
+
+        :param pool: SEKDBConnectionPool allowing at least loadWorkers
+        connections.
+        :param table: String name of the table to load.
+        :param columns: List of column names in the order of the fields. If
+        None, the header of the file or else all columns of the table are
+        used.
+        :param parseWorkers: Int number of parsing processes. 0 parses in the
+        loading threads instead.
+        :param loadWorkers: Int number of chunks loaded at the same time.
+        :param chunkSize: Int approximate number of bytes per chunk.
+        :param maxPendingChunks: Int number of chunks read but not yet
+        loaded. Defaults to twice the number of workers.
+        :param hasHeader: Boolean if True, the first line is a header.
+        :param delimiter: String field delimiter.
+        :param encoding: String encoding of the file.
+        :param nullString: String for fields that are loaded as NULL.
+        :param parser: Optional module-level callable that converts a list
+        of fields to a row, or to None to skip the record.
+        :param logLevel
+        """
+
+        if not pool:
+            raise Exception('Connection pool not defined.')
+        if not table:
+            raise Exception('Table not defined.')
+        if loadWorkers < 1 or parseWorkers < 0:
+            raise Exception('Invalid number of workers.')
+
+        self.logger = SEKLogger(__name__, logLevel)
+        self.pool = pool
+        self.table = table
+        self.columns = columns
+        self.parseWorkers = parseWorkers
+        self.loadWorkers = loadWorkers
+        self.chunkSize = chunkSize
+        self.maxPendingChunks = maxPendingChunks or 2 * (parseWorkers +
+                                                         loadWorkers)
+        self.hasHeader = hasHeader
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.nullString = nullString
+        self.parser = parser
+        self.dbUtil = SEKDBUtil(logLevel = logLevel)
+        self.fileUtil = SEKFileUtil(logLevel = logLevel)
+
+
+    def _isGzip(self, path):
+        with open(path, 'rb') as f:
+            return f.read(2) == b'\x1f\x8b'
+
+
+    def _header(self, path, compressed):
+        """
+        :returns: List of the column names in the first line of the file.
+        """
+
+        f = gzip.open(path, 'rb') if compressed else open(path, 'rb')
+        try:
+            line = f.readline()
+        finally:
+            f.close()
+        rows, seconds = parseCSVChunk(line, self.delimiter, self.encoding,
+                                      None)
+        return rows[0] if rows else []
+
+
+    def _tableColumns(self):
+        with self.pool.connection() as conn:
+            return self.dbUtil.columns(conn.cursor(), self.table)
+
+
+    def run(self, path):
+        """
+        Ingest a file.
+
+        Each chunk is committed separately. A chunk that fails to parse or
+        load is rolled back and reported in the errors of the result while
+        the other chunks are still loaded.
+
+        :param path: String full path of a CSV file, optionally gzip
+        compressed.
+        :returns: Dict with the number of chunks, rows and bytes, errors as a
+        list of (chunk index, error) tuples, the elapsed seconds, the rows
+        per second, and per-stage metrics for read, parse and load. Stage
+        seconds are summed over the workers of the stage. The read stage
+        also gives the seconds spent waiting for pending chunks.
+        """
+
+        start = time.time()
+        compressed = self._isGzip(path)
+        columns = self.columns
+        if not columns and self.hasHeader:
+            columns = self._header(path, compressed)
+        if not columns:
+            columns = self._tableColumns()
+
+        if compressed:
+            chunks = self.fileUtil.gzipRecordChunks(path, self.chunkSize)
+        else:
+            chunks = iter(self.fileUtil.fileChunks(path,
+                                                   chunkSize = self.chunkSize))
+
+        stats = {'chunks': 0, 'rows': 0, 'bytes': 0, 'errors': [],
+                 'seconds': 0.0, 'rowsPerSecond': 0.0,
+                 'read': {'seconds': 0.0, 'waitSeconds': 0.0},
+                 'parse': {'seconds': 0.0, 'rowsPerSecond': 0.0},
+                 'load': {'seconds': 0.0, 'rowsPerSecond': 0.0}}
+        pending = threading.BoundedSemaphore(self.maxPendingChunks)
+        parsePool = multiprocessing.Pool(
+            self.parseWorkers) if self.parseWorkers else None
+        loadPool = ThreadPool(self.loadWorkers)
+        results = []
+
+        try:
+            while True:
+                waitStart = time.time()
+                pending.acquire()
+                readStart = time.time()
+                stats['read']['waitSeconds'] += readStart - waitStart
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    pending.release()
+                    break
+                finally:
+                    stats['read']['seconds'] += time.time() - readStart
+
+                index = stats['chunks']
+                stats['chunks'] += 1
+                stats['bytes'] += chunk.size if isinstance(
+                    chunk, SEKFileChunk) else len(chunk)
+                args = (chunk, self.delimiter, self.encoding, self.nullString,
+                        self.hasHeader and index == 0, self.parser)
+                if parsePool:
+                    parsed = parsePool.apply_async(parseCSVChunk, args).get
+                else:
+                    parsed = partial(parseCSVChunk, *args)
+                results.append(loadPool.apply_async(
+                    self._loadChunk, (index, parsed, columns, pending)))
+
+            for result in results:
+                index, rows, parseSeconds, loadSeconds, error = result.get()
+                stats['parse']['seconds'] += parseSeconds
+                stats['load']['seconds'] += loadSeconds
+                if error is None:
+                    stats['rows'] += rows
+                else:
+                    stats['errors'].append((index, error))
+        finally:
+            loadPool.close()
+            loadPool.join()
+            if parsePool:
+                parsePool.close()
+                parsePool.join()
+
+        stats['seconds'] = time.time() - start
+        for stage in ('parse', 'load'):
+            if stats[stage]['seconds'] > 0:
+                stats[stage]['rowsPerSecond'] = stats['rows'] / stats[stage][
+                    'seconds']
+        if stats['seconds'] > 0:
+            stats['rowsPerSecond'] = stats['rows'] / stats['seconds']
+
+        self.logger.log('Ingested {} rows in {} chunks from {} at {:.0f} '
+                        'rows/s with {} errors.', 'info', stats['rows'],
+                        stats['chunks'], path, stats['rowsPerSecond'],
+                        len(stats['errors']))
+        return stats
+
+
+    def _loadChunk(self, index, parsed, columns, pending):
+        """
+        Load a parsed chunk over a pooled connection and commit it.
+
+        :param index: Int index of the chunk.
+        :param parsed: Callable returning the rows and parse seconds.
+        :param columns: List of column names.
+        :param pending: Semaphore released when the chunk is done.
+        :returns: Tuple of the index, the number of rows, the parse and load
+        seconds, and the error or None.
+        """
+
+        rows = []
+        parseSeconds = 0.0
+        loadSeconds = 0.0
+        try:
+            rows, parseSeconds = parsed()
+            loadStart = time.time()
+            try:
+                with self.pool.connection() as conn:
+                    loaded = self.dbUtil.bulkLoad(conn.cursor(), self.table,
+                                                  rows, columns,
+                                                  exitOnFail = False)
+                    if loaded is None:
+                        raise Exception(
+                            'Loading chunk {} failed.'.format(index))
+                    conn.commit()
+            finally:
+                loadSeconds = time.time() - loadStart
+            return index, len(rows), parseSeconds, loadSeconds, None
+        except Exception as detail:
+            self.logger.log('Chunk {} failed: {}', 'error', index, detail)
+            return index, 0, parseSeconds, loadSeconds, detail
+        finally:
+            pending.release()
@@ -35,8 +35,11 @@ each instance.
 
 Public API:
 
-log(message:String, level:String)
-    Output a logging message at the specified logging level.
+log(message:String, level:String, *args, fields:Dict, **kwargs)
+    Output a logging message at the specified logging level. If args or
+    kwargs are given, message is a template for str.format that is only
+    rendered when the message is output. fields are key-value pairs added to
+    the message.
 
 startRecoring()
     Starting recording of log messages to self.recording.
@@ -44,6 +47,43 @@ startRecoring()
 endRecording()
     End recording of log messages.
 
+recordedMessages(count:Int, level:String):List
+    Formatted recorded messages, optionally only the last count of them and
+    only those at or above level.
+
+clearRecording()
+    Discard recorded messages.
+
+flush()
+    Wait until queued messages of an asynchronous logger have been written.
+
+addJSONLinesSink(path:String, stream:File):Handler
+    Also write messages as JSON objects, one per line.
+
+setRateLimit(limit:Int, interval:Float, sampleEvery:Int, by:String,
+             maxKeys:Int)
+    Limit how often the same message is output and report the number of
+    suppressed messages.
+
+reportSuppressed()
+    Output the pending counts of suppressed messages. Counts are otherwise
+    only output when the same message recurs in a later interval or its
+    key is evicted, so call this before exiting.
+
+addRotatingFileSink(path:String, maxBytes:Int, interval:Float,
+                    backupCount:Int, maxAge:Float, compress:Boolean,
+                    jsonLines:Boolean):Handler
+    Also write messages to a file that is rotated by size or time. Rotated
+    files are gzip compressed in the background.
+
+Asynchronous logging:
+
+    self.logger = SEKLogger(__name__, 'INFO', asynchronous = True)
+
+queues records for a background thread that formats and writes them, so that
+calls to log do not wait on output. All asynchronous loggers share one
+listener thread and its queue is flushed when the interpreter exits.
+
 """
 
 __author__ = 'Daniel Zhang (張道博)'
@@ -51,9 +91,21 @@ __copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
 __license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
               '-Energy-Kit/master/BSD-LICENSE.txt'
 
+import atexit
+import json
+import os
+import re
 import sys
 import logging
-from io import StringIO
+import threading
+import time
+import traceback
+from collections import deque, OrderedDict
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 from colorlog import ColoredFormatter
 
 CRITICAL = logging.CRITICAL
@@ -63,6 +115,610 @@ INFO = logging.INFO
 SILENT = logging.NOTSET
 WARNING = logging.WARNING
 
+# Format of plain text output.
+TEXT_FORMAT = u'%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+LEVELS = {'critical': CRITICAL, 'debug': DEBUG, 'error': ERROR, 'info': INFO,
+          'silent': SILENT, 'warning': WARNING}
+
+
+# Level names and values resolve to values with a single lookup.
+_LEVEL_LOOKUP = dict(LEVELS)
+_LEVEL_LOOKUP.update((name.upper(), value) for name, value in LEVELS.items())
+_LEVEL_LOOKUP.update((value, value) for value in LEVELS.values())
+
+
+def _levelNumber(level):
+    """
+    :param level: String name or Int value of a logging level.
+    :returns: Int logging level or None if the name is not known.
+    """
+
+    try:
+        return _LEVEL_LOOKUP[level]
+    except KeyError:
+        pass
+    if isinstance(level, str) or isinstance(level, type(u'')):
+        return LEVELS.get(level.lower())
+    return level
+
+
+class SEKLogRecord(logging.LogRecord):
+    """
+    Log record with a str.format template and structured fields.
+
+    The message is rendered when it is first output and then reused by each
+    handler.
+    """
+
+    def __init__(self, name, level, template, args = None, kwargs = None,
+                 fields = None):
+        logging.LogRecord.__init__(self, name, level, '', 0, template, None,
+                                   None)
+        self.templateArgs = args
+        self.templateKwargs = kwargs
+        self.fields = fields
+        self._text = None
+        self._message = None
+
+
+    def renderedText(self):
+        """
+        :returns: String of the message without the fields.
+        """
+
+        if self._text is None:
+            if self.templateArgs or self.templateKwargs:
+                self._text = self.msg.format(*(self.templateArgs or ()),
+                                             **(self.templateKwargs or {}))
+            else:
+                self._text = self.msg
+        return self._text
+
+
+    def getMessage(self):
+        if self._message is None:
+            message = self.renderedText()
+            if self.fields:
+                message = u'{} {}'.format(message, u' '.join(
+                    u'{}={}'.format(key, self.fields[key]) for key in
+                    sorted(self.fields)))
+            self._message = message
+        return self._message
+
+
+class SEKJSONFormatter(logging.Formatter):
+    """
+    Format records as single-line JSON objects with the keys time, name,
+    level and message, and fields for the structured fields of the record.
+    """
+
+    def format(self, record):
+        if isinstance(record, SEKLogRecord):
+            message = record.renderedText()
+            fields = record.fields
+        else:
+            message = record.getMessage()
+            fields = None
+        entry = {'time': record.created, 'name': record.name,
+                 'level': record.levelname, 'message': message}
+        if fields:
+            entry['fields'] = fields
+        return json.dumps(entry, default = str, sort_keys = True)
+
+
+class SEKRotatingFileHandler(logging.FileHandler):
+    """
+    Write log records to a file that is rotated by size, by time or both.
+
+    A rotated file is renamed to ${PATH}.${YYYYmmdd-HHMMSS} and, if compress
+    is True, gzip compressed by a background thread so that rotation does not
+    wait on compression. After each rotation, the oldest rotated files beyond
+    backupCount and those older than maxAge are removed. Failures of the
+    background thread are reported on stderr.
+
+    Closing the handler waits for pending compressions and stops the thread.
+    """
+
+    def __init__(self, path, maxBytes = 0, interval = 0, backupCount = 7,
+                 maxAge = None, compress = True, encoding = None):
+        """
+        Constructor.
+
+        :param path: String of the log file.
+        :param maxBytes: Int size at which the file is rotated. 0 disables
+        rotation by size.
+        :param interval: Float seconds after which the file is rotated. 0
+        disables rotation by time.
+        :param backupCount: Int number of rotated files to keep. None keeps
+        all of them.
+        :param maxAge: Float seconds after which rotated files are removed.
+        None keeps them regardless of age.
+        :param compress: Boolean if True, rotated files are gzip compressed.
+        :param encoding: String encoding of the file.
+        """
+
+        logging.FileHandler.__init__(self, path, 'a', encoding)
+        self.maxBytes = maxBytes
+        self.interval = interval
+        self.backupCount = backupCount
+        self.maxAge = maxAge
+        self.compress = compress
+        self.rolloverAt = time.time() + interval if interval else None
+        self._rotated = queue.Queue()
+        self._worker = None
+
+        # Rotated files waiting for the worker. Retention leaves them alone.
+        self._pending = set()
+        self._pendingLock = threading.Lock()
+
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes and self.stream.tell() >= self.maxBytes:
+            return True
+        if self.rolloverAt is not None and record.created >= self.rolloverAt:
+            return True
+        return False
+
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover(record.created)
+        except Exception:
+            self.handleError(record)
+        logging.FileHandler.emit(self, record)
+
+
+    def doRollover(self, now = None):
+        """
+        Rename the current file and start a new one.
+
+        :param now: Float time of the rotation.
+        """
+
+        now = now or time.time()
+        self.stream.close()
+
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        candidate = '{}.{}'.format(self.baseFilename, stamp)
+        # Number further rotations in the same second past the highest
+        # existing suffix so that the names keep the order of rotation.
+        suffixes = [suffix for (fileStamp, suffix), path in
+                    self._rotatedKeys() if fileStamp == stamp]
+        if suffixes:
+            candidate = '{}-{}'.format(candidate, max(suffixes) + 1)
+        # Mark the file pending before it appears so that retention running
+        # in the worker does not count it.
+        with self._pendingLock:
+            self._pending.add(candidate)
+        try:
+            os.rename(self.baseFilename, candidate)
+        except Exception:
+            with self._pendingLock:
+                self._pending.discard(candidate)
+            raise
+
+        self.stream = self._open()
+        if self.interval:
+            while self.rolloverAt <= now:
+                self.rolloverAt += self.interval
+
+        if self._worker is None:
+            self._worker = threading.Thread(target = self._processRotated,
+                                            name = 'SEKRotatingFileHandler')
+            self._worker.daemon = True
+            self._worker.start()
+        self._rotated.put(candidate)
+
+
+    def _processRotated(self):
+        # Imported here since file_util uses the logger.
+        from sek.file_util import SEKFileUtil
+
+        fileUtil = None
+        while True:
+            path = self._rotated.get()
+            try:
+                if path is None:
+                    return
+                try:
+                    if self.compress and os.path.exists(path):
+                        if fileUtil is None:
+                            # Errors are reported below instead of logging
+                            # each compression.
+                            fileUtil = SEKFileUtil(logLevel = 'silent')
+                        if not fileUtil.gzipCompressFile(path):
+                            raise IOError(
+                                'Failed to compress {}.'.format(path))
+                        os.remove(path)
+                finally:
+                    with self._pendingLock:
+                        self._pending.discard(path)
+                self.removeExpired()
+            except Exception:
+                self.handleRotationError(path)
+            finally:
+                self._rotated.task_done()
+
+
+    def rotatedFiles(self):
+        """
+        :returns: List of paths of the rotated files, oldest first.
+        """
+
+        # Ordered by the names since compression changes the modification
+        # times and several rotations can fall in the same second.
+        return [path for key, path in sorted(self._rotatedKeys())]
+
+
+    def _rotatedKeys(self):
+        """
+        :returns: List of tuples of the (time stamp, Int suffix) in the name
+        of each rotated file and its path.
+        """
+
+        directory, name = os.path.split(self.baseFilename)
+        pattern = re.compile(
+            r'^{}\.(\d{{8}}-\d{{6}})(?:-(\d+))?(?:\.gz)?$'.format(
+                re.escape(name)))
+        rotated = []
+        for f in os.listdir(directory):
+            match = pattern.match(f)
+            if match:
+                rotated.append(((match.group(1), int(match.group(2) or 0)),
+                                os.path.join(directory, f)))
+        return rotated
+
+
+    def removeExpired(self):
+        """
+        Apply the retention policy to the rotated files. Files still
+        waiting to be compressed are not counted or removed.
+        """
+
+        with self._pendingLock:
+            pending = set(self._pending)
+        paths = [p for p in self.rotatedFiles() if p not in pending]
+        expired = []
+        if self.backupCount is not None and len(paths) > self.backupCount:
+            expired = paths[:len(paths) - self.backupCount]
+        if self.maxAge is not None:
+            oldest = time.time() - self.maxAge
+            expired += [p for p in paths[len(expired):] if
+                        os.path.getmtime(p) < oldest]
+        for path in expired:
+            os.remove(path)
+
+
+    def handleRotationError(self, path):
+        """
+        Report an error while compressing or removing rotated files. As with
+        handleError(), it is written to stderr unless
+        logging.raiseExceptions is False.
+
+        :param path: String of the rotated file being processed.
+        """
+
+        if logging.raiseExceptions and sys.stderr:
+            sys.stderr.write('--- Logging error while processing rotated '
+                             'file {} ---\n'.format(path))
+            traceback.print_exc(file = sys.stderr)
+
+
+    def close(self):
+        if self._worker is not None:
+            self._rotated.put(None)
+            self._worker.join()
+            self._worker = None
+        logging.FileHandler.close(self)
+
+
+class SEKRateLimiter(object):
+    """
+    Count messages per key and allow a limited number in each interval.
+
+    Keys are kept in a least recently used order and the oldest key is
+    evicted when there are maxKeys of them, so memory stays constant however
+    many distinct messages are logged.
+    """
+
+    def __init__(self, limit = 10, interval = 1.0, sampleEvery = None,
+                 maxKeys = 1000):
+        """
+        Constructor.
+
+        :param limit: Int number of messages allowed per key and interval.
+        :param interval: Float seconds of an interval.
+        :param sampleEvery: Int if given, every sampleEvery-th message beyond
+        the limit is also allowed.
+        :param maxKeys: Int maximum number of tracked keys.
+        """
+
+        self.limit = limit
+        self.interval = interval
+        self.sampleEvery = sampleEvery
+        self.maxKeys = maxKeys
+        self.evicted = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def check(self, key, level, template, now = None):
+        """
+        Count a message.
+
+        :param key: Hashable key of the message.
+        :param level: Int level of the message.
+        :param template: String of the message template.
+        :param now: Float time of the message.
+        :returns: Tuple (allowed, suppressed, evicted) where allowed is True
+        if the message should be output and suppressed is the number of
+        messages suppressed in a previous interval that should now be
+        reported. evicted is None, or a (level, template, suppressed) tuple
+        for a key that was evicted to make room while it still had
+        unreported suppressed messages.
+        """
+
+        now = now or time.time()
+        evicted = None
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                if len(self._entries) >= self.maxKeys:
+                    oldKey, oldEntry = self._entries.popitem(last = False)
+                    self.evicted += 1
+                    if oldEntry[2]:
+                        evicted = (oldEntry[3], oldEntry[4], oldEntry[2])
+                # Start of the interval, count, suppressed count, level and
+                # template.
+                entry = [now, 0, 0, level, template]
+            self._entries[key] = entry
+
+            suppressed = 0
+            if now - entry[0] >= self.interval:
+                suppressed = entry[2]
+                entry[0], entry[1], entry[2] = now, 0, 0
+
+            entry[1] += 1
+            excess = entry[1] - self.limit
+            if excess <= 0:
+                return True, suppressed, evicted
+            if self.sampleEvery and excess % self.sampleEvery == 0:
+                return True, suppressed, evicted
+            entry[2] += 1
+            return False, suppressed, evicted
+
+
+    def pending(self):
+        """
+        Take the counts of suppressed messages that were not reported yet.
+
+        :returns: List of (level, template, suppressed) tuples.
+        """
+
+        with self._lock:
+            counts = [(e[3], e[4], e[2]) for e in self._entries.values() if
+                      e[2]]
+            for entry in self._entries.values():
+                entry[2] = 0
+        return counts
+
+
+class SEKRecordingHandler(logging.Handler):
+    """
+    Keep log records in an append-only buffer.
+
+    Records are formatted only when they are read so that recording adds
+    little cost to each call to log. If maxRecords is given, only the most
+    recent records are kept.
+    """
+
+    def __init__(self, maxRecords = None):
+        logging.Handler.__init__(self, DEBUG)
+        self.records = deque(maxlen = maxRecords)
+
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+    def selectRecords(self, count = None, level = None):
+        """
+        :param count: Int number of most recent records to return.
+        :param level: String or Int minimum level of the records.
+        :returns: List of LogRecords, oldest first.
+        """
+
+        records = list(self.records)
+        if level is not None:
+            levelNumber = _levelNumber(level)
+            records = [r for r in records if r.levelno >= levelNumber]
+        if count is not None:
+            records = records[-count:] if count > 0 else []
+        return records
+
+
+    def messages(self, count = None, level = None):
+        """
+        :returns: List of formatted messages, oldest first.
+        """
+
+        return [self.format(r) for r in self.selectRecords(count, level)]
+
+
+class SEKLogListener(object):
+    """
+    Handle queued log records on a background thread.
+
+    Records are handed to the logger they were created by, so formatting and
+    output happen on the listener thread.
+
+    Public API:
+
+        enqueue(logger: SEKLogger, record: LogRecord, block: Boolean):Boolean
+            Queue a record, dropping it when the queue is full unless block is
+            True.
+
+        flush()
+            Wait until all queued records have been handled.
+
+        stop()
+            Handle the remaining records and end the thread.
+    """
+
+    def __init__(self, queueSize = 10000):
+        """
+        Constructor.
+
+        :param queueSize: Int maximum number of queued records.
+        """
+
+        self.queue = queue.Queue(queueSize)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target = self._run,
+                                                name = 'SEKLogListener')
+                self._thread.daemon = True
+                self._thread.start()
+
+
+    def enqueue(self, logger, record, block = False):
+        """
+        :param logger: SEKLogger or Logger that handles the record.
+        :param record: LogRecord.
+        :param block: Boolean if True, wait for space in a full queue.
+        Otherwise, the record is dropped.
+        :returns: Boolean True if the record was queued.
+        """
+
+        if self._thread is None:
+            self.start()
+        try:
+            self.queue.put((logger, record), block)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                logger, record = item
+                logger.handle(record)
+            except Exception:
+                # Handler errors are reported by the handlers themselves and
+                # must not end the thread.
+                pass
+            finally:
+                self.queue.task_done()
+
+
+    def flush(self):
+        if self._thread is not None:
+            self.queue.join()
+
+
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+
+
+_listener = None
+_listenerLock = threading.Lock()
+
+
+def logListener(queueSize = 10000):
+    """
+    Get the process-wide listener for asynchronous loggers, creating it on
+    first use.
+
+    The queue size of the first caller applies to the listener.
+
+    :param queueSize: Int maximum number of queued records.
+    :returns: SEKLogListener
+    """
+
+    global _listener
+    with _listenerLock:
+        if _listener is None:
+            _listener = SEKLogListener(queueSize)
+            atexit.register(_listener.stop)
+        return _listener
+
+
+# Configured loggers keyed by caller, level and color setting.
+_loggers = {}
+_loggersLock = threading.Lock()
+
+
+def sharedLogger(caller, level = INFO, useColor = True):
+    """
+    Get the configured logger for a caller, level and color setting, creating
+    it on first use.
+
+    The logger is not registered with the logging module so that its level
+    and handlers are independent of other loggers for the caller. Records
+    still propagate to the named logger for the caller and on to the root
+    logger.
+
+    :param caller: String name of the caller.
+    :param level: Int logging level.
+    :param useColor: Boolean if True, stderr output is colored.
+    :returns: logging.Logger with a stderr handler.
+    """
+
+    key = (caller, level, useColor)
+    try:
+        return _loggers[key]
+    except KeyError:
+        pass
+
+    with _loggersLock:
+        if key not in _loggers:
+            logger = logging.Logger(caller)
+            logger.parent = logging.getLogger(caller)
+
+            # Setting the level here is essential to get output from the
+            # logger.
+            logger.setLevel(level)
+
+            if not useColor:
+                formatterStdErr = logging.Formatter(TEXT_FORMAT)
+            else:
+                # Use colored output:
+                formatterStdErr = ColoredFormatter(
+                    u'%(log_color)s%(asctime)s - %(name)s - %(bold)s'
+                    u'%(levelname)s: %(reset)s%(message)s', reset = True,
+                    log_colors = {'DEBUG': 'green', 'INFO': 'blue',
+                                  'WARNING': 'yellow', 'ERROR': 'red',
+                                  'CRITICAL': 'red', })
+
+            streamHandlerStdErr = logging.StreamHandler(sys.stderr)
+            streamHandlerStdErr.setLevel(DEBUG)
+            streamHandlerStdErr.setFormatter(formatterStdErr)
+            logger.addHandler(streamHandlerStdErr)
+            _loggers[key] = logger
+        return _loggers[key]
+
+
 class SEKLogger(object):
     """
     This class provides logging functionality.
@@ -82,7 +738,9 @@ class SEKLogger(object):
     where the logger level is optional.
     """
 
-    def __init__(self, caller, level = INFO, useColor = True):
+    def __init__(self, caller, level = INFO, useColor = True,
+                 recordingSize = None, asynchronous = False,
+                 queueSize = 10000, blockOnFull = False):
         """
         Constructor.
 
@@ -90,72 +748,48 @@ class SEKLogger(object):
         :param level: String for logger level in ('info', 'error', 'warning',
         'silent', 'debug', 'critical')
         :param useColor: Boolean if True, color output is used via colorlog.
+        :param recordingSize: Int maximum number of recorded messages that
+        are kept. The oldest messages are dropped first. None is unbounded.
+        :param asynchronous: Boolean if True, messages are written by a
+        background thread.
+        :param queueSize: Int maximum number of queued messages for the
+        shared listener if it does not exist yet.
+        :param blockOnFull: Boolean if True, log waits when the queue is full.
+        Otherwise, the message is dropped and counted in
+        self.listener.dropped.
         """
 
-        self.logger = logging.getLogger(caller)
-
-        self.ioStream = StringIO()
-
-        self.streamHandlerStdErr = logging.StreamHandler(sys.stderr)
-        self.streamHandlerString = logging.StreamHandler(self.ioStream)
-        self.streamHandlerStdErr.setLevel(DEBUG)
-        self.streamHandlerString.setLevel(DEBUG)
-
-        formatterString = logging.Formatter(
-            u'%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-        if not useColor:
-            formatterStdErr = logging.Formatter(
-                u'%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        else:
-            # Use colored output:
-            formatterStdErr = ColoredFormatter(
-                u'%(log_color)s%(asctime)s - %(name)s - %(bold)s%(levelname)s: '
-                u'%(reset)s%(message)s', reset = True,
-                log_colors = {'DEBUG': 'green', 'INFO': 'blue',
-                              'WARNING': 'yellow', 'ERROR': 'red',
-                              'CRITICAL': 'red', })
-
-        self.streamHandlerStdErr.setFormatter(formatterStdErr)
-        self.streamHandlerString.setFormatter(formatterString)
-
-        self.loggerLevel = level
-
         # The log level that is set here provides the cut-off point for future
         # calls to log that are responsible for the actual log messages.
 
         # The log level here has a slightly different meaning than the log
         # level used in the call to self.logger.log().
 
-        if type(level) == type(''):
-            level = level.lower()
-
-            # Support string based types:
-            if level == 'info':
-                self.loggerLevel = INFO
-            elif level == 'warning':
-                self.loggerLevel = WARNING
-            elif level == 'error':
-                self.loggerLevel = ERROR
-            elif level == 'silent':
-                self.loggerLevel = SILENT
-            elif level == 'debug':
-                self.loggerLevel = DEBUG
-            elif level == 'critical':
-                self.loggerLevel = CRITICAL
-            else:
-                pass
+        self.loggerLevel = _levelNumber(level)
+        if self.loggerLevel is None:
+            self.loggerLevel = level
 
         # Messages equal to and above the logging level will be logged.
 
-        # Setting the level here is essential to get output from the logger.
-        self.logger.setLevel(self.loggerLevel)
+        # Instances with the same caller, level and color setting share a
+        # configured logger and its stderr handler.
+        self.logger = sharedLogger(caller, self.loggerLevel, useColor)
+        self.streamHandlerStdErr = self.logger.handlers[0]
 
-        self.recordingBuffer = []
-        self.recording = ''
-        self.shouldRecord = False
+        # Handlers of this instance only.
+        self.recordingSize = recordingSize
+        self._recordingHandler = None
+        self.sinks = []
+
+        self._shouldRecord = False
         self.logCounter = 0
 
+        self.listener = logListener(queueSize) if asynchronous else None
+        self.blockOnFull = blockOnFull
+
+        self.rateLimiter = None
+        self.rateLimitBy = 'template'
+
 
     def logAndWrite(self, message):
         """
@@ -173,10 +807,23 @@ class SEKLogger(object):
         return message
 
 
-    def log(self, message = '', level = INFO, color = None):
+    def log(self, message = '', level = INFO, *args, **kwargs):
         """
         Write a log message.
 
+        The message can be a template that is rendered with str.format only
+        if the message is output:
+
+            self.logger.log('Wrote {} rows to {}.', 'debug', count, table)
+
+        Structured fields are given as a dict:
+
+            self.logger.log('Loaded file.', 'info', fields = {'rows': count})
+
+        Arguments are rendered when the message is output. With asynchronous
+        logging, that happens later on another thread, so they should not be
+        modified after the call.
+
         Logging levels are
 
         * critical
@@ -186,56 +833,239 @@ class SEKLogger(object):
         * silent
         * warning
 
-        :param message: String for a message to be logged.
+        :param message: String for a message to be logged, or a template
+        when args or kwargs are given.
         :param level: String for an optional logging level.
+        :param args: Positional arguments for the template.
+        :param kwargs: Keyword arguments for the template. The keywords
+        fields and color are reserved.
+        :param fields: Dict of key-value pairs for the message.
         :param color: not supported yet.
         """
 
-        self.logger.addHandler(self.streamHandlerStdErr)
-        if self.shouldRecord:
-            self.logger.addHandler(self.streamHandlerString)
+        try:
+            loggerLevel = _LEVEL_LOOKUP[level]
+        except (KeyError, TypeError):
+            loggerLevel = _levelNumber(level)
+            if loggerLevel is None:
+                raise Exception("Invalid logger level {}.".format(level))
 
-        loggerLevel = level
+        self.logCounter += 1
 
-        if type(level) == type(''):
-            level = level.lower()
+        # Filtered messages return before a record is created.
+        if loggerLevel < self.logger.getEffectiveLevel() or \
+                self.logger.manager.disable >= loggerLevel:
+            return
 
-            if level == 'info':
-                loggerLevel = INFO
-            elif level == 'warning':
-                loggerLevel = WARNING
-            elif level == 'debug':
-                loggerLevel = DEBUG
-            elif level == 'error':
-                loggerLevel = ERROR
-            elif level == 'silent':
-                loggerLevel = SILENT
-            elif level == 'critical':
-                loggerLevel = CRITICAL
+        if self.rateLimiter is not None:
+            if self.rateLimitBy == 'callsite':
+                frame = sys._getframe(1)
+                key = (frame.f_code.co_filename, frame.f_lineno)
             else:
-                pass
+                key = (message, loggerLevel)
+            allowed, suppressed, evicted = self.rateLimiter.check(
+                key, loggerLevel, message)
+            if evicted:
+                self._reportSuppressed(*evicted)
+            if suppressed:
+                self._reportSuppressed(loggerLevel, message, suppressed)
+            if not allowed:
+                return
+
+        kwargs.pop('color', None)
+        fields = kwargs.pop('fields', None)
+
+        # Caller lookup is skipped since the formats do not use it.
+        self._dispatch(SEKLogRecord(self.logger.name, loggerLevel, message,
+                                    args, kwargs, fields))
+
+
+    def _dispatch(self, record):
+        if self.listener is None:
+            self.handle(record)
+        else:
+            self.listener.enqueue(self, record, self.blockOnFull)
+
+
+    def _reportSuppressed(self, level, template, suppressed):
+        self._dispatch(SEKLogRecord(self.logger.name, level,
+                                    u'Suppressed {} messages like: {}',
+                                    (suppressed, template)))
+
+
+    def setRateLimit(self, limit = 10, interval = 1.0, sampleEvery = None,
+                     by = 'template', maxKeys = 1000):
+        """
+        Limit repeated messages.
+
+        At most limit messages with the same key are output per interval.
+        The number of suppressed messages is only reported when one of the
+        following happens: a message with that key arrives in a later
+        interval, the key is evicted to make room for another, the limit is
+        changed, or reportSuppressed() is called. Call reportSuppressed()
+        before exiting to report counts that are still pending.
+
+        :param limit: Int number of messages per key and interval. None
+        turns rate limiting off.
+        :param interval: Float seconds of an interval.
+        :param sampleEvery: Int if given, every sampleEvery-th message beyond
+        the limit is output as a sample.
+        :param by: String 'template' to key messages by their unrendered
+        template and level, or 'callsite' to key them by the line calling
+        log.
+        :param maxKeys: Int maximum number of keys that are tracked.
+        """
+
+        if by not in ('template', 'callsite'):
+            raise Exception('Invalid rate limit key {}.'.format(by))
+        self.reportSuppressed()
+        self.rateLimitBy = by
+        if limit is None:
+            self.rateLimiter = None
+        else:
+            self.rateLimiter = SEKRateLimiter(limit, interval, sampleEvery,
+                                              maxKeys)
+
 
-        if loggerLevel != None:
-            self.logger.log(loggerLevel, message)
-
-            if self.shouldRecord:
-                # The recording buffer is a cumulative copy of the logging
-                # output. At each iteration, the buffer plus the new output is
-                # appended to the list.
-                self.recordingBuffer.append(
-                    '{}'.format((self.ioStream.getvalue())))
-                self.recording = self.recordingBuffer[-1]
-
-            for handler in self.logger.handlers:
-                # The flushes here apparently don't have any effect on the
-                # logger.
-                handler.flush()
-                self.ioStream.flush()
-                self.logger.removeHandler(handler)
-
-            self.logCounter += 1
+    def reportSuppressed(self):
+        """
+        Output the counts of suppressed messages that were not reported yet.
+        """
+
+        if self.rateLimiter is not None:
+            for level, template, suppressed in self.rateLimiter.pending():
+                self._reportSuppressed(level, template, suppressed)
+
+
+    def handle(self, record):
+        """
+        Pass a record to the shared logger and to the handlers of this
+        instance.
+
+        :param record: LogRecord.
+        """
+
+        self.logger.handle(record)
+        if self._shouldRecord:
+            self.recordingHandler.handle(record)
+        for handler in self.sinks:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+    def addJSONLinesSink(self, path = None, stream = None):
+        """
+        Also write messages of this logger as JSON lines.
+
+        :param path: String of a file that is appended to.
+        :param stream: File-like object used if no path is given.
+        :returns: The added Handler.
+        """
+
+        if path:
+            handler = logging.FileHandler(path)
+        elif stream is not None:
+            handler = logging.StreamHandler(stream)
         else:
-            raise Exception("Invalid logger level {}.".format(level))
+            raise Exception('JSON sink needs a path or a stream.')
+        handler.setLevel(DEBUG)
+        handler.setFormatter(SEKJSONFormatter())
+        self.sinks.append(handler)
+        return handler
+
+
+    def addRotatingFileSink(self, path, maxBytes = 0, interval = 0,
+                            backupCount = 7, maxAge = None, compress = True,
+                            jsonLines = False):
+        """
+        Also write messages of this logger to a rotating file.
+
+        :param path: String of the log file.
+        :param maxBytes: Int size at which the file is rotated.
+        :param interval: Float seconds after which the file is rotated.
+        :param backupCount: Int number of rotated files to keep.
+        :param maxAge: Float seconds after which rotated files are removed.
+        :param compress: Boolean if True, rotated files are gzip compressed
+        in the background.
+        :param jsonLines: Boolean if True, messages are written as JSON lines.
+        :returns: The added SEKRotatingFileHandler.
+        """
+
+        handler = SEKRotatingFileHandler(path, maxBytes, interval, backupCount,
+                                         maxAge, compress)
+        handler.setLevel(DEBUG)
+        handler.setFormatter(SEKJSONFormatter() if jsonLines else
+                             logging.Formatter(TEXT_FORMAT))
+        self.sinks.append(handler)
+        return handler
+
+
+    def flush(self):
+        """
+        Wait until queued messages have been written.
+        """
+
+        if self.listener is not None:
+            self.listener.flush()
+
+
+    @property
+    def recordingHandler(self):
+        """
+        :returns: SEKRecordingHandler holding the recorded records, created
+        on first use.
+        """
+
+        if self._recordingHandler is None:
+            self._recordingHandler = SEKRecordingHandler(self.recordingSize)
+            self._recordingHandler.setFormatter(
+                logging.Formatter(TEXT_FORMAT))
+        return self._recordingHandler
+
+
+    @property
+    def recording(self):
+        """
+        :returns: String of all recorded output, built when it is read.
+        """
+
+        self.flush()
+        return u''.join(u'{}\n'.format(message) for message in
+                        self.recordingHandler.messages())
+
+
+    def recordedMessages(self, count = None, level = None):
+        """
+        Get recorded messages.
+
+        :param count: Int number of most recent messages to return.
+        :param level: String or Int minimum level of the messages.
+        :returns: List of formatted message strings, oldest first.
+        """
+
+        self.flush()
+        return self.recordingHandler.messages(count, level)
+
+
+    def clearRecording(self):
+        """
+        Discard all recorded messages.
+        """
+
+        self.recordingHandler.records.clear()
+
+
+    @property
+    def shouldRecord(self):
+        return self._shouldRecord
+
+
+    @shouldRecord.setter
+    def shouldRecord(self, value):
+        # Queued messages are written first so that they are recorded only if
+        # they were logged while recording.
+        self.flush()
+        self._shouldRecord = bool(value)
 
 
     def startRecording(self):
@@ -258,8 +258,9 @@ class SEKNotifier(object):
 
         cursor = self.cursor
         sql = """INSERT INTO "{}" ("notificationType", "notificationTime")
-        VALUES ('{}', NOW())""".format(self.noticeTable, noticeType.name)
-        success = self.dbUtil.executeSQL(cursor, sql)
+        VALUES (%s, NOW())""".format(self.noticeTable)
+        success = self.dbUtil.executeSQL(cursor, sql,
+                                         params = (noticeType.name,))
         self.conn.commit()
         if not success:
             raise Exception('Exception while saving the notification time.')
@@ -282,10 +283,10 @@ class SEKNotifier(object):
         cursor = self.cursor
 
         sql = 'SELECT MAX("notificationTime") FROM "{}" WHERE ' \
-              '"notificationType" = \'{}\''.format(self.noticeTable,
-                                                   noticeType.name)
+              '"notificationType" = %s'.format(self.noticeTable)
 
-        success = self.dbUtil.executeSQL(cursor, sql)
+        success = self.dbUtil.executePrepared(cursor, sql,
+                                              params = (noticeType.name,))
         if success:
             rows = cursor.fetchall()
 
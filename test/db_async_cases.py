@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+"""
+Tests of sek.db_async. They use coroutine syntax that Python 2 cannot
+parse, so test_db_async imports them only on Python 3.7 or later.
+"""
+
+import asyncio
+import time
+import unittest
+import psycopg2.extras
+from sek.db_async import SEKAsyncDBConnector, SEKAsyncDBUtil, \
+    SEKAsyncDBConnectionPool
+from sek_test_db import TEST_DB, requiresTestDB
+
+TEST_TABLE = 'SEKAsyncDBUtilTest'
+
+
+@requiresTestDB
+class SEKAsyncDBUtilTester(unittest.TestCase):
+    def setUp(self):
+        self.connector = SEKAsyncDBConnector(usePool = True, **TEST_DB)
+        self.dbUtil = SEKAsyncDBUtil()
+
+    def runAsync(self, coroutine):
+        # Each test runs in its own event loop with a fresh table.
+        async def withTable():
+            async with self.connector.connection() as conn:
+                cursor = conn.cursor()
+                await self.dbUtil.executeSQL(
+                    cursor, 'DROP TABLE IF EXISTS "{}"'.format(TEST_TABLE))
+                await self.dbUtil.executeSQL(cursor, """CREATE TABLE "{}" (
+                    "id" SERIAL PRIMARY KEY,
+                    "meterName" VARCHAR,
+                    "kWh" FLOAT)""".format(TEST_TABLE))
+            try:
+                return await coroutine
+            finally:
+                async with self.connector.connection() as conn:
+                    await self.dbUtil.executeSQL(
+                        conn.cursor(),
+                        'DROP TABLE IF EXISTS "{}"'.format(TEST_TABLE))
+                self.connector.pool.closeAll()
+
+        return asyncio.run(withTable())
+
+    def testExecuteSQL(self):
+        async def test():
+            async with self.connector.connection() as conn:
+                cursor = conn.cursor()
+                self.assertTrue(await self.dbUtil.executeSQL(
+                    cursor, 'SELECT %s + 1', params = (1,)))
+                self.assertEqual(cursor.fetchone()[0], 2)
+                self.assertEqual((await self.dbUtil.getDBName(cursor))[0],
+                                 TEST_DB['dbName'])
+                self.assertEqual(
+                    await self.dbUtil.columnsString(cursor, TEST_TABLE),
+                    'id,meterName,kWh')
+
+        self.runAsync(test())
+
+    def testConcurrentQueries(self):
+        async def sleep(seconds):
+            async with self.connector.connection() as conn:
+                await self.dbUtil.executeSQL(conn.cursor(),
+                                             'SELECT pg_sleep(%s)',
+                                             params = (seconds,))
+
+        async def test():
+            start = time.time()
+            await asyncio.gather(*[sleep(0.3) for i in range(4)])
+            self.assertTrue(time.time() - start < 1.0)
+            self.assertEqual(self.connector.pool.stats()['size'], 4)
+
+        self.runAsync(test())
+
+    def testBulkLoadAndStreamRows(self):
+        async def test():
+            async with self.connector.connection() as conn:
+                cursor = conn.cursor()
+                stats = await self.dbUtil.bulkLoad(
+                    cursor, TEST_TABLE,
+                    ((i, 'meter{}'.format(i), float(i)) for i in
+                     range(1, 251)), chunkSize = 100)
+                self.assertEqual(stats['rows'], 250)
+                self.assertEqual(stats['chunks'], 3)
+
+                ids = [row[0] async for row in self.dbUtil.streamRows(
+                    cursor, 'SELECT "id" FROM "{}" WHERE "id" > %s ORDER BY '
+                            '"id"'.format(TEST_TABLE), params = (200,),
+                    itersize = 7)]
+                self.assertEqual(ids, list(range(201, 251)))
+
+                dictCursor = conn.cursor(
+                    cursor_factory = psycopg2.extras.DictCursor)
+                batches = [batch async for batch in self.dbUtil.streamRows(
+                    dictCursor, 'SELECT * FROM "{}" ORDER BY "id"'.format(
+                        TEST_TABLE), itersize = 30, batchSize = 100)]
+                self.assertEqual([len(batch) for batch in batches],
+                                 [100, 100, 50])
+                self.assertEqual(batches[0][0]['meterName'], 'meter1')
+                self.assertFalse(conn.inTransaction())
+
+        self.runAsync(test())
+
+    def testStreamRowsEarlyBreak(self):
+        async def test():
+            async with self.connector.connection() as conn:
+                cursor = conn.cursor()
+                await self.dbUtil.bulkLoad(cursor, TEST_TABLE,
+                                           [{'meterName': 'a'},
+                                            {'meterName': 'b'}],
+                                           columns = ['meterName'])
+                rows = self.dbUtil.streamRows(
+                    cursor, 'SELECT * FROM "{}"'.format(TEST_TABLE),
+                    itersize = 1)
+                async for row in rows:
+                    break
+                await rows.aclose()
+                self.assertFalse(conn.inTransaction())
+                await self.dbUtil.executeSQL(cursor,
+                                             'SELECT count(*) FROM pg_cursors')
+                self.assertEqual(cursor.fetchone()[0], 0)
+
+        self.runAsync(test())
+
+    def testExecuteBatch(self):
+        async def test():
+            async with self.connector.connection() as conn:
+                cursor = conn.cursor()
+                count = await self.dbUtil.executeBatch(
+                    cursor, 'INSERT INTO "{}" ("meterName", "kWh") VALUES '
+                            '%s'.format(TEST_TABLE),
+                    [('m{}'.format(i), 100.0 * i) for i in range(25)],
+                    pageSize = 10)
+                self.assertEqual(count, 25)
+                self.assertIsNone(await self.dbUtil.executeBatch(
+                    cursor, 'INSERT INTO "{}" ("kWh") VALUES %s'.format(
+                        TEST_TABLE), [('not a number',)], exitOnFail = False))
+
+        self.runAsync(test())
+
+    def testPoolCheckoutTimeout(self):
+        async def test():
+            pool = SEKAsyncDBConnectionPool(self.connector.dsn,
+                                            maxConnections = 1)
+            conn = await pool.checkout()
+            with self.assertRaises(Exception):
+                await pool.checkout(0.1)
+            await pool.checkin(conn)
+            self.assertIs(await pool.checkout(0.1), conn)
+            pool.closeAll()
+
+        self.runAsync(test())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+"""
+Settings of the testing database shared by the database tests.
+"""
+
+import os
+import unittest
+
+# The testing database is given by the environment, for example
+# SEK_TEST_DB_NAME=sek_test SEK_TEST_DB_HOST=localhost.
+TEST_DB = {'dbName': os.environ.get('SEK_TEST_DB_NAME', ''),
+           'dbHost': os.environ.get('SEK_TEST_DB_HOST', ''),
+           'dbPort': os.environ.get('SEK_TEST_DB_PORT', '5432'),
+           'dbUsername': os.environ.get('SEK_TEST_DB_USER', ''),
+           'dbPassword': os.environ.get('SEK_TEST_DB_PASSWORD', '')}
+TEST_DSN = "dbname='{dbName}' user='{dbUsername}' host='{dbHost}' " \
+           "port='{dbPort}' password='{dbPassword}'".format(**TEST_DB)
+
+# Decorator skipping test cases when no testing database is configured.
+requiresTestDB = unittest.skipUnless(TEST_DB['dbName'],
+                                     'Testing database is not configured.')
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from sek.checksum_manifest import SEKChecksumManifest
+
+
+class SEKChecksumManifestTester(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dbPath = os.path.join(self.dir, 'manifest.sqlite')
+        self.dataDir = os.path.join(self.dir, 'data')
+        os.makedirs(os.path.join(self.dataDir, 'sub'))
+        self.files = {}
+        for name in ['a.csv', 'b.csv', os.path.join('sub', 'c.csv')]:
+            self.writeFile(name, (name * 1000).encode('utf-8'))
+        self.manifest = SEKChecksumManifest(self.dbPath)
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.dir)
+
+    def writeFile(self, name, data):
+        path = os.path.join(self.dataDir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.files[path] = data
+        return path
+
+    def testChecksum(self):
+        path = os.path.join(self.dataDir, 'a.csv')
+        self.assertEqual(self.manifest.checksum(path),
+                         hashlib.md5(self.files[path]).hexdigest())
+        self.assertEqual(self.manifest.checksum(path, 'sha1'),
+                         hashlib.sha1(self.files[path]).hexdigest())
+
+    def testCachedUntilChanged(self):
+        path = os.path.join(self.dataDir, 'a.csv')
+        self.manifest.checksum(path)
+        self.manifest.checksum(path)
+        self.assertEqual((self.manifest.hits, self.manifest.misses), (1, 1))
+
+        self.writeFile('a.csv', b'changed')
+        self.assertEqual(self.manifest.checksum(path),
+                         hashlib.md5(b'changed').hexdigest())
+        self.assertEqual(self.manifest.misses, 2)
+
+    def testPersistence(self):
+        first = self.manifest.scanDirectory(self.dataDir)
+        self.manifest.close()
+        self.manifest = SEKChecksumManifest(self.dbPath)
+        self.assertEqual(self.manifest.scanDirectory(self.dataDir), first)
+        self.assertEqual((self.manifest.hits, self.manifest.misses), (3, 0))
+
+    def testScanDirectory(self):
+        self.manifest.workers = 3
+        digests = self.manifest.scanDirectory(self.dataDir,
+                                              algorithms = ('md5', 'sha256'))
+        self.assertEqual(sorted(digests), sorted(self.files))
+        for path, data in self.files.items():
+            self.assertEqual(digests[path],
+                             {'md5': hashlib.md5(data).hexdigest(),
+                              'sha256': hashlib.sha256(data).hexdigest()})
+        self.assertEqual(len(self.manifest.scanDirectory(
+            self.dataDir, recursive = False)), 2)
+
+    def testScanDirectoryReusesStatResults(self):
+        # The walk stats each file, so it is not stat'ed again.
+        calls = []
+        stat = os.stat
+
+        def countingStat(path, *args, **kwargs):
+            calls.append(path)
+            return stat(path, *args, **kwargs)
+
+        os.stat = countingStat
+        try:
+            self.manifest.scanDirectory(self.dataDir)
+        finally:
+            os.stat = stat
+        self.assertEqual([path for path in calls if path in self.files], [])
+
+    def testMissingFilesAndPrune(self):
+        paths = sorted(self.files)
+        self.manifest.checksums(paths)
+        os.remove(paths[0])
+        self.assertEqual(sorted(self.manifest.checksums(paths)), paths[1:])
+        self.assertEqual(self.manifest.prune(), 1)
+        self.assertEqual(self.manifest.prune(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
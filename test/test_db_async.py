@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import sys
+import unittest
+
+if sys.version_info >= (3, 7):
+    from db_async_cases import SEKAsyncDBUtilTester
+else:
+    @unittest.skip('sek.db_async needs Python 3.7 or later.')
+    class SEKAsyncDBUtilTester(unittest.TestCase):
+        def testAsyncDBUtil(self):
+            pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,13 +4,64 @@
 __author__ = 'Daniel Zhang (張道博)'
 __copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
 
+import time
 import unittest
+import psycopg2
+from sek.db_connector import SEKDBConnector, SEKDBConnectionOpener, \
+    SEKResilientConnection
+from sek_test_db import TEST_DB, requiresTestDB
 
 
 class DBConnectorTester(unittest.TestCase):
     def test_something(self):
         self.assertEqual(True, False)
 
+    def testResilientConnectRaisesAfterRetries(self):
+        start = time.time()
+        self.assertRaises(psycopg2.OperationalError, SEKDBConnector,
+                          dbName = 'none', dbHost = '127.0.0.1', dbPort = '1',
+                          resilient = True, connectRetries = 2,
+                          retryBackoff = 0.05)
+        # Two retries wait 0.05 s and 0.1 s.
+        self.assertTrue(time.time() - start >= 0.15)
+
+    def testBackoffIsBounded(self):
+        opener = SEKDBConnectionOpener('', None, None, retryBackoff = 0.5,
+                                       maxRetryBackoff = 3.0)
+        self.assertEqual([opener.backoff(i) for i in range(5)],
+                         [0.5, 1.0, 2.0, 3.0, 3.0])
+
+
+@requiresTestDB
+class SEKResilientConnectionTester(unittest.TestCase):
+    def testReconnectRebindsCursors(self):
+        connector = SEKDBConnector(resilient = True, **TEST_DB)
+        conn = connector.conn
+        self.assertTrue(isinstance(conn, SEKResilientConnection))
+        cursor = conn.cursor()
+        cursor.execute('SELECT pg_backend_pid()')
+        pid = cursor.fetchone()[0]
+
+        conn.reconnect()
+        cursor.execute('SELECT pg_backend_pid()')
+        self.assertNotEqual(cursor.fetchone()[0], pid)
+        connector.dictCur.execute('SELECT 1 AS one')
+        self.assertEqual(connector.dictCur.fetchone()['one'], 1)
+        self.assertEqual(connector.reconnects, 1)
+
+    def testPooledReconnect(self):
+        connector = SEKDBConnector(resilient = True, usePool = True,
+                                   **TEST_DB)
+        conn = connector.connectDB()
+        raw = conn.rawConnection
+        conn.reconnect()
+        self.assertTrue(raw.closed)
+        # Other connectors may share the pool, so compare against the count
+        # before the reconnected connection is returned.
+        inUse = connector.pool.stats()['inUse']
+        connector.closeDB(conn)
+        self.assertEqual(connector.pool.stats()['inUse'], inUse - 1)
+
 
 if __name__ == '__main__':
     RUN_SELECTED_TESTS = True
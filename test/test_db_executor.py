@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import time
+import unittest
+from sek.db_pool import SEKDBConnectionPool
+from sek.db_executor import SEKDBParallelExecutor
+from sek_test_db import TEST_DSN, requiresTestDB
+
+
+@requiresTestDB
+class SEKDBParallelExecutorTester(unittest.TestCase):
+    def setUp(self):
+        self.pool = SEKDBConnectionPool(TEST_DSN, minConnections = 0,
+                                        maxConnections = 4)
+        self.executor = SEKDBParallelExecutor(self.pool, workers = 4)
+
+    def tearDown(self):
+        self.executor.close()
+        self.pool.closeAll()
+
+    def testResultsInOrder(self):
+        results = self.executor.executeWithParams(
+            'SELECT %s * 2, pg_sleep(%s)',
+            [(i, 0.05 * (4 - i)) for i in range(4)])
+        self.assertEqual([result.rows[0][0] for result in results],
+                         [0, 2, 4, 6])
+        self.assertEqual([result.index for result in results], [0, 1, 2, 3])
+        self.assertTrue(all(result.seconds > 0 for result in results))
+
+    def testQueriesRunConcurrently(self):
+        start = time.time()
+        self.executor.execute(['SELECT pg_sleep(0.3)'] * 4)
+        self.assertTrue(time.time() - start < 0.9)
+        self.assertEqual(self.pool.stats()['created'], 4)
+
+    def testResultsAsCompleted(self):
+        results = list(self.executor.executeAsCompleted(
+            [('SELECT pg_sleep(%s)', (0.4,)), 'SELECT 1']))
+        self.assertEqual([result.index for result in results], [1, 0])
+
+    def testErrorIsolation(self):
+        results = self.executor.execute(['SELECT 1', 'SELECT * FROM missing',
+                                         ('SELECT %s', ('ok',))])
+        self.assertIsNone(results[0].error)
+        self.assertIsNotNone(results[1].error)
+        self.assertIsNone(results[1].rows)
+        self.assertEqual(results[2].rows, [('ok',)])
+        self.assertEqual(self.pool.stats()['inUse'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
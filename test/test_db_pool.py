@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import threading
+import time
+import unittest
+import psycopg2
+from sek.db_pool import SEKDBConnectionPool, sharedPool
+from sek.db_connector import SEKDBConnector
+from sek_test_db import TEST_DB, TEST_DSN, requiresTestDB
+
+
+@requiresTestDB
+class SEKDBConnectionPoolTester(unittest.TestCase):
+    def setUp(self):
+        self.pool = SEKDBConnectionPool(TEST_DSN, minConnections = 1,
+                                        maxConnections = 2)
+
+    def tearDown(self):
+        self.pool.closeAll()
+
+    def testCheckoutReusesConnections(self):
+        conn = self.pool.checkout()
+        self.pool.checkin(conn)
+        self.assertIs(self.pool.checkout(), conn)
+        self.assertEqual(self.pool.stats()['created'], 1)
+
+    def testConnectionContextManager(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            self.assertEqual(self.pool.stats()['inUse'], 1)
+        stats = self.pool.stats()
+        self.assertEqual(stats['inUse'], 0)
+        self.assertEqual(stats['idle'], 1)
+
+    def testCheckinRollsBackOpenTransaction(self):
+        conn = self.pool.checkout()
+        conn.cursor().execute('SELECT 1')
+        self.pool.checkin(conn)
+        self.assertEqual(conn.get_transaction_status(),
+                         psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def testCheckoutTimeout(self):
+        conns = [self.pool.checkout(), self.pool.checkout()]
+        self.assertRaises(Exception, self.pool.checkout, 0.1)
+        for conn in conns:
+            self.pool.checkin(conn)
+
+    def testWaitingThreadGetsCheckedInConnection(self):
+        conns = [self.pool.checkout(), self.pool.checkout()]
+        result = []
+
+        def worker():
+            result.append(self.pool.checkout(5))
+
+        thread = threading.Thread(target = worker)
+        thread.start()
+        time.sleep(0.1)
+        self.pool.checkin(conns[0])
+        thread.join()
+        self.assertIs(result[0], conns[0])
+        self.assertEqual(self.pool.stats()['waits'], 1)
+
+    def testClosedConnectionIsReplaced(self):
+        conn = self.pool.checkout()
+        conn.close()
+        self.pool.checkin(conn)
+        other = self.pool.checkout()
+        self.assertIsNot(other, conn)
+        self.assertFalse(other.closed)
+
+    def testIdleEviction(self):
+        self.pool.maxIdleTime = 0.0
+        conns = [self.pool.checkout(), self.pool.checkout()]
+        for conn in conns:
+            self.pool.checkin(conn)
+        time.sleep(0.01)
+        self.assertEqual(self.pool.evictIdle(), 1)
+        self.assertEqual(self.pool.stats()['size'], 1)
+        self.assertTrue(conns[0].closed)
+
+    def testHealthCheckOnCheckout(self):
+        self.pool.healthCheckInterval = 0
+        conn = self.pool.checkout()
+        self.pool.checkin(conn)
+        with self.pool.connection() as conn:
+            self.assertFalse(conn.closed)
+
+
+@requiresTestDB
+class SEKDBConnectorPoolingTester(unittest.TestCase):
+    def testConnectorsShareThePool(self):
+        first = SEKDBConnector(usePool = True, **TEST_DB)
+        second = SEKDBConnector(usePool = True, **TEST_DB)
+        self.assertIs(first.pool, second.pool)
+        self.assertIs(first.pool, sharedPool(first.dsn))
+
+        conn = second.connectDB()
+        second.closeDB(conn)
+        self.assertIs(second.connectDB(), conn)
+
+    def testConnectionContextManager(self):
+        connector = SEKDBConnector(usePool = True, **TEST_DB)
+        with connector.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT current_database()')
+            self.assertEqual(cursor.fetchone()[0], TEST_DB['dbName'])
+
+    def testClosedConnectionIsNotCheckedInTwice(self):
+        connector = SEKDBConnector(usePool = True, **TEST_DB)
+        pool = connector.pool
+        connector.closeDB(connector.conn)
+        checkins = pool.stats()['checkins']
+        connector.__del__()
+        self.assertEqual(pool.stats()['checkins'], checkins)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import time
+import unittest
+import psycopg2
+import psycopg2.extras
+from sek.db_connector import SEKDBConnector
+from sek.db_pool import SEKDBConnectionPool
+from sek.db_util import SEKDBUtil
+from sek_test_db import TEST_DB, requiresTestDB
+
+TEST_TABLE = 'SEKDBUtilTest'
+
+
+@requiresTestDB
+class SEKDBUtilTester(unittest.TestCase):
+    def setUp(self):
+        self.connector = SEKDBConnector(**TEST_DB)
+        self.conn = self.connector.conn
+        self.cursor = self.conn.cursor()
+        self.dbUtil = SEKDBUtil()
+        self.dbUtil.executeSQL(self.cursor,
+                               'DROP TABLE IF EXISTS "{}"'.format(TEST_TABLE))
+        self.dbUtil.executeSQL(self.cursor, """CREATE TABLE "{}" (
+            "id" SERIAL PRIMARY KEY,
+            "meterName" VARCHAR,
+            "kWh" FLOAT)""".format(TEST_TABLE))
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.dbUtil.executeSQL(self.cursor,
+                               'DROP TABLE IF EXISTS "{}"'.format(TEST_TABLE))
+        self.conn.commit()
+
+    def rows(self):
+        self.dbUtil.executeSQL(self.cursor,
+                               'SELECT "id", "meterName", "kWh" FROM "{}" '
+                               'ORDER BY "id"'.format(TEST_TABLE))
+        return self.cursor.fetchall()
+
+    def testColumnsAreInTableOrder(self):
+        self.assertEqual(self.dbUtil.columns(self.cursor, TEST_TABLE),
+                         ['id', 'meterName', 'kWh'])
+
+    def testBulkLoadTuples(self):
+        stats = self.dbUtil.bulkLoad(self.cursor, TEST_TABLE,
+                                     ((i, 'meter{}'.format(i), i * 0.5) for i
+                                      in range(1, 251)), chunkSize = 100)
+        self.conn.commit()
+        self.assertEqual(stats['rows'], 250)
+        self.assertEqual(stats['chunks'], 3)
+        self.assertTrue(stats['rowsPerSecond'] > 0)
+        rows = self.rows()
+        self.assertEqual(len(rows), 250)
+        self.assertEqual(tuple(rows[-1]), (250, 'meter250', 125.0))
+
+    def testBulkLoadDictsWithSpecialValues(self):
+        self.dbUtil.bulkLoad(self.cursor, TEST_TABLE,
+                             [{'meterName': 'tab\there\\', 'kWh': None},
+                              {'meterName': u'line\nbreak é',
+                               'kWh': 1.5},
+                              {'meterName': '', 'kWh': 2}],
+                             columns = ['meterName', 'kWh'])
+        rows = self.rows()
+        self.assertEqual(rows[0][1:], ('tab\there\\', None))
+        self.assertEqual(rows[1][1:], (u'line\nbreak é'.encode('utf-8')
+                                       if str is bytes else
+                                       u'line\nbreak é', 1.5))
+        self.assertEqual(rows[2][1:], ('', 2.0))
+
+    def testBulkLoadKeepsPrecisionAndBytes(self):
+        self.dbUtil.executeSQL(self.cursor, 'ALTER TABLE "{}" ADD COLUMN '
+                                            '"raw" BYTEA'.format(TEST_TABLE))
+        values = [1234567.891234567, 0.1 + 0.2, -1e-300]
+        raw = bytearray(b'\x00\\\xff')
+        self.dbUtil.bulkLoad(self.cursor, TEST_TABLE,
+                             [(i + 1, b'meter', value, raw) for i, value in
+                              enumerate(values)])
+        self.dbUtil.executeSQL(self.cursor, 'SELECT "meterName", "kWh", '
+                                            '"raw" FROM "{}" ORDER BY '
+                                            '"id"'.format(TEST_TABLE))
+        rows = self.cursor.fetchall()
+        self.assertEqual([row[1] for row in rows], values)
+        self.assertEqual(rows[0][0], 'meter')
+        self.assertEqual(bytearray(rows[0][2]), raw)
+
+    def testBulkLoadCommitEachChunk(self):
+        self.dbUtil.bulkLoad(self.cursor, TEST_TABLE,
+                             [(1, 'a', 1.0), (2, 'b', 2.0)], chunkSize = 1,
+                             commitEachChunk = True)
+        self.conn.rollback()
+        self.assertEqual(len(self.rows()), 2)
+
+    def testBulkLoadFailure(self):
+        stats = self.dbUtil.bulkLoad(self.cursor, TEST_TABLE,
+                                     [(1, 'a', 'not a number')],
+                                     exitOnFail = False)
+        self.assertIsNone(stats)
+
+    def testExecuteSQLWithParams(self):
+        self.assertTrue(self.dbUtil.executeSQL(
+            self.cursor, 'INSERT INTO "{}" ("meterName", "kWh") VALUES (%s, '
+                         '%s)'.format(TEST_TABLE), params = ("O'Neil", 1.0)))
+        self.assertEqual(self.rows()[0][1], "O'Neil")
+
+    def testExecuteBatch(self):
+        count = self.dbUtil.executeBatch(
+            self.cursor, 'INSERT INTO "{}" ("meterName", "kWh") VALUES '
+                         '%s'.format(TEST_TABLE),
+            (('meter{}'.format(i), float(i)) for i in range(25)),
+            pageSize = 10)
+        self.assertEqual(count, 25)
+        self.assertEqual(len(self.rows()), 25)
+
+        count = self.dbUtil.executeBatch(
+            self.cursor, 'UPDATE "{0}" SET "kWh" = v."kWh" FROM (VALUES %s) '
+                         'AS v("meterName", "kWh") WHERE "{0}"."meterName" '
+                         '= v."meterName"'.format(TEST_TABLE),
+            [('meter1', 10.0), ('meter2', 20.0), ('missing', 0.0)],
+            pageSize = 2)
+        self.assertEqual(count, 2)
+        self.assertEqual(self.rows()[2][2], 20.0)
+
+    def testExecuteBatchWithTemplate(self):
+        count = self.dbUtil.executeBatch(
+            self.cursor, 'INSERT INTO "{}" ("meterName", "kWh") VALUES '
+                         '%s'.format(TEST_TABLE), [('a',), ('b',)],
+            template = '(%s, 0.5)')
+        self.assertEqual(count, 2)
+        self.assertEqual(self.rows()[1][1:], ('b', 0.5))
+
+    def testExecuteBatchFailure(self):
+        self.assertIsNone(self.dbUtil.executeBatch(
+            self.cursor, 'INSERT INTO "{}" ("kWh") VALUES %s'.format(
+                TEST_TABLE), [('not a number',)], exitOnFail = False))
+
+    def loadRows(self, n):
+        self.dbUtil.bulkLoad(self.cursor, TEST_TABLE,
+                             ((i, 'meter{}'.format(i), float(i)) for i in
+                              range(1, n + 1)))
+
+    def testStreamRows(self):
+        self.loadRows(100)
+        rows = self.dbUtil.streamRows(self.cursor,
+                                      'SELECT "id" FROM "{}" WHERE "id" > %s '
+                                      'ORDER BY "id"'.format(TEST_TABLE),
+                                      params = (50,), itersize = 7)
+        self.assertEqual([row[0] for row in rows], list(range(51, 101)))
+
+    def testStreamRowBatches(self):
+        self.loadRows(25)
+        batches = list(self.dbUtil.streamRows(
+            self.cursor, 'SELECT * FROM "{}"'.format(TEST_TABLE),
+            batchSize = 10))
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+
+    def testStreamRowsWithDictCursor(self):
+        self.loadRows(3)
+        cursor = self.conn.cursor(cursor_factory = psycopg2.extras.DictCursor)
+        rows = list(self.dbUtil.streamRows(
+            cursor, 'SELECT * FROM "{}" ORDER BY "id"'.format(TEST_TABLE)))
+        self.assertEqual(rows[2]['meterName'], 'meter3')
+
+    def testStreamRowsEarlyBreakClosesCursor(self):
+        self.loadRows(10)
+        rows = self.dbUtil.streamRows(self.cursor,
+                                      'SELECT * FROM "{}"'.format(TEST_TABLE),
+                                      itersize = 2)
+        next(rows)
+        rows.close()
+        self.dbUtil.executeSQL(self.cursor, 'SELECT count(*) FROM pg_cursors')
+        self.assertEqual(self.cursor.fetchone()[0], 0)
+
+    def testStreamRowsFailure(self):
+        rows = self.dbUtil.streamRows(self.cursor, 'SELECT * FROM "missing"',
+                                      exitOnFail = False)
+        self.assertRaises(Exception, list, rows)
+
+    def testStreamRowsInAutocommitMode(self):
+        self.loadRows(5)
+        self.conn.commit()
+        self.conn.autocommit = True
+        try:
+            rows = list(self.dbUtil.streamRows(
+                self.cursor, 'SELECT * FROM "{}"'.format(TEST_TABLE)))
+        finally:
+            self.conn.autocommit = False
+        self.assertEqual(len(rows), 5)
+
+    def testTableSchema(self):
+        cols = self.dbUtil.tableSchema(self.cursor, TEST_TABLE, 'public')
+        self.assertEqual([(col.name, col.type, col.position) for col in cols],
+                         [('id', 'integer', 1),
+                          ('meterName', 'character varying', 2),
+                          ('kWh', 'double precision', 3)])
+
+    def testSchemaCache(self):
+        self.assertEqual(len(self.dbUtil.columns(self.cursor, TEST_TABLE)), 3)
+        self.dbUtil.executeSQL(self.cursor, 'ALTER TABLE "{}" ADD COLUMN '
+                                            '"note" VARCHAR'.format(TEST_TABLE))
+        self.assertEqual(len(self.dbUtil.columns(self.cursor, TEST_TABLE)), 3)
+
+        self.dbUtil.invalidateSchemaCache(self.cursor, TEST_TABLE)
+        self.assertEqual(self.dbUtil.columnsString(self.cursor, TEST_TABLE),
+                         'id,meterName,kWh,note')
+
+    def testSchemaCacheIsSharedBetweenInstances(self):
+        self.dbUtil.columns(self.cursor, TEST_TABLE)
+        self.dbUtil.executeSQL(self.cursor, 'ALTER TABLE "{}" ADD COLUMN '
+                                            '"note" VARCHAR'.format(TEST_TABLE))
+        self.assertEqual(len(SEKDBUtil().columns(self.cursor, TEST_TABLE)), 3)
+
+    def testTableSchemaUsesSearchPath(self):
+        self.dbUtil.executeSQL(self.cursor, 'CREATE SCHEMA "sek_other"')
+        self.dbUtil.executeSQL(self.cursor, 'CREATE TABLE "sek_other"."{}" '
+                                            '("other" INT)'.format(TEST_TABLE))
+        self.assertEqual(self.dbUtil.columns(self.cursor, TEST_TABLE),
+                         ['id', 'meterName', 'kWh'])
+        self.assertEqual([col.name for col in self.dbUtil.tableSchema(
+            self.cursor, TEST_TABLE, 'sek_other')], ['other'])
+
+    def testSchemaCacheExpires(self):
+        self.dbUtil.schemaCacheTTL = 0.01
+        self.dbUtil.columns(self.cursor, TEST_TABLE)
+        self.dbUtil.executeSQL(self.cursor, 'ALTER TABLE "{}" ADD COLUMN '
+                                            '"note" VARCHAR'.format(TEST_TABLE))
+        time.sleep(0.02)
+        self.assertEqual(len(self.dbUtil.columns(self.cursor, TEST_TABLE)), 4)
+
+    def testInsertReturning(self):
+        first = self.dbUtil.insertReturning(self.cursor, TEST_TABLE,
+                                            {'meterName': 'a', 'kWh': 1.0})
+        second = self.dbUtil.insertReturning(self.cursor, TEST_TABLE,
+                                             ('b', 2.0),
+                                             columns = ['meterName', 'kWh'],
+                                             returning = ['id', 'meterName'])
+        self.assertEqual(first, 1)
+        self.assertEqual(second, (2, 'b'))
+        self.assertEqual(self.dbUtil.getLastSequenceID(self.conn, TEST_TABLE,
+                                                       'id'), 2)
+
+    def testInsertManyReturning(self):
+        ids = self.dbUtil.insertManyReturning(
+            self.cursor, TEST_TABLE,
+            (('meter{}'.format(i), float(i)) for i in range(25)),
+            columns = ['meterName', 'kWh'], pageSize = 10)
+        self.assertEqual(ids, list(range(1, 26)))
+        self.assertEqual(self.rows()[24][1], 'meter24')
+
+    def testInsertReturningFailure(self):
+        self.assertIsNone(self.dbUtil.insertReturning(
+            self.cursor, TEST_TABLE, {'kWh': 'not a number'},
+            exitOnFail = False))
+
+    def preparedStatementNames(self):
+        self.dbUtil.executeSQL(self.cursor, 'SELECT name FROM '
+                                            'pg_prepared_statements ORDER BY '
+                                            'name')
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def testExecutePrepared(self):
+        self.loadRows(5)
+        sql = 'SELECT MAX("kWh") FROM "{}" WHERE "id" < %s AND ' \
+              '"meterName" LIKE \'meter%%\''.format(TEST_TABLE)
+        for limit, expected in ((3, 2.0), (5, 4.0)):
+            self.assertTrue(self.dbUtil.executePrepared(self.cursor, sql,
+                                                        params = (limit,)))
+            self.assertEqual(self.cursor.fetchone()[0], expected)
+        self.assertEqual(len(self.preparedStatementNames()), 1)
+        self.assertEqual(self.dbUtil.getDBName(self.cursor)[0],
+                         TEST_DB['dbName'])
+        self.assertEqual(len(self.preparedStatementNames()), 2)
+
+    def testPreparedStatementsAreBounded(self):
+        self.dbUtil.maxPreparedStatements = 2
+        for i in range(4):
+            self.dbUtil.executePrepared(self.cursor,
+                                        'SELECT {} + %s'.format(i), (1,))
+            self.assertEqual(self.cursor.fetchone()[0], i + 1)
+        self.assertEqual(len(self.preparedStatementNames()), 2)
+
+    def testPreparedStatementsAreSharedBetweenInstances(self):
+        pool = SEKDBConnectionPool(self.connector.dsn, minConnections = 0,
+                                   maxConnections = 1)
+        try:
+            for i in range(3):
+                dbUtil = SEKDBUtil(maxPreparedStatements = 2)
+                with pool.connection() as conn:
+                    cursor = conn.cursor()
+                    for j in range(3):
+                        dbUtil.executePrepared(cursor, 'SELECT {} + %s'.format(
+                            i + j), (1,))
+                    dbUtil.executeSQL(cursor, 'SELECT count(*) FROM '
+                                              'pg_prepared_statements')
+                    self.assertTrue(cursor.fetchone()[0] <= 2)
+            self.assertEqual(pool.stats()['created'], 1)
+        finally:
+            pool.closeAll()
+
+    def testNumberedPlaceholdersSkipQuotedSQL(self):
+        self.assertEqual(self.dbUtil._numberedPlaceholders(
+            'SELECT %s, \'%s it''s %%\', "a%s", E\'\\\'%s\', $$%s$$, %s '
+            '-- %s\n%%s'),
+            'SELECT $1, \'%s it''s %\', "a%s", E\'\\\'%s\', $$%s$$, $2 '
+            '-- %s\n%s')
+        self.loadRows(2)
+        self.assertTrue(self.dbUtil.executePrepared(
+            self.cursor, 'SELECT count(*) FROM "{}" WHERE "meterName" <> '
+                         '\'%s\' AND "id" <= %s'.format(TEST_TABLE), (1,)))
+        self.assertEqual(self.cursor.fetchone()[0], 1)
+
+    def testPreparedStatementsAfterReconnect(self):
+        sql = 'SELECT %s::int * 2'
+        self.dbUtil.executePrepared(self.cursor, sql, (2,))
+        self.conn.reset()
+        self.assertTrue(self.dbUtil.executePrepared(self.cursor, sql, (3,)))
+        self.assertEqual(self.cursor.fetchone()[0], 6)
+
+        otherConnector = SEKDBConnector(**TEST_DB)
+        other = otherConnector.conn.cursor()
+        self.assertTrue(self.dbUtil.executePrepared(other, sql, (4,)))
+        self.assertEqual(other.fetchone()[0], 8)
+
+        self.dbUtil.executeSQL(other, 'DEALLOCATE ALL')
+        self.dbUtil.invalidatePreparedStatements(other)
+        self.assertTrue(self.dbUtil.executePrepared(other, sql, (5,)))
+
+    def terminateBackend(self, cursor):
+        cursor.execute('SELECT pg_backend_pid()')
+        pid = cursor.fetchone()[0]
+        cursor.connection.rollback()
+        self.dbUtil.executeSQL(self.cursor, 'SELECT pg_terminate_backend(%s)',
+                               params = (pid,))
+        self.conn.commit()
+
+    def testExecuteSQLReconnects(self):
+        connector = SEKDBConnector(resilient = True, **TEST_DB)
+        cursor = connector.conn.cursor()
+        self.terminateBackend(cursor)
+        dbUtil = SEKDBUtil(retries = 2, retryBackoff = 0.01)
+
+        self.assertTrue(dbUtil.executeSQL(cursor, 'SELECT 1'))
+        self.assertEqual(cursor.fetchone()[0], 1)
+        stats = dbUtil.stats()
+        self.assertEqual(stats['failures'], 1)
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['reconnects'], 1)
+        self.assertEqual(stats['executions'], 2)
+        self.assertTrue(stats['averageSeconds'] > 0)
+
+    def testExecuteSQLDoesNotRetryWrites(self):
+        connector = SEKDBConnector(resilient = True, **TEST_DB)
+        cursor = connector.conn.cursor()
+        self.terminateBackend(cursor)
+        dbUtil = SEKDBUtil(retries = 2, retryBackoff = 0.01)
+
+        sql = 'INSERT INTO "{}" ("meterName") VALUES (%s)'.format(TEST_TABLE)
+        self.assertRaises(psycopg2.OperationalError, dbUtil.executeSQL,
+                          cursor, sql, params = ('a',))
+        self.assertTrue(dbUtil.executeSQL(cursor, sql, params = ('b',)))
+        connector.conn.commit()
+        self.assertEqual([row[1] for row in self.rows()], ['b'])
+
+    def testExecuteSQLRetriesIdempotentWrites(self):
+        connector = SEKDBConnector(resilient = True, **TEST_DB)
+        cursor = connector.conn.cursor()
+        self.terminateBackend(cursor)
+        dbUtil = SEKDBUtil(retries = 1, retryBackoff = 0.01)
+        self.assertTrue(dbUtil.executeSQL(
+            cursor, 'DELETE FROM "{}"'.format(TEST_TABLE), idempotent = True))
+        connector.conn.rollback()
+
+
+if __name__ == '__main__':
+    unittest.main()
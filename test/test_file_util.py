@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import gzip
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from sek.file_util import SEKFileUtil, SEKFileChunk
+
+
+class SEKFileUtilTester(unittest.TestCase):
+    def setUp(self):
+        self.fileUtil = SEKFileUtil()
+        self.tempDir = tempfile.mkdtemp()
+        self.lines = [u'meter{},{:.1f}\n'.format(i, i * 0.5).encode('utf-8')
+                      for i in range(20000)]
+        self.data = b''.join(self.lines)
+        self.gzPath = os.path.join(self.tempDir, 'readings.csv.gz')
+        gzipFile = gzip.open(self.gzPath, 'wb')
+        gzipFile.write(self.data)
+        gzipFile.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testGzipUncompressFileStreams(self):
+        destPath = os.path.join(self.tempDir, 'readings.csv')
+        calls = []
+        self.assertTrue(self.fileUtil.gzipUncompressFile(
+            self.gzPath, destPath, chunkSize = 4096,
+            progress = lambda *args: calls.append(args)))
+
+        with open(destPath, 'rb') as uncompressed:
+            self.assertEqual(uncompressed.read(), self.data)
+        self.assertEqual(len(calls), -(-len(self.data) // 4096))
+        self.assertEqual(calls[-1][0], len(self.data))
+        self.assertEqual(calls[-1][2], os.path.getsize(self.gzPath))
+        self.assertTrue(all(a[1] <= b[1] for a, b in zip(calls, calls[1:])))
+
+    def testGzipUncompressCorruptFile(self):
+        with open(self.gzPath, 'r+b') as compressed:
+            compressed.truncate(os.path.getsize(self.gzPath) // 2)
+        self.assertFalse(self.fileUtil.gzipUncompressFile(
+            self.gzPath, os.path.join(self.tempDir, 'readings.csv')))
+
+    def testGzipChunks(self):
+        chunks = list(self.fileUtil.gzipChunks(self.gzPath, chunkSize = 1000))
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+        self.assertEqual(b''.join(chunks), self.data)
+
+    def testGzipRecordChunks(self):
+        chunks = list(self.fileUtil.gzipRecordChunks(self.gzPath,
+                                                     chunkSize = 1000))
+        self.assertEqual(b''.join(chunks), self.data)
+        self.assertTrue(all(chunk.endswith(b'\n') for chunk in chunks))
+
+    def testGzipLines(self):
+        self.assertEqual(list(self.fileUtil.gzipLines(self.gzPath)),
+                         self.lines)
+        lines = self.fileUtil.gzipLines(self.gzPath, encoding = 'utf-8')
+        self.assertEqual(next(lines), u'meter0,0.0\n')
+
+    def writeFile(self, name, data):
+        path = os.path.join(self.tempDir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def readGzip(self, path):
+        gzipFile = gzip.open(path, 'rb')
+        data = gzipFile.read()
+        gzipFile.close()
+        return data
+
+    def testParallelGzipCompressFile(self):
+        path = self.writeFile('readings.csv', self.data)
+        self.assertTrue(self.fileUtil.gzipCompressFile(
+            path, compressLevel = 6, workers = 4, blockSize = 10000))
+        self.assertEqual(self.readGzip(path + '.gz'), self.data)
+
+        # Each block is a gzip member with its own header.
+        with open(path + '.gz', 'rb') as compressed:
+            members = compressed.read().count(b'\x1f\x8b\x08')
+        self.assertTrue(members >= -(-len(self.data) // 10000))
+
+    def testGzipCompressFileLevelsAndEmptyFile(self):
+        path = self.writeFile('readings.csv', self.data)
+        self.assertTrue(self.fileUtil.gzipCompressFile(path, compressLevel = 1))
+        fastSize = os.path.getsize(path + '.gz')
+        self.assertTrue(self.fileUtil.gzipCompressFile(path, compressLevel = 9))
+        self.assertTrue(os.path.getsize(path + '.gz') < fastSize)
+        self.assertEqual(self.readGzip(path + '.gz'), self.data)
+
+        empty = self.writeFile('empty', b'')
+        self.assertTrue(self.fileUtil.gzipCompressFile(empty, workers = 2))
+        self.assertEqual(self.readGzip(empty + '.gz'), b'')
+
+    def testGzipCompressFiles(self):
+        paths = [self.writeFile('file{}'.format(i), os.urandom(1000) * i) for
+                 i in range(5)]
+        paths.append(os.path.join(self.tempDir, 'missing'))
+        results = self.fileUtil.gzipCompressFiles(paths, workers = 3)
+        self.assertFalse(results.pop(paths[-1]))
+        self.assertTrue(all(results.values()))
+        for i, path in enumerate(paths[:-1]):
+            with open(path, 'rb') as f:
+                self.assertEqual(self.readGzip(path + '.gz'), f.read())
+
+    def testChecksums(self):
+        path = self.writeFile('readings.csv', self.data)
+        expected = dict((name, hashlib.new(name, self.data).hexdigest()) for
+                        name in ('md5', 'sha1', 'sha256'))
+        self.assertEqual(self.fileUtil.md5Checksum(path), expected['md5'])
+        for useMmap in (False, True):
+            self.assertEqual(
+                self.fileUtil.checksums(path, ('md5', 'sha1', 'sha256'),
+                                        bufferSize = 4096, useMmap = useMmap),
+                expected)
+
+        empty = self.writeFile('empty', b'')
+        self.assertEqual(self.fileUtil.checksums(empty, useMmap = True)['md5'],
+                         hashlib.md5(b'').hexdigest())
+        self.assertRaises(Exception, self.fileUtil.checksums, path,
+                          ('nonexistent',))
+        self.assertIsNone(self.fileUtil.md5Checksum(
+            os.path.join(self.tempDir, 'missing')))
+
+    def testSplitLargeFileOnRecords(self):
+        path = self.writeFile('readings.csv', self.data)
+        chunks = self.fileUtil.splitLargeFile(path, numChunks = 7,
+                                              alignToRecords = True)
+        self.assertEqual(len(chunks), 7)
+        contents = []
+        for chunk in chunks:
+            with open(chunk, 'rb') as f:
+                contents.append(f.read())
+        self.assertEqual(b''.join(contents), self.data)
+        self.assertTrue(all(c.endswith(b'\n') for c in contents))
+        sizes = [len(c) for c in contents]
+        self.assertTrue(max(sizes) - min(sizes) < 2 * max(map(len, self.lines)))
+
+    def testSplitLargeFileByBytes(self):
+        path = self.writeFile('readings.csv', self.data)
+        chunks = self.fileUtil.splitLargeFile(path, numChunks = 3)
+        self.assertEqual(len(chunks), 3)
+        data = b''
+        for chunk in chunks:
+            with open(chunk, 'rb') as f:
+                data += f.read()
+        self.assertEqual(data, self.data)
+        self.assertEqual(self.fileUtil.splitLargeFile(path, numChunks = 1),
+                         [path])
+
+    def testSplitLargeFileAfterShortKernelCopies(self):
+        path = self.writeFile('readings.csv', self.data)
+        calls = []
+
+        def fakeCopyFileRange(src, dst, count, offset):
+            # Copy a few bytes at first, then report nothing, as some file
+            # systems do.
+            calls.append(count)
+            if len(calls) > 2 or not hasattr(os, 'pread'):
+                return 0
+            return os.write(dst, os.pread(src, min(count, 7), offset))
+
+        def fakeSendfile(dst, src, offset, count):
+            calls.append(count)
+            return 0
+
+        for name, fake in (('copy_file_range', fakeCopyFileRange),
+                           ('sendfile', fakeSendfile)):
+            original = getattr(os, name, None)
+            setattr(os, name, fake)
+            if original is None:
+                self.addCleanup(delattr, os, name)
+            else:
+                self.addCleanup(setattr, os, name, original)
+
+        chunks = self.fileUtil.splitLargeFile(path, numChunks = 3)
+        data = b''
+        for chunk in chunks:
+            with open(chunk, 'rb') as f:
+                data += f.read()
+        self.assertEqual(data, self.data)
+        self.assertTrue(calls)
+
+    def testRecordBoundaries(self):
+        path = self.writeFile('records', b'aaaa\nbbbb\n')
+        self.assertEqual(self.fileUtil.recordBoundaries(path, 2), [0, 5, 10])
+
+        # A long record leaves empty chunks.
+        path = self.writeFile('records', b'aa;;bbbbbbbbbbbb;;c;;dd')
+        self.assertEqual(self.fileUtil.recordBoundaries(
+            path, 4, delimiter = b';;', scanSize = 3), [0, 18, 18, 18, 23])
+        self.assertEqual(self.fileUtil.recordBoundaries(path, 2,
+                                                        delimiter = b'x'),
+                         [0, 23, 23])
+
+    def testFileChunks(self):
+        path = self.writeFile('readings.csv', self.data)
+        chunks = self.fileUtil.fileChunks(path, numChunks = 5)
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(chunks[0].start, 0)
+        self.assertEqual(chunks[-1].end, len(self.data))
+        self.assertEqual(sum(chunk.size for chunk in chunks), len(self.data))
+        self.assertEqual(pickle.loads(pickle.dumps(chunks[1])), chunks[1])
+
+        lines = []
+        for chunk in chunks:
+            reader = chunk.open()
+            lines.extend(reader)
+            reader.close()
+        self.assertEqual(lines, self.lines)
+
+        bySize = self.fileUtil.fileChunks(path, chunkSize = 50000)
+        self.assertEqual(len(bySize), -(-len(self.data) // 50000))
+        self.assertEqual(len(self.fileUtil.fileChunks(path, 3,
+                                                      delimiter = None)), 3)
+
+    def testFileChunkReaders(self):
+        path = self.writeFile('readings.csv', self.data)
+        chunk = SEKFileChunk(path, 10000, 20000)
+        reader = chunk.open(bufferSize = 512)
+        self.assertEqual(reader.read(), self.data[10000:20000])
+        reader.seek(100)
+        self.assertEqual(reader.read(10), self.data[10100:10110])
+        reader.close()
+
+        text = chunk.open(encoding = 'utf-8')
+        self.assertEqual(text.read(5), self.data[10000:10005].decode('utf-8'))
+        text.close()
+
+        with chunk.mapped() as data:
+            self.assertEqual(len(data), 10000)
+            self.assertEqual(bytes(data[:100]), self.data[10000:10100])
+        with SEKFileChunk(path, 5, 5).mapped() as data:
+            self.assertEqual(len(data), 0)
+
+    def testScanDirectory(self):
+        os.makedirs(os.path.join(self.tempDir, 'sub'))
+        private = self.writeFile(os.path.join('sub', 'private.csv'),
+                                 self.data[:1000])
+        os.chmod(private, 0o600)
+        os.chmod(self.gzPath, 0o644)
+        with open(self.gzPath, 'rb') as f:
+            gzData = f.read()
+
+        for workers in [1, 4]:
+            infos = dict((info.path, info) for info in
+                         self.fileUtil.scanDirectory(self.tempDir,
+                                                     ('md5', 'sha1'),
+                                                     workers))
+            self.assertEqual(sorted(infos), sorted([private, self.gzPath]))
+            self.assertEqual(infos[private].size, 1000)
+            self.assertEqual(infos[private].mode, 0o600)
+            self.assertFalse(infos[private].tooPermissive)
+            self.assertTrue(infos[self.gzPath].tooPermissive)
+            self.assertEqual(infos[self.gzPath].checksums,
+                             {'md5': hashlib.md5(gzData).hexdigest(),
+                              'sha1': hashlib.sha1(gzData).hexdigest()})
+            self.assertIsNone(infos[self.gzPath].error)
+
+        infos = list(self.fileUtil.scanDirectory(self.tempDir, (),
+                                                 recursive = False))
+        self.assertEqual([(info.path, info.checksums) for info in infos],
+                         [(self.gzPath, {})])
+        self.assertRaises(Exception, lambda: list(
+            self.fileUtil.scanDirectory(private)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Daniel Zhang (張道博)'
+__copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
+__license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
+              '-Energy-Kit/master/BSD-LICENSE.txt'
+
+import csv
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from sek.db_pool import SEKDBConnectionPool
+from sek.db_util import SEKDBUtil
+from sek.ingest import SEKIngestPipeline, parseCSVChunk
+from sek_test_db import TEST_DSN, requiresTestDB
+
+TEST_TABLE = 'SEKIngestTest'
+
+
+def skipZeroReadings(fields):
+    # Parsers run in worker processes, so they are defined at module level.
+    return None if fields[1] == '0.0' else fields
+
+
+class ParseCSVChunkTester(unittest.TestCase):
+    def testParse(self):
+        rows, seconds = parseCSVChunk(b'name,kWh\nm1,1.5\n"a,b",\n\n',
+                                      skipFirstLine = True)
+        self.assertEqual(rows, [['m1', '1.5'], ['a,b', None]])
+        rows, seconds = parseCSVChunk(b'm1;0.0\nm2;2\n', delimiter = ';',
+                                      parser = skipZeroReadings)
+        self.assertEqual(rows, [['m2', '2']])
+
+    def testParseChunkCutInsideQuotedField(self):
+        # Records are split on line breaks, so a field with an embedded
+        # newline can end a chunk.
+        rows, seconds = parseCSVChunk(b'm1,"a\nb"\n')
+        self.assertEqual(rows, [['m1', 'a\nb']])
+        self.assertRaises(csv.Error, parseCSVChunk, b'm1,1.5\nm2,"a\n')
+
+
+@requiresTestDB
+class SEKIngestPipelineTester(unittest.TestCase):
+    def setUp(self):
+        self.pool = SEKDBConnectionPool(TEST_DSN, minConnections = 0,
+                                        maxConnections = 3)
+        self.dbUtil = SEKDBUtil()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DROP TABLE IF EXISTS "{}"'.format(TEST_TABLE))
+            cursor.execute("""CREATE TABLE "{}" (
+                "id" SERIAL PRIMARY KEY,
+                "meterName" VARCHAR,
+                "kWh" FLOAT)""".format(TEST_TABLE))
+            conn.commit()
+        self.tempDir = tempfile.mkdtemp()
+        self.data = b'meterName,kWh\n' + b''.join(
+            'meter{},{:.1f}\n'.format(i, i * 0.5).encode('utf-8') for i in
+            range(5000))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+        with self.pool.connection() as conn:
+            conn.cursor().execute(
+                'DROP TABLE IF EXISTS "{}"'.format(TEST_TABLE))
+            conn.commit()
+        self.pool.closeAll()
+
+    def writeFile(self, name, data, compress = False):
+        path = os.path.join(self.tempDir, name)
+        f = gzip.open(path, 'wb') if compress else open(path, 'wb')
+        f.write(data)
+        f.close()
+        return path
+
+    def loaded(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT count(*), sum("kWh") FROM "{}"'.format(
+                TEST_TABLE))
+            return cursor.fetchone()
+
+    def testIngestPlainFile(self):
+        pipeline = SEKIngestPipeline(self.pool, TEST_TABLE, hasHeader = True,
+                                     parseWorkers = 2, loadWorkers = 2,
+                                     chunkSize = 10000)
+        stats = pipeline.run(self.writeFile('readings.csv', self.data))
+        self.assertEqual(stats['errors'], [])
+        self.assertEqual(stats['rows'], 5000)
+        self.assertTrue(stats['chunks'] > 1)
+        self.assertEqual(stats['bytes'], len(self.data))
+        self.assertTrue(stats['load']['rowsPerSecond'] > 0)
+        self.assertEqual(self.loaded(), (5000, sum(i * 0.5 for i in
+                                                   range(5000))))
+        self.assertEqual(self.pool.stats()['inUse'], 0)
+
+    def testIngestGzipFileWithBadChunk(self):
+        data = self.data + b'meterX,notANumber\n'
+        pipeline = SEKIngestPipeline(self.pool, TEST_TABLE,
+                                     columns = ['meterName', 'kWh'],
+                                     hasHeader = True, parseWorkers = 0,
+                                     loadWorkers = 3, chunkSize = 8192,
+                                     maxPendingChunks = 2)
+        stats = pipeline.run(self.writeFile('readings.csv.gz', data,
+                                            compress = True))
+        self.assertEqual(len(stats['errors']), 1)
+        self.assertEqual(stats['errors'][0][0], stats['chunks'] - 1)
+        count, total = self.loaded()
+        self.assertEqual(count, stats['rows'])
+        self.assertTrue(0 < count < 5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
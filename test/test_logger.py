@@ -6,15 +6,24 @@ __copyright__ = 'Copyright (c) 2014, University of Hawaii Smart Energy Project'
 __license__ = 'https://raw.github.com/Hawaii-Smart-Energy-Project/Smart' \
               '-Energy-Kit/master/BSD-LICENSE.txt'
 
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
 import unittest
-from sek.logger import SEKLogger, CRITICAL, ERROR, WARNING, INFO, DEBUG, SILENT
+from sek.logger import SEKLogger, SEKLogListener, CRITICAL, ERROR, WARNING, \
+    INFO, DEBUG, SILENT
 import re
 
 
 class SEKLoggerTester(unittest.TestCase):
     def setUp(self):
         self.logger = SEKLogger(__name__, level = DEBUG)
-        print 'logger level: %s' % self.logger.loggerLevel
+        print('logger level: %s' % self.logger.loggerLevel)
 
     def testInit(self):
         self.logger.log('Testing init.',level = INFO)
@@ -50,6 +59,338 @@ class SEKLoggerTester(unittest.TestCase):
 
         self.assertEqual(self.logger.recording, '')
 
+    def testRecordingIsAppendOnly(self):
+        self.logger.startRecording()
+        for i in range(1000):
+            self.logger.log('Message {}.'.format(i), DEBUG)
+        self.logger.endRecording()
+
+        self.assertEqual(len(self.logger.recordingHandler.records), 1000)
+        self.assertEqual(self.logger.recording.count('\n'), 1000)
+        self.assertTrue(self.logger.recording.endswith('Message 999.\n'))
+
+    def testBoundedRecording(self):
+        logger = SEKLogger(__name__, level = DEBUG, recordingSize = 3)
+        logger.startRecording()
+        for i in range(10):
+            logger.log('Message {}.'.format(i), DEBUG)
+        logger.endRecording()
+
+        messages = logger.recordedMessages()
+        self.assertEqual(len(messages), 3)
+        self.assertTrue(messages[0].endswith('Message 7.'))
+
+        logger.clearRecording()
+        self.assertEqual(logger.recording, '')
+
+    def testRecordedMessagesByCountAndLevel(self):
+        self.logger.startRecording()
+        self.logger.log('Debug.', DEBUG)
+        self.logger.log('First error.', 'error')
+        self.logger.log('Info.', INFO)
+        self.logger.log('Second error.', ERROR)
+        self.logger.log('Critical.', CRITICAL)
+        self.logger.endRecording()
+
+        last = self.logger.recordedMessages(count = 2)
+        self.assertEqual(len(last), 2)
+        self.assertTrue(last[-1].endswith('Critical.'))
+
+        errors = self.logger.recordedMessages(level = 'error')
+        self.assertEqual([m.split(' - ')[-1] for m in errors],
+                         ['First error.', 'Second error.', 'Critical.'])
+        self.assertEqual(len(self.logger.recordedMessages(count = 1,
+                                                          level = WARNING)),
+                         1)
+
+    def testHandlersAreAttachedOnce(self):
+        handlers = list(self.logger.logger.handlers)
+        self.logger.log('Testing handlers.', 'debug')
+        self.assertEqual(self.logger.logger.handlers, handlers)
+
+        self.logger.shouldRecord = True
+        self.logger.log('Recorded.', 'debug')
+        self.logger.shouldRecord = False
+        self.logger.log('Not recorded.', 'debug')
+        self.assertEqual(self.logger.logger.handlers, handlers)
+        self.assertEqual(len(self.logger.recordedMessages()), 1)
+
+    def testLevelsAreIndependentPerInstance(self):
+        quiet = SEKLogger(__name__, level = 'error')
+        quiet.startRecording()
+        self.logger.startRecording()
+        quiet.log('Filtered.', 'INFO')
+        self.logger.log('Emitted.', 'Info')
+        self.assertEqual(quiet.recording, '')
+        self.assertEqual(len(self.logger.recordedMessages()), 1)
+        self.assertEqual(quiet.logCounter, 1)
+
+    def testInvalidLevel(self):
+        self.assertRaises(Exception, self.logger.log, 'Invalid.', 'loud')
+
+    def testAsynchronousLogging(self):
+        logger = SEKLogger(__name__, level = DEBUG, asynchronous = True)
+        logger.startRecording()
+        for i in range(100):
+            logger.log('Queued message {}.'.format(i), DEBUG)
+        logger.endRecording()
+
+        messages = logger.recordedMessages()
+        self.assertEqual(len(messages), 100)
+        self.assertTrue(messages[-1].endswith('Queued message 99.'))
+
+    def testListenerDropsWhenFull(self):
+        release = threading.Event()
+        handled = []
+
+        class BlockedLogger(object):
+            def handle(self, record):
+                release.wait()
+                handled.append(record)
+
+        listener = SEKLogListener(queueSize = 1)
+        blocked = BlockedLogger()
+        self.assertTrue(listener.enqueue(blocked, 'first'))
+        # Wait until the listener has taken the first record.
+        while listener.queue.qsize():
+            release.wait(0.01)
+        self.assertTrue(listener.enqueue(blocked, 'second'))
+        self.assertFalse(listener.enqueue(blocked, 'third'))
+        self.assertEqual(listener.dropped, 1)
+
+        release.set()
+        listener.stop()
+        self.assertEqual(handled, ['first', 'second'])
+
+    def testTemplateIsRenderedOnlyWhenOutput(self):
+        class Rendered(object):
+            count = 0
+
+            def __format__(self, spec):
+                Rendered.count += 1
+                return 'rendered'
+
+        quiet = SEKLogger(__name__, level = 'info')
+        quiet.startRecording()
+        quiet.log('Value {}.', 'debug', Rendered())
+        self.assertEqual(Rendered.count, 0)
+
+        quiet.log('Value {value} of {}.', 'info', 'x', value = Rendered())
+        self.assertTrue(quiet.recording.endswith('Value rendered of x.\n'))
+        quiet.recordedMessages()
+        self.assertEqual(Rendered.count, 1)
+
+    def testStructuredFields(self):
+        self.logger.startRecording()
+        self.logger.log('Loaded {}.', 'info', 'file.gz',
+                        fields = {'rows': 10, 'bytes': 2048})
+        self.assertTrue(self.logger.recording.endswith(
+            'Loaded file.gz. bytes=2048 rows=10\n'))
+
+    def testJSONLinesSink(self):
+        tempDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempDir)
+        path = os.path.join(tempDir, 'log.jsonl')
+        sink = self.logger.addJSONLinesSink(path)
+        self.logger.log('First {}.', 'info', 1, fields = {'table': 'T'})
+        self.logger.log('Second.', 'error')
+        sink.close()
+
+        with open(path) as logFile:
+            lines = logFile.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        first, second = [json.loads(line) for line in lines]
+        self.assertEqual(first['message'], 'First 1.')
+        self.assertEqual(first['fields'], {'table': 'T'})
+        self.assertEqual(first['level'], 'INFO')
+        self.assertEqual(second['level'], 'ERROR')
+        self.assertNotIn('fields', second)
+
+    def testLoggersAreShared(self):
+        first = SEKLogger('sek.shared', 'info')
+        second = SEKLogger('sek.shared', 'INFO')
+        self.assertIs(first.logger, second.logger)
+        self.assertIs(first.streamHandlerStdErr, second.streamHandlerStdErr)
+        self.assertIsNot(first.logger, SEKLogger('sek.shared', 'debug').logger)
+        plain = SEKLogger('sek.shared', 'info', useColor = False)
+        self.assertIsNot(first.logger, plain.logger)
+
+        # Recording stays separate for each instance.
+        first.startRecording()
+        second.log('Second instance.', 'info')
+        first.log('First instance.', 'info')
+        self.assertEqual(len(first.recordedMessages()), 1)
+        self.assertTrue(first.recording.endswith('First instance.\n'))
+
+    def testRotatingFileSink(self):
+        tempDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempDir)
+        path = os.path.join(tempDir, 'sek.log')
+        logger = SEKLogger('sek.rotating', 'info')
+        sink = logger.addRotatingFileSink(path, maxBytes = 500,
+                                          backupCount = 3)
+
+        # Nothing may be written to stderr while files rotate faster than
+        # they are compressed. The descriptor is redirected since loggers
+        # keep their own reference to the stream, and the echo of the
+        # messages themselves is turned off.
+        handler = logger.streamHandlerStdErr
+        self.addCleanup(handler.setLevel, handler.level)
+        handler.setLevel(CRITICAL + 1)
+        errors = tempfile.TemporaryFile()
+        stderr = os.dup(2)
+        os.dup2(errors.fileno(), 2)
+        try:
+            for i in range(100):
+                logger.log('Rotating message {}.', 'info', i)
+            sink.close()
+        finally:
+            os.dup2(stderr, 2)
+            os.close(stderr)
+        errors.seek(0)
+        self.assertEqual(errors.read().decode('utf-8'), '')
+        errors.close()
+
+        rotated = sink.rotatedFiles()
+        self.assertEqual(len(rotated), 3)
+        self.assertTrue(all(p.endswith('.gz') for p in rotated))
+        with open(path) as logFile:
+            current = logFile.read().splitlines()
+        self.assertTrue(current[-1].endswith('Rotating message 99.'))
+
+        # The newest rotated file ends just before the current file starts.
+        number = lambda line: int(re.search(r'(\d+)\.$', line).group(1))
+        previous = gzip.open(rotated[-1]).read().decode('utf-8').splitlines()
+        self.assertEqual(number(previous[-1]) + 1, number(current[0]))
+
+    def testRotationWorkerStopsOnClose(self):
+        tempDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempDir)
+        path = os.path.join(tempDir, 'sek.log')
+        sink = SEKLogger('sek.rotating', 'info').addRotatingFileSink(
+            path, maxBytes = 1, backupCount = 1, compress = False)
+        sink.removeExpired = lambda: 1 / 0
+        errors = []
+        stderr = sys.stderr
+        sys.stderr = type('Stderr', (object,), {'write': errors.append})()
+        try:
+            sink.doRollover()
+            worker = sink._worker
+            self.assertTrue(worker.is_alive())
+            sink.close()
+        finally:
+            sys.stderr = stderr
+        self.assertFalse(worker.is_alive())
+        self.assertIsNone(sink._worker)
+        self.assertTrue('ZeroDivisionError' in ''.join(errors))
+
+    def testRotatingFileSinkByTimeAndAge(self):
+        tempDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempDir)
+        path = os.path.join(tempDir, 'sek.log')
+        logger = SEKLogger('sek.rotating', 'info')
+        sink = logger.addRotatingFileSink(path, interval = 0.05,
+                                          backupCount = None, maxAge = 3600,
+                                          compress = False)
+        logger.log('Before rotation.', 'info')
+        time.sleep(0.1)
+        logger.log('After rotation.', 'info')
+        sink._rotated.join()
+
+        rotated = sink.rotatedFiles()
+        self.assertEqual(len(rotated), 1)
+        with open(rotated[0]) as logFile:
+            self.assertTrue(logFile.read().endswith('Before rotation.\n'))
+
+        os.utime(rotated[0], (time.time() - 7200, time.time() - 7200))
+        sink.removeExpired()
+        self.assertEqual(sink.rotatedFiles(), [])
+        sink.close()
+
+    def testRotatedFilesOrder(self):
+        tempDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempDir)
+        path = os.path.join(tempDir, 'sek.log')
+        sink = SEKLogger('sek.rotating', 'info').addRotatingFileSink(path)
+        self.addCleanup(sink.close)
+
+        # Rotations in the same second are numbered, and compressing them
+        # changes their modification times.
+        names = ['sek.log.20141231-235959', 'sek.log.20150101-000000.gz',
+                 'sek.log.20150101-000000-2', 'sek.log.20150101-000000-10.gz']
+        for i, name in enumerate(names):
+            open(os.path.join(tempDir, name), 'w').close()
+            os.utime(os.path.join(tempDir, name), (1000 - i, 1000 - i))
+        self.assertEqual(sink.rotatedFiles(),
+                         [os.path.join(tempDir, name) for name in names])
+
+    def testRateLimit(self):
+        logger = SEKLogger('sek.limited', 'info')
+        logger.setRateLimit(3, interval = 0.2)
+        logger.startRecording()
+        for i in range(10):
+            logger.log('Repeated warning {}.', 'warning', i)
+        logger.log('Other message.', 'info')
+        self.assertEqual(len(logger.recordedMessages()), 4)
+
+        time.sleep(0.25)
+        logger.log('Repeated warning {}.', 'warning', 10)
+        messages = logger.recordedMessages(count = 2)
+        self.assertTrue(messages[0].endswith(
+            'Suppressed 7 messages like: Repeated warning {}.'))
+        self.assertTrue(messages[1].endswith('Repeated warning 10.'))
+
+    def testRateLimitSamplingAndReport(self):
+        logger = SEKLogger('sek.limited', 'info')
+        logger.setRateLimit(1, interval = 60, sampleEvery = 4)
+        logger.startRecording()
+        for i in range(10):
+            logger.log('Sampled {}.', 'info', i)
+        self.assertEqual([m.split(' - ')[-1] for m in
+                          logger.recordedMessages()],
+                         ['Sampled 0.', 'Sampled 4.', 'Sampled 8.'])
+
+        logger.reportSuppressed()
+        self.assertTrue(logger.recordedMessages(count = 1)[0].endswith(
+            'Suppressed 7 messages like: Sampled {}.'))
+        logger.reportSuppressed()
+        self.assertEqual(len(logger.recordedMessages()), 4)
+
+    def testRateLimitByCallSite(self):
+        logger = SEKLogger('sek.limited', 'info')
+        logger.setRateLimit(2, interval = 60, by = 'callsite', maxKeys = 10)
+        logger.startRecording()
+        for i in range(5):
+            logger.log('Message {}.'.format(i), 'info')
+        self.assertEqual(len(logger.recordedMessages()), 2)
+
+        for i in range(100):
+            logger.log('Distinct {}.', 'info', i)
+        logger.setRateLimit(2, interval = 60, maxKeys = 10)
+        for i in range(100):
+            logger.log('Distinct {}.'.format(i), 'info')
+        self.assertEqual(len(logger.rateLimiter._entries), 10)
+        self.assertEqual(logger.rateLimiter.evicted, 90)
+
+    def testRateLimitReportsEvictedKeys(self):
+        logger = SEKLogger('sek.limited', 'info')
+        logger.setRateLimit(1, interval = 60, maxKeys = 1)
+        logger.startRecording()
+        for i in range(4):
+            logger.log('Evicted {}.', 'warning', i)
+        logger.log('Other message.', 'info')
+        self.assertEqual([m.split(' - ')[-1] for m in
+                          logger.recordedMessages()],
+                         ['Evicted 0.',
+                          'Suppressed 3 messages like: Evicted {}.',
+                          'Other message.'])
+        self.assertEqual(len(logger.recordedMessages(level = WARNING)), 2)
+
+        logger.log('Other message.', 'info')
+        logger.setRateLimit(None)
+        self.assertTrue(logger.recordedMessages(count = 1)[0].endswith(
+            'Suppressed 1 messages like: Other message.'))
+
     def testDebugLogging(self):
         self.logger.log('Testing debug logging', DEBUG)
 